@@ -9,12 +9,22 @@ import atexit
 import signal
 import sys
 
+from metrics import (REGISTRY, PROMETHEUS_CONTENT_TYPE, timed_handler,
+                     measure_overhead, perf_counter_ns)
+import robot_log
+from udp_control import UdpControlServer
+from robot_state import RobotState
+
+log = robot_log.get_logger("app")
+hot_log = robot_log.get_hot_logger("app")
+
 # Глобальный флаг для предотвращения двойной очистки
 _cleaning_up = False
 
 # Импортируем наш новый модуль
 try:
     from control_robot_pigpio import *
+    from servo_manager import ServoManager, ServoAxis
     #from control_robot import ControlServoCam
     SERVO_AVAILABLE = True
 except ImportError as e:
@@ -26,19 +36,38 @@ except Exception as e:
     SERVO_AVAILABLE = False
 
 app = Flask(__name__)
+
+# Метрики видеопотока: время подготовки кадра и число кадров
+FRAME_HIST = REGISTRY.histogram("robot_video_frame_duration_seconds",
+                                "Time to capture, resize and encode one frame")
+FRAMES_TOTAL = REGISTRY.counter("robot_video_frames_total", "Number of frames sent")
+FRAME_ERRORS_TOTAL = REGISTRY.counter("robot_video_frame_errors_total",
+                                      "Number of failed camera reads")
+
+# Стоимость одного события инструментирования (измеряется один раз при старте)
+REGISTRY.set_gauge("robot_metrics_overhead_seconds", measure_overhead() / 1e9,
+                   "Measured cost of recording one instrumented event")
+
 camera = cv2.VideoCapture(0)  # веб камера
 
-controlX, controlY = 0, 0  # глобальные переменные положения джойстика с web-страницы
-servo_angle = 90  # глобальная переменная: угол сервопривода
+# Общее состояние робота: положение джойстика, углы камеры, ШИМ моторов, метки времени
+robot_state = RobotState(set_servo=90.0, servo_angle=90.0)
 
-robot_chassis = RobotChassis() # создаем шасси нашего робота (левый, правый трак)
+robot_chassis = RobotChassis(state=robot_state) # создаем шасси нашего робота (левый, правый трак)
 # Инициализируем сервопривод (если доступен)
 servo_cam = None
+servo_manager = None    # pan/tilt одним планировщиком, если задан SERVO_TILT_PIN
 if SERVO_AVAILABLE:
     try:
         # Настройки сервопривода (можно вынести в аргументы командной строки)
         SERVO_PIN = 24  # GPIO пин для сервопривода
-        servo_cam = ControlServoCam(servo_pin=SERVO_PIN, speed_factor=1.7)
+        if SERVO_TILT_PIN is not None:
+            servo_manager = ServoManager(pi, (ServoAxis("pan", SERVO_PIN, speed_factor=1.7),
+                                              ServoAxis("tilt", SERVO_TILT_PIN, speed_factor=1.7)),
+                                         state=robot_state)
+            servo_cam = servo_manager.servo("pan")  # маршруты /servo_* ведут ось pan
+        else:
+            servo_cam = ControlServoCam(servo_pin=SERVO_PIN, speed_factor=1.7, state=robot_state)
         print("Servo camera initialized successfully")
     except Exception as e:
         print(f"Error initializing servo camera: {e}")
@@ -51,17 +80,23 @@ def getFramesGenerator():
     """ Генератор фреймов для вывода в веб-страницу, тут же можно поиграть с openCV"""
     while True:
         time.sleep(0.01)    # ограничение fps (если видео тупит, можно убрать)
+        t0 = perf_counter_ns()
         success, frame = camera.read()  # Получаем фрейм с камеры
         if success:
             frame = cv2.resize(frame, (320, 240), interpolation=cv2.INTER_AREA)  # уменьшаем разрешение кадров (если видео тупит, можно уменьшить еще больше)
             # frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)   # перевод изображения в градации серого
             # _, frame = cv2.threshold(frame, 127, 255, cv2.THRESH_BINARY)  # бинаризуем изображение
             _, buffer = cv2.imencode('.jpg', frame)
+            FRAME_HIST.record_ns(perf_counter_ns() - t0)
+            FRAMES_TOTAL.inc()
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+        else:
+            FRAME_ERRORS_TOTAL.inc()
 
 
 @app.route('/video_feed')
+@timed_handler('/video_feed')
 def video_feed():
     """ Генерируем и отправляем изображения с камеры"""
     return Response(getFramesGenerator(), mimetype='multipart/x-mixed-replace; boundary=frame')
@@ -73,26 +108,124 @@ def index():
     return render_template('index.html')
 
 
+# Все точки входа управления (HTTP /control, /command, /servo_control,
+# /servo_jog, /servos, UDP DRIVE/SERVO/COMMAND) применяют команды под одной
+# блокировкой, поэтому совмещённая команда не перемешивается с одиночными.
+# RLock: apply_command вызывает apply_drive/apply_servo, уже держа её
+_control_lock = threading.RLock()
+
+# Плавное движение сервы блокирует поток на сотни миллисекунд, поэтому
+# угол камеры выставляет один общий поток: берётся только самая свежая
+# цель, промежуточные отбрасываются. Под блокировкой - только постановка цели
+_servo_pending = None
+_servo_event = threading.Event()
+
+
+def apply_drive(x, y):
+    """ Применить положение джойстика (-1.0..1.0) к шасси (общая точка для HTTP и UDP) """
+    with _control_lock:
+        robot_state.update(set_x=x, set_y=y, t_drive=time.monotonic())
+        if not (x==0 and y==0): # если не стоим на месте отправляем кординаты джойстика на управление движением роботом
+            robot_chassis.move_robot(x, y)
+        else:
+            robot_chassis.stop_robot()
+
+
+def apply_servo(angle, smooth=True):
+    """ Задать угол камеры (общая точка для HTTP и UDP), не блокирует """
+    global _servo_pending
+    with _control_lock:
+        robot_state.update(set_servo=angle, t_servo=time.monotonic())
+        _servo_pending = (angle, smooth)
+        _servo_event.set()
+
+
+def _set_servo(angle, smooth):
+    if servo_cam:
+        success = servo_cam.set_angle(angle, smooth=smooth)
+        if success:
+            hot_log.info("Servo camera angle set to: %.1f° (smooth: %s)", angle, smooth)
+        else:
+            hot_log.warning("Failed to set servo camera angle")
+        return success
+    # Режим симуляции
+    hot_log.info("Servo camera (simulation) angle set to: %s°", angle)
+    return True
+
+
+def _servo_worker():
+    global _servo_pending
+    while True:
+        _servo_event.wait()
+        with _control_lock:
+            _servo_event.clear()
+            pending, _servo_pending = _servo_pending, None
+        if pending is not None:
+            _set_servo(*pending)
+
+
+threading.Thread(target=_servo_worker, name="servo-worker", daemon=True).start()
+
+
+def apply_command(x=None, y=None, angle=None, smooth=True, brake=False):
+    """
+    Применить совмещённую команду (движение + камера) за один шаг управления.
+    Любая часть может отсутствовать (None). brake=True - аварийный стоп шасси.
+    """
+    with _control_lock:
+        if brake:
+            apply_drive(0.0, 0.0)
+            robot_chassis.stop()
+        elif x is not None and y is not None:
+            apply_drive(x, y)
+
+        if angle is not None:
+            apply_servo(angle, smooth=smooth)
+
+
 @app.route('/control')
+@timed_handler('/control')
 def control():
     """ Пришел запрос на управления роботом """
-    global controlX, controlY
-    controlX, controlY = float(request.args.get('x')) / 100.0, float(request.args.get('y')) / 100.0
-    if not (controlX==0 and controlY==0): # если не стоим на месте отправляем кординаты джойстика на управление движением роботом
-        robot_chassis.move_robot(controlX, controlY)
-    else:
-        robot_chassis.stop_robot()
-        
+    apply_drive(float(request.args.get('x')) / 100.0, float(request.args.get('y')) / 100.0)
     return '', 200, {'Content-Type': 'text/plain'}
 
 
 
 
+@app.route('/command')
+@timed_handler('/command')
+def command():
+    """
+    Совмещённая команда: движение и камера в одном запросе.
+    Параметры (все необязательные): x, y - джойстик (-100..100),
+    angle - угол камеры, smooth - плавность сервы (true/false),
+    brake - аварийная остановка (true/false)
+    """
+    try:
+        x, y = request.args.get('x'), request.args.get('y')
+        if (x is None) != (y is None):
+            return 'x and y must be given together', 400
+        angle = request.args.get('angle')
+        apply_command(
+            x=float(x) / 100.0 if x is not None else None,
+            y=float(y) / 100.0 if y is not None else None,
+            angle=float(angle) if angle is not None else None,
+            smooth=request.args.get('smooth', 'true').lower() == 'true',
+            brake=request.args.get('brake', 'false').lower() == 'true',
+        )
+        return '', 200, {'Content-Type': 'text/plain'}
+    except ValueError:
+        return 'Invalid command value', 400
+    except Exception as e:
+        log.error("Error in command: %s", e)
+        return 'Internal server error', 500
+
+
 @app.route('/servo_control')
+@timed_handler('/servo_control')
 def servo_control():
     """ Пришел запрос на управление сервоприводом камеры """
-    global servo_angle
-    
     try:
         angle_str = request.args.get('angle')
         smooth_str = request.args.get('smooth', 'true')  # Новый параметр
@@ -104,19 +237,8 @@ def servo_control():
             # Определяем, нужно ли плавное движение
             smooth = smooth_str.lower() == 'true'
             
-            # Обновляем глобальную переменную
-            servo_angle = angle
-            
             # Управляем сервоприводом
-            if servo_cam:
-                success = servo_cam.set_angle(angle, smooth=smooth)
-                if success:
-                    print(f"Servo camera angle set to: {angle:.1f}° (smooth: {smooth})")
-                else:
-                    print(f"Failed to set servo camera angle")
-            else:
-                # Режим симуляции
-                print(f"Servo camera (simulation) angle set to: {angle}°")
+            apply_servo(angle, smooth=smooth)
             
             return '', 200, {'Content-Type': 'text/plain'}
         else:
@@ -125,36 +247,29 @@ def servo_control():
     except ValueError:
         return 'Invalid angle value', 400
     except Exception as e:
-        print(f"Error in servo_control: {e}")
+        log.error("Error in servo_control: %s", e)
         return 'Internal server error', 500
 
 
 @app.route('/servo_control_proportional')
+@timed_handler('/servo_control_proportional')
 def servo_control_proportional():
     """
     Управление сервой пропорционально значению (0-100)
     Идеально для слайдера!
     """
-    global servo_angle
-    
     try:
         value_str = request.args.get('value')
         if value_str:
             value = float(value_str)
             
-            # Преобразуем значение 0-100 в угол 0-180
-            angle = (value / 100.0) * 180.0
+            # Преобразуем значение 0-100 в угол диапазона сервы (по умолчанию 0-180)
+            low, high = (servo_cam.min_angle, servo_cam.max_angle) if servo_cam else (0.0, 180.0)
+            angle = low + max(0.0, min(1.0, value / 100.0)) * (high - low)
             
-            # Обновляем глобальную переменную
-            servo_angle = angle
-            
-            if servo_cam:
-                # Используем пропорциональное управление
-                success = servo_cam.set_angle_proportional(value, 0.0, 100.0)
-                if success:
-                    print(f"Servo set proportionally: value={value} → angle={angle:.1f}°")
-                else:
-                    print(f"Failed to set servo proportionally")
+            # Та же очередь сервы, что у /servo_control и UDP
+            apply_servo(angle)
+            hot_log.info("Servo set proportionally: value=%s → angle=%.1f°", value, angle)
             
             return '', 200, {'Content-Type': 'text/plain'}
         else:
@@ -163,15 +278,210 @@ def servo_control_proportional():
     except ValueError:
         return 'Invalid value', 400
     except Exception as e:
-        print(f"Error in proportional control: {e}")
+        log.error("Error in proportional control: %s", e)
         return 'Internal server error', 500
 
 
+@app.route('/servo_jog')
+@timed_handler('/servo_jog')
+def servo_jog():
+    """
+    Режим скорости сервы: rate - скорость поворота (градусов/с, со знаком).
+    Пока нужна скорость, команду повторяют чаще SERVO_JOG_TIMEOUT_S;
+    rate=0 или тишина - плавная остановка. Возвращает текущий угол и скорость
+    """
+    try:
+        rate = float(request.args.get('rate', 0))
+    except ValueError:
+        return 'Invalid rate value', 400
+    if not servo_cam:
+        return json.dumps({'accepted': False, 'angle': None, 'rate': 0.0}), 200, \
+            {'Content-Type': 'application/json'}
+    with _control_lock:
+        accepted = servo_cam.jog(rate)
+        robot_state.update(t_servo=time.monotonic())
+    return json.dumps({'accepted': accepted, 'angle': servo_cam.get_angle(),
+                       'rate': servo_cam.jog_rate}), 200, {'Content-Type': 'application/json'}
+
+
 @app.route('/servo_status')
 def servo_status():
-    """ Возвращает текущий угол сервопривода """
-    global servo_angle
-    return json.dumps({'angle': servo_angle})
+    """
+    Возвращает заданный угол сервопривода, угол по траектории на текущий
+    момент (current_angle, в том числе в середине движения), оценку
+    фактического угла с учётом задержки и скорости привода и само движение
+    """
+    _, values = robot_state.snapshot()
+    if not servo_cam:
+        return json.dumps({'angle': values[robot_state.index['set_servo']],
+                           'current_angle': values[robot_state.index['servo_angle']]})
+    now = time.monotonic()
+    return json.dumps({'angle': values[robot_state.index['set_servo']],
+                       'current_angle': servo_cam.get_angle(now),
+                       'estimated_angle': servo_cam.estimated_angle(now),
+                       'trajectory': servo_cam.trajectory_status(now)})
+
+
+@app.route('/servos')
+@timed_handler('/servos')
+def servos():
+    """
+    Многоосевая камера (ServoManager). Углы осей в параметрах (pan=, tilt=)
+    задают синхронное движение: все оси приходят в цель одновременно;
+    duration - его длительность (сек, по умолчанию по самой дальней оси),
+    smooth=false - сразу. Возвращает текущий и целевой угол каждой оси
+    """
+    if servo_manager is None:
+        return 'Servo manager is not enabled (SERVO_TILT_PIN)', 404
+    try:
+        targets = {name: float(request.args[name]) for name in servo_manager.axes if name in request.args}
+        duration = request.args.get('duration')
+        duration = float(duration) if duration is not None else None
+    except ValueError:
+        return 'Invalid angle or duration value', 400
+    if targets:
+        smooth = request.args.get('smooth', 'true').lower() == 'true'
+        with _control_lock:
+            servo_manager.move(targets, duration=duration, smooth=smooth)
+            robot_state.update(t_servo=time.monotonic())
+    return json.dumps(servo_manager.status()), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/drive_mode')
+def drive_mode():
+    """
+    Режим управления шасси. Параметр mode=open|closed переключает его на ходу.
+    Возвращает режим и состояние регуляторов скорости колёс (уставка, скорость,
+    ошибка слежения в импульсах энкодера в секунду) и оценку скорости и
+    ускорения колёс фильтром Калмана.
+    """
+    mode = request.args.get('mode')
+    if mode is not None:
+        try:
+            robot_chassis.set_control_mode(mode.lower())
+        except ValueError as e:
+            return str(e), 400
+    result = {'mode': robot_chassis.control_mode, 'calibrated': bool(robot_chassis.speed_tables),
+              'max_wheel_speed': robot_chassis.max_wheel_speed,
+              'wheels': robot_chassis.velocity.status(),
+              'velocity_source': VELOCITY_SOURCE,
+              'estimator': robot_chassis.velocity_estimator.status()}
+    return json.dumps(result), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/sync')
+def sync():
+    """
+    Синхронизация бортов при езде прямо. Параметры: enable=true|false,
+    kp, ki, kd - коэффициенты на ходу. Возвращает состояние и метрики слежения
+    (накопленная разница счёта, её RMS и максимум, поправка скорости).
+    """
+    straight = robot_chassis.sync
+    try:
+        if 'kp' in request.args:
+            straight.kp = float(request.args['kp'])
+        if 'ki' in request.args:
+            straight.ki = float(request.args['ki'])
+        if 'kd' in request.args:
+            straight.kd = float(request.args['kd'])
+    except ValueError:
+        return "kp, ki and kd must be numbers", 400
+    enable = request.args.get('enable')
+    if enable is not None:
+        straight.set_enabled(enable.lower() == 'true')
+    return json.dumps(straight.status()), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/traction')
+def traction():
+    """
+    Сцепление колёс: состояние (ok/stall/slip/free_spin), ожидаемая и
+    измеренная скорость, действующие ограничения и последние события.
+    Параметры stall, slip, free_spin = none|cutback|ramp|stop меняют реакции;
+    clear=true снимает запрет хода после реакции "stop" (halted)
+    """
+    monitor = robot_chassis.traction
+    if request.args.get('clear', 'false').lower() == 'true':
+        monitor.clear()
+    reactions = {c: request.args[c] for c in ('stall', 'slip', 'free_spin') if c in request.args}
+    if reactions:
+        try:
+            monitor.set_reactions(reactions)
+        except ValueError as e:
+            return str(e), 400
+    return json.dumps(monitor.status()), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/encoders')
+def encoders():
+    """
+    Последний общий опрос энкодеров: счёт, скорость (сырая, EMA, медиана), ошибки
+    и статистика фронтов для настройки фильтров. reset_stats=true - сбросить статистику
+    """
+    if request.args.get('reset_stats', 'false').lower() == 'true':
+        robot_chassis.encoder_hub.reset_stats()
+    return json.dumps(robot_chassis.encoder_hub.status()), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/encoder_counts')
+def encoder_counts():
+    """
+    Счёт левого и правого энкодеров одним снимком (с tick последнего фронта).
+    reset=true - снимок и сброс одной операцией, без потери фронтов
+    """
+    counters = robot_chassis.encoder_hub.counters
+    if request.args.get('reset', 'false').lower() == 'true':
+        tick, counts = counters.snapshot_and_reset()
+    else:
+        tick, counts = counters.snapshot()
+    return json.dumps({"tick": tick, "left": counts[0], "right": counts[1]}), 200, \
+        {'Content-Type': 'application/json'}
+
+
+@app.route('/odometry')
+def odometry():
+    """
+    Поза робота по одометрии (x, y в мм, курс). Параметры: reset=true - обнулить позу;
+    wheel_diameter, track_width - поменять геометрию (мм)
+    """
+    try:
+        diameter, track = request.args.get('wheel_diameter'), request.args.get('track_width')
+        if diameter is not None or track is not None:
+            robot_chassis.odometry.configure(
+                wheel_diameter_mm=float(diameter) if diameter is not None else None,
+                track_width_mm=float(track) if track is not None else None)
+    except ValueError:
+        return 'Invalid wheel_diameter or track_width', 400
+    if request.args.get('reset', 'false').lower() == 'true':
+        robot_chassis.odometry.reset()
+    return json.dumps(robot_chassis.odometry.status()), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/state')
+def state():
+    """ Согласованный снимок всего состояния робота (JSON) """
+    return json.dumps(robot_state.as_dict()), 200, {'Content-Type': 'application/json'}
+
+
+@app.route('/metrics')
+def metrics():
+    """ Метрики задержек и счётчики в формате Prometheus """
+    return REGISTRY.render_prometheus(), 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE}
+
+
+@app.route('/logs')
+def logs():
+    """ Последние записи журнала (параметры: n - сколько строк, level - минимальный уровень) """
+    try:
+        limit = int(request.args.get('n', 200))
+        min_level = robot_log.LEVELS_BY_NAME[request.args.get('level', 'DEBUG').upper()]
+    except (ValueError, KeyError):
+        return 'Invalid n or level parameter', 400
+    lines = robot_log.recent(limit, min_level)
+    dropped = robot_log.dropped_count()
+    if dropped:
+        lines.append(f"... {dropped} records dropped (log queue overflow)")
+    return "\n".join(lines) + "\n", 200, {'Content-Type': 'text/plain; charset=utf-8'}
 
 
 # Функция для очистки ресурсов при завершении
@@ -192,12 +502,26 @@ def cleanup_resources():
         except:
             pass
     
+    # Останавливаем цикл регулятора и убираем скрипты из демона pigpio
+    if 'robot_chassis' in globals() and robot_chassis:
+        try:
+            robot_chassis.control_loop.stop()
+            robot_chassis.stop_robot()
+            robot_chassis.disable_daemon_scripts()
+        except:
+            pass
+
     # Очищаем сервопривод
     if 'servo_cam' in globals() and servo_cam:
         try:
             servo_cam.cleanup()
         except:
             pass  # Игнорируем ошибки при завершении
+    if 'servo_manager' in globals() and servo_manager:
+        try:
+            servo_manager.cleanup()
+        except:
+            pass
     cleanup() # Останавливаем PIGPIO
     print("Resources cleaned up")
 
@@ -227,7 +551,16 @@ if __name__ == '__main__':
     parser.add_argument('-p', '--port', type=int, default=5000, help="Running port")
     parser.add_argument("-i", "--ip", type=str, default='127.0.0.1', help="Ip address")
     parser.add_argument('--servo-pin', type=int, default=24, help="GPIO pin for servo camera")
+    parser.add_argument('--log-level', type=str, default='INFO',
+                        choices=sorted(robot_log.LEVELS_BY_NAME), help="Logging level")
+    parser.add_argument('--daemon-scripts', action='store_true',
+                        help="Apply chassis commands via pigpio daemon scripts with a daemon-side watchdog")
+    parser.add_argument('--closed-loop', action='store_true',
+                        help="Start in closed-loop wheel speed mode (can be switched via /drive_mode)")
+    parser.add_argument('--udp-port', type=int, default=None,
+                        help="Enable low-latency UDP control on this port (see udp_control.py)")
     args = parser.parse_args()
+    robot_log.set_level(args.log_level)
 
     try:
         # Регистрируем обработчики
@@ -250,6 +583,17 @@ if __name__ == '__main__':
 
         # threading.Thread(target=sender, daemon=True).start()    # запускаем тред отправки пакетов по uart с демоном
 
+        if args.daemon_scripts:
+            robot_chassis.enable_daemon_scripts()
+
+        if args.closed_loop:
+            robot_chassis.set_control_mode("closed")
+
+        if args.udp_port:
+            udp_server = UdpControlServer(args.udp_port, apply_drive, apply_servo, host=args.ip,
+                                          on_command=apply_command)
+            udp_server.start()
+
         app.run(debug=False, host=args.ip, port=args.port)   # запускаем flask приложение
         
     except KeyboardInterrupt:
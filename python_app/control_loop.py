@@ -0,0 +1,92 @@
+# control_loop.py
+"""
+Цикл управления с фиксированной частотой.
+
+Один поток вызывает зарегистрированные шаги с постоянным периодом,
+независимо от того, как часто приходят команды из браузера.
+Расписание абсолютное (следующий тик = предыдущий + период), поэтому
+ошибка не накапливается; пропущенные тики считаются как overruns.
+"""
+
+import threading
+import time
+
+from metrics import REGISTRY, perf_counter_ns
+from robot_log import get_logger, get_hot_logger
+
+log = get_logger("loop")
+hot_log = get_hot_logger("loop", min_interval=5.0)
+
+
+class ControlLoop:
+    """Поток, вызывающий step(dt, now) у всех подписчиков на каждом тике"""
+
+    def __init__(self, rate_hz, name="control"):
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.name = name
+        self.ticks = 0
+        self.overruns = 0
+        self._steps = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._step_hist = REGISTRY.histogram("robot_control_step_duration_seconds",
+                                             "Time spent in one control loop tick", loop=name)
+        self._jitter_hist = REGISTRY.histogram("robot_control_tick_lateness_seconds",
+                                               "How late a control tick started", loop=name)
+
+    def add(self, step):
+        """Подписать функцию step(dt, now); поток запускается при первой подписке"""
+        with self._lock:
+            if step not in self._steps:
+                self._steps = self._steps + [step]
+        self.start()
+
+    def remove(self, step):
+        with self._lock:
+            self._steps = [s for s in self._steps if s != step]
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-loop", daemon=True)
+            self._thread.start()
+            log.info("Control loop '%s' started at %d Hz", self.name, self.rate_hz)
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        period = self.period
+        next_tick = time.monotonic()
+        last = next_tick
+        while self._running:
+            now = time.monotonic()
+            late = now - next_tick
+            self._jitter_hist.record_ns(int(max(0.0, late) * 1e9))
+            if late > period:
+                # Пропустили тики (GC, нагрузка) - не пытаемся их догнать
+                skipped = int(late / period)
+                self.overruns += skipped
+                next_tick += skipped * period
+                hot_log.warning("Control loop '%s' overrun: %d ticks skipped", self.name, skipped)
+
+            dt = now - last
+            last = now
+            t0 = perf_counter_ns()
+            for step in self._steps:
+                try:
+                    step(dt, now)
+                except Exception as e:
+                    hot_log.error("Control step %s failed: %s", getattr(step, "__qualname__", step), e)
+            self._step_hist.record_ns(perf_counter_ns() - t0)
+            self.ticks += 1
+
+            next_tick += period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
@@ -5,6 +5,12 @@ import termios
 import tty
 import select
 
+from gpio_bank import ShadowGpio
+from pwm_backend import make_backend
+from robot_log import get_hot_logger
+
+log = get_hot_logger("motor")
+
 # ============================================================================
 # КОНФИГУРАЦИЯ - МОЖНО МЕНЯТЬ ЗДЕСЬ!
 # ============================================================================
@@ -22,14 +28,90 @@ RIGHT_ENC_A = 5        # GPIO5 (S1 правого мотора)
 RIGHT_ENC_B = 6        # GPIO6 (S2 правого мотора)
 LEFT_ENC_A = 17        # GPIO17 (S1 левого мотора)
 LEFT_ENC_B = 27        # GPIO27 (S2 левого мотора)
+LEFT_ENC_INVERT = False   # Поменять знак счёта (если при движении вперёд энкодер считает вниз)
+RIGHT_ENC_INVERT = False
+# Оценка скорости колеса (encoders.WheelSpeedEstimator): по периоду на малой скорости, по счёту на большой
+SPEED_BLEND_LOW_EDGES = 2    # Фронтов за тик регулятора - ниже только оценка по периоду
+SPEED_BLEND_HIGH_EDGES = 8   # Фронтов за тик регулятора - выше только оценка по счёту
+SPEED_STOP_TIMEOUT_S = 0.25  # Без фронтов дольше - колесо стоит
+ENCODER_HISTORY = 256       # Строк в кольцевом буфере истории энкодеров (encoder_hub.py)
+ENCODER_EMA_TAU = 0.1        # Постоянная времени сглаживания скорости (сек)
+ENCODER_MEDIAN_WINDOW = 5    # Окно медианного фильтра скорости (опросов)
+# Геометрия шасси для одометрии (odometry.py)
+WHEEL_DIAMETER_MM = 65       # Диаметр ведущего колеса
+TRACK_WIDTH_MM = 130         # Эффективная колея (подбирается по развороту на месте)
+ENCODER_COUNTS_PER_WHEEL_REV = 4 * 48  # 4 квадратурных отсчёта на оборот вала x редуктор 1:48 (уточнить)
+ENCODER_GLITCH_FILTER_US = 100  # Фильтр глитчей pigpio на входах энкодеров: короче - не фронт (0 - выкл.)
+ENCODER_NOISE_FILTER = None      # Фильтр шума pigpio (steady_us, active_us) или None
+ENCODER_INGEST = "callback"  # "callback" - callback pigpio на каждый фронт, "notify" - пачки уведомлений + NumPy (encoder_stream.py)
 
 # НАСТРОЙКИ ШИМ
+PWM_BACKEND = "software"  # "software" - программный ШИМ pigpio, "hardware" - аппаратный (GPIO12/13/18/19)
 PWM_FREQUENCY = 400    # Частота ШИМ в Гц
+HW_PWM_FREQUENCY = 20000  # Частота аппаратного ШИМ в Гц (ультразвук - без писка)
 MAX_PWM = 150           # Максимальный ШИМ в % (ограничиваем ток)
 MIN_PWM = 30           # Минимальный рабочий ШИМ
 
 
 
+# Замкнутый контур скорости колёс (см. wheel_control.py, control_loop.py)
+CONTROL_RATE_HZ = 50         # Частота цикла регулятора
+MAX_WHEEL_SPEED_CPS = 800    # Скорость колеса при MAX_PWM, квадратурных отсчётов энкодера в секунду
+VELOCITY_KP = 0.05           # ПИД по скорости: ШИМ на (отсчёт/с) ошибки
+VELOCITY_KI = 0.25
+VELOCITY_KD = 0.0
+VELOCITY_KFF = MAX_PWM / MAX_WHEEL_SPEED_CPS  # Прямая связь: ШИМ на (импульс/с) уставки
+TRACKING_ERROR_TAU = 1.0     # Постоянная сглаживания ошибки слежения (сек)
+
+# Оценка скорости фильтром Калмана (velocity_estimator.py): энкодер + модель мотора 1-го порядка
+VELOCITY_SOURCE = "kalman"   # Скорость для регулятора: "kalman" - оценка фильтра, "encoder" - по фронтам
+MOTOR_TAU_S = 0.15           # Постоянная времени мотора с гусеницей (сек)
+KALMAN_SPEED_STD = 30.0      # Шум измерения скорости по энкодеру (отсчётов/с)
+KALMAN_ACCEL_STD = 300.0     # Неточность модели: случайное ускорение (отсчётов/с^2)
+KALMAN_LOAD_STD = 100.0      # Дрейф нагрузки (отсчётов/с за корень секунды)
+
+# Профиль разгона колёс (motion_profile.py), в долях полной скорости колеса
+PROFILE_MAX_ACCEL = 1.0      # Ускорение, 1/с (1.0 - от нуля до полного хода за секунду)
+PROFILE_MAX_JERK = 5.0       # Рывок, 1/с^2 (None - трапеция без ограничения рывка)
+
+# Синхронизация бортов при езде прямо (straight_sync.py), в отсчётах энкодера
+SYNC_ENABLED = False         # Включается на ходу через /sync
+SYNC_KP = 4.0                # Поправка скорости (отсчётов/с) на отсчёт накопленной разницы
+SYNC_KI = 2.0                # Интеграл разницы: убирает постоянное рассогласование моторов
+SYNC_KD = 0.5                # Поправка на (отсчёт/с) скорости роста разницы
+SYNC_RATE_WINDOW = 5         # Тиков в окне производной разницы (кольцевой буфер)
+SYNC_MAX_CORRECTION = 0.2 * MAX_WHEEL_SPEED_CPS  # Ограничение поправки (отсчётов/с)
+
+# Контроль сцепления колёс (traction.py): скорость по энкодеру против ШИМ и профиля
+TRACTION_STALL_RATIO = 0.15      # Колесо быстрее этой доли ожидаемой при данном ШИМ скорости - не застряло
+TRACTION_STALL_TIME_S = 0.3      # Столько держится - застревание (stall)
+TRACTION_SLIP_MARGIN = 0.25 * MAX_WHEEL_SPEED_CPS  # Превышение скорости профиля (отсчётов/с) - пробуксовка
+TRACTION_SLIP_TIME_S = 0.06      # Столько держится превышение - пробуксовка (slip)
+TRACTION_FREE_SPIN_RATIO = 0.9   # Скорость не ниже этой доли скорости без нагрузки при данном ШИМ...
+TRACTION_FREE_SPIN_TIME_S = 0.5  # ...и превышение держится столько - колесо крутится в воздухе (free_spin)
+TRACTION_RECOVER_S = 0.5         # Без признаков столько времени - состояние снова "ok"
+# Реакции: "none" - только событие, "cutback" - урезать ШИМ колеса, "ramp" - смягчить разгон, "stop" - стоп
+TRACTION_REACTIONS = {"stall": "cutback", "slip": "ramp", "free_spin": "ramp"}
+TRACTION_CUTBACK = 0.5           # Доля ШИМ застрявшего колеса при "cutback"
+TRACTION_RAMP_FACTOR = 0.3       # Доля PROFILE_MAX_ACCEL при "ramp"
+TRACTION_EVENT_HISTORY = 50      # Сколько последних событий хранить для /traction
+
+# Калибровка ШИМ -> скорость (python3 motor_calibration.py); без файла - линейная схема MIN_PWM..MAX_PWM
+CALIBRATION_FILE = "motor_calibration.json"
+
+# Сервопривод камеры (ControlServoCam)
+SERVO_TRAJECTORY = "python"  # "python" - шаги set_servo_pulsewidth из Python, "wave" - волна pigpio (servo_waves.py)
+SERVO_RATE_HZ = 50           # Тик режима скорости (jog) и планировщика осей: как кадр сервы
+SERVO_TILT_PIN = None        # GPIO сервы наклона камеры; задан - pan и tilt ведёт ServoManager (servo_manager.py)
+SERVO_JOG_MAX_RATE = 120.0   # Наибольшая скорость поворота в режиме jog (градусов/с)
+SERVO_JOG_ACCEL = 360.0      # Ускорение при смене скорости (градусов/с^2)
+SERVO_JOG_TIMEOUT_S = 0.3    # Без новой команды jog дольше - плавная остановка
+SERVO_LAG_S = 0.04           # Модель механики: задержка от команды до начала поворота (кадр + мёртвая зона)
+SERVO_MAX_SLEW_DEG_S = 500.0 # Модель механики: наибольшая скорость поворота сервы (градусов/с)
+
+# Скрипты в демоне pigpio (см. pigpio_scripts.py)
+WATCHDOG_DEADLINE_MS = 500  # Без команд дольше этого срока демон сам тормозит моторы
+
 # Настройки плавного старта
 SMOOTH_STEP = 5        # Шаг изменения скорости для плавности
 SMOOTH_DELAY = 0.02    # Задержка между шагами
@@ -45,15 +127,35 @@ if not pi.connected:
     sys.exit(1)
 
 
+# Теневой регистр выходов: неизменные записи не уходят в демон,
+# пины направления обоих моторов ставятся одной парой clear/set_bank_1
+# (задержки вызовов видны в /metrics)
+PWM = make_backend(PWM_BACKEND, pi,
+                   HW_PWM_FREQUENCY if PWM_BACKEND == "hardware" else PWM_FREQUENCY, MAX_PWM)
+gpio = ShadowGpio(pi, PWM)
+
+
 # ============================================================================
 # ПРОСТОЙ КЛАСС ЭНКОДЕРА (ТОЛЬКО ПОДСЧЁТ ИМПУЛЬСОВ)
 # ============================================================================
 
 class EncoderCounter:
+    """
+    Счёт фронтов одного канала без направления. count пишет только поток
+    callback'ов pigpio; reset() запоминает базу вместо обнуления, поэтому
+    фронт во время сброса не теряется. Согласованные снимки нескольких
+    счётчиков - encoders.EncoderCounters.
+    """
+
+    signed = False
+
     def __init__(self, pin_a, name="Encoder"):
         self.pin_a = pin_a
         self.name = name
-        self.__count = 0
+        self.count = 0
+        self.last_tick = None
+        self.seq = 0            # версия count/last_tick (нечётная - идёт обновление)
+        self._base = 0
         
         # Настройка пина
         pi.set_mode(pin_a, pigpio.INPUT)
@@ -63,13 +165,16 @@ class EncoderCounter:
         self.cb = pi.callback(pin_a, pigpio.EITHER_EDGE, self._count_callback)
     
     def _count_callback(self, gpio, level, tick):
-        self.__count += 1
+        self.seq += 1
+        self.count += 1
+        self.last_tick = tick
+        self.seq += 1
     
     def get_count(self):
-        return self.__count
+        return self.count - self._base
     
     def reset(self):
-        self.__count = 0
+        self._base = self.count
     
     def cleanup(self):
         if hasattr(self, 'cb'):
@@ -87,6 +192,9 @@ class Motor:
         self.in2_pin = in2_pin
         self.name = name
         self.current_pwm = 0
+        self.applied_pwm = 0    # скважность со знаком, фактически поданная последним _plan (после всех ограничений)
+        # Наименьшая скважность хода вперёд / назад: MIN_PWM или мёртвая зона по калибровке
+        self.min_duty = (MIN_PWM, MIN_PWM)
         self.last_change_time = time.time()
         self.change_rate_limit = 100  # Максимальное изменение PWM в секунду
 
@@ -95,17 +203,25 @@ class Motor:
         pi.set_mode(in1_pin, pigpio.OUTPUT)
         pi.set_mode(in2_pin, pigpio.OUTPUT)
         
-        # Инициализация ШИМ
-        pi.set_PWM_frequency(pwm_pin, PWM_FREQUENCY)
-        pi.set_PWM_range(pwm_pin, MAX_PWM)
-        pi.set_PWM_dutycycle(pwm_pin, 0)
+        # Инициализация ШИМ (программного или аппаратного, см. PWM_BACKEND)
+        PWM.setup(pwm_pin)
+        gpio.invalidate(pwm_pin)
+        gpio.set_duty(pwm_pin, 0)
         
         # Установка направления
-        pi.write(in1_pin, 0)
-        pi.write(in2_pin, 0)
+        gpio.invalidate(in1_pin)
+        gpio.invalidate(in2_pin)
+        gpio.write_pins({in1_pin: 0, in2_pin: 0})
     
-    def _apply_pwm_direct(self, pwm):
-        """Непосредственное применение скорости"""
+    def set_deadband(self, forward, reverse):
+        """Пороги трогания по калибровке (motor_calibration.py) вместо общего MIN_PWM"""
+        self.min_duty = (float(forward), float(reverse))
+
+    def _plan(self, pwm, coast=False):
+        """
+        Уровни пинов направления и скважность для скорости pwm (без записи).
+        coast=True при нулевой скорости - выбег (обе линии в 0) вместо торможения.
+        """
         # Ограничиваем скорость
         pwm = max(-MAX_PWM, min(MAX_PWM, pwm))
         self.current_pwm = pwm
@@ -113,37 +229,39 @@ class Motor:
         # Управление направлением
         if pwm > 0:
             # ВПЕРЁД
-            pi.write(self.in1_pin, 1)
-            pi.write(self.in2_pin, 0)
-            pwm_value = max(MIN_PWM, pwm)
+            duty = max(self.min_duty[0], pwm)
+            self.applied_pwm = duty
+            return {self.in1_pin: 1, self.in2_pin: 0}, duty
         elif pwm < 0:
             # НАЗАД
-            pi.write(self.in1_pin, 0)
-            pi.write(self.in2_pin, 1)
-            pwm_value = max(MIN_PWM, -pwm)
+            duty = max(self.min_duty[1], -pwm)
+            self.applied_pwm = -duty
+            return {self.in1_pin: 0, self.in2_pin: 1}, duty
+        self.applied_pwm = 0
+        if coast:
+            # ВЫБЕГ (мост отключен, мотор крутится по инерции)
+            return {self.in1_pin: 0, self.in2_pin: 0}, 0
         else:
-            # СТОП
-            # pi.write(self.in1_pin, 0)
-            # pi.write(self.in2_pin, 0)
-            self.brake()
-            pwm_value = 0
+            # СТОП (торможение - короткое замыкание обмоток)
+            return {self.in1_pin: 1, self.in2_pin: 1}, 0
+    
+    def _apply_pwm_direct(self, pwm):
+        """Непосредственное применение скорости"""
+        levels, pwm_value = self._plan(pwm)
+        gpio.write_pins(levels)
         
         # Установка ШИМ
-        pi.set_PWM_dutycycle(self.pwm_pin, pwm_value)
+        gpio.set_duty(self.pwm_pin, pwm_value)
         
         return pwm_value
     
     def brake(self):
         """Торможение (короткое замыкание обмоток)"""
-        pi.write(self.in1_pin, 1)
-        pi.write(self.in2_pin, 1)
-        pi.set_PWM_dutycycle(self.pwm_pin, 0)
-        self.current_pwm = 0
-        print(f"{self.name}: ТОРМОЖЕНИЕ")
+        self._apply_pwm_direct(0)
+        log.debug("%s: ТОРМОЖЕНИЕ", self.name)
 
-    def set_pwm_smooth(self, target_pwm):
-        """Быстрое изменение скорости с защитой от перегрузки"""
-        # Сразу применяем целевое значение, но с ограничением скорости изменения
+    def _rate_limited(self, target_pwm):
+        """Следующее значение ШИМ с ограничением скорости изменения"""
         current_time = time.time()
         time_diff = max(0.001, current_time - self.last_change_time)  # избегаем деления на 0
         
@@ -154,36 +272,42 @@ class Motor:
         delta = target_pwm - self.current_pwm
         if abs(delta) > max_change:
             delta = max_change if delta > 0 else -max_change
+            log.debug("%s: limited change %.1f -> %.1f", self.name, target_pwm - self.current_pwm, delta)
         
-        new_pwm = self.current_pwm + delta
+        self.last_change_time = current_time
+        return self.current_pwm + delta
+
+    def set_pwm_smooth(self, target_pwm):
+        """Быстрое изменение скорости с защитой от перегрузки"""
+        # Сразу применяем целевое значение, но с ограничением скорости изменения
+        new_pwm = self._rate_limited(target_pwm)
         
         # НЕМЕДЛЕННО применяем новое значение
         self._apply_pwm_direct(new_pwm)
-        
-        # Обновляем состояние
-        self.current_pwm = new_pwm
-        self.last_change_time = current_time
-        
-        # Для отладки
-        if delta != (target_pwm - self.current_pwm):
-            print(f"{self.name}: limited change {target_pwm-self.current_pwm:.1f} -> {delta:.1f}")
-        
         return new_pwm
     
-   
-    
     def stop(self):
         """Остановка"""
         #self._apply_pwm_direct(0)
         self.brake()
     
-    def brake(self):
-        """Торможение"""
-        pi.write(self.in1_pin, 1)
-        pi.write(self.in2_pin, 1)
-        pi.set_PWM_dutycycle(self.pwm_pin, 0)
-        self.current_speed = 0
-        print(f"{self.name}: ТОРМОЖЕНИЕ")
-
     # def cleanup(self):
     #     pi.stop()
+
+
+def apply_motors(*commands, gpio=gpio):
+    """
+    Применить скорости сразу нескольким моторам: apply_motors((left, pwm), (right, pwm)).
+    Третий элемент команды (необязательный) - выбег вместо торможения при нуле.
+    Все изменившиеся пины направления уходят одной парой clear/set_bank_1,
+    затем выставляются скважности (только изменившиеся).
+    """
+    levels = {}
+    duties = []
+    for motor, pwm, *coast in commands:
+        motor_levels, duty = motor._plan(pwm, *coast)
+        levels.update(motor_levels)
+        duties.append((motor.pwm_pin, duty))
+    gpio.write_pins(levels)
+    for pin, duty in duties:
+        gpio.set_duty(pin, duty)
@@ -2,6 +2,7 @@
 import pigpio
 import time
 import math
+import threading
 
 import sys
 # # ============================================================================
@@ -14,21 +15,97 @@ import sys
 #     print("Запустите: sudo pigpiod")
 #     sys.exit(1)
 from control_motor import *
+from pigpio_scripts import DaemonChassisScripts
+from control_loop import ControlLoop
+from wheel_control import WheelVelocityController
+from motor_calibration import load_calibration
+from motion_profile import WheelProfile
+from encoders import QuadratureEncoder
+from encoder_hub import EncoderHub
+from odometry import Odometry
+from straight_sync import StraightLineSync
+from traction import TractionMonitor
+from velocity_estimator import VelocityEstimator
+from servo_waves import ServoWaveDriver, smoothstep_widths, SERVO_FRAME_US
+from servo_trajectory import ServoTrajectory, move_duration, jog_estimate, jog_status
+from robot_log import get_logger, get_hot_logger
+
+log = get_logger("chassis")
+hot_log = get_hot_logger("chassis")
+servo_log = get_hot_logger("servo")
 
 def cleanup():
         pi.stop()
 
+# Режимы управления шасси: "open" - джойстик напрямую в ШИМ,
+# "closed" - джойстик в уставки скорости колёс, ШИМ считает ПИД по энкодерам
+CONTROL_MODES = ("open", "closed")
+
 class RobotChassis:
-    def __init__(self):
+    def __init__(self, state=None):
         # Создаём моторы
         self.left_motor = Motor(LEFT_PWM_PIN, LEFT_IN1_PIN, LEFT_IN2_PIN, "Левый")
         self.right_motor = Motor(RIGHT_PWM_PIN, RIGHT_IN1_PIN, RIGHT_IN2_PIN, "Правый")
         
-        # Создаём счётчики энкодеров
-        self.left_encoder = EncoderCounter(LEFT_ENC_A, "Левый энк.")
-        self.right_encoder = EncoderCounter(RIGHT_ENC_A, "Правый энк.")
+        # Создаём квадратурные энкодеры (счёт со знаком направления)
+        if ENCODER_INGEST == "notify":
+            # Фронты приходят пачками через уведомления pigpio, без callback на каждый фронт
+            from encoder_stream import NotificationEncoderReader, StreamedEncoder
+            self.left_encoder = StreamedEncoder(LEFT_ENC_A, LEFT_ENC_B, "Левый энк.", LEFT_ENC_INVERT)
+            self.right_encoder = StreamedEncoder(RIGHT_ENC_A, RIGHT_ENC_B, "Правый энк.", RIGHT_ENC_INVERT)
+            NotificationEncoderReader(pi, [self.left_encoder, self.right_encoder])
+        else:
+            self.left_encoder = QuadratureEncoder(pi, LEFT_ENC_A, LEFT_ENC_B, "Левый энк.", LEFT_ENC_INVERT)
+            self.right_encoder = QuadratureEncoder(pi, RIGHT_ENC_A, RIGHT_ENC_B, "Правый энк.", RIGHT_ENC_INVERT)
         self.curent_speed = 0
         self.limit_speed_tern = 2 # во сколько раз ограничиваем скорость разворота
+        self.state = state # общее хранилище состояния (RobotState), необязательно
+        self.scripts = None # скрипты в демоне pigpio (enable_daemon_scripts)
+        self._apply_lock = threading.Lock() # ШИМ применяют и обработчики запросов, и цикл регулятора
+        self.control_mode = "open"
+        self.control_loop = ControlLoop(CONTROL_RATE_HZ, "chassis")
+        # Все энкодеры опрашиваются одним шагом цикла, первым на каждом тике:
+        # левый и правый отсчёты и скорости относятся к одному моменту
+        self.encoder_hub = EncoderHub(pi, (self.left_encoder, self.right_encoder), self.control_loop)
+        self.odometry = Odometry(self.encoder_hub, self.control_loop, state)
+        # Скорость и ускорение колёс: энкодер + модель мотора (фильтр Калмана)
+        self.velocity_estimator = VelocityEstimator(self.encoder_hub, (self.left_motor, self.right_motor),
+                                                    loop=self.control_loop)
+        # Удержание курса при езде прямо - поправка к уставкам в _profile_step
+        self.sync = StraightLineSync(self.encoder_hub, state)
+        self.velocity = WheelVelocityController(self.left_encoder, self.right_encoder,
+                                                self._apply_closed_loop, state,
+                                                hub=self.encoder_hub,
+                                                estimator=self.velocity_estimator
+                                                if VELOCITY_SOURCE == "kalman" else None)
+
+        # Профили разгона колёс: цель задаёт джойстик, уставки считаются на каждом тике
+        self.left_profile = WheelProfile(PROFILE_MAX_ACCEL, PROFILE_MAX_JERK)
+        self.right_profile = WheelProfile(PROFILE_MAX_ACCEL, PROFILE_MAX_JERK)
+        self._command_pending = False
+        self._last_command = 0.0       # time.monotonic() последней команды движения
+        self._setpoints = (0.0, 0.0)   # уставки колёс прошлого тика (им соответствует поданный ШИМ)
+        self._commands = (0.0, 0.0)    # ШИМ, заданный колёсам в _apply, до урезания "cutback"
+        # Застревание / пробуксовка: ШИМ и уставка против скорости по энкодеру
+        self.traction = TractionMonitor(self.encoder_hub, (self.left_motor, self.right_motor),
+                                        state=state, on_stop=self.stop_robot)
+        self.control_loop.add(self._profile_step)
+
+        # Калибровка ШИМ -> скорость колеса (motor_calibration.py), если она есть
+        self.speed_tables = load_calibration()
+        self.max_wheel_speed = MAX_WHEEL_SPEED_CPS
+        if self.speed_tables:
+            left_table, right_table = self.speed_tables["left"], self.speed_tables["right"]
+            # Общая для обоих бортов максимальная скорость - чтобы "прямо" было прямо
+            self.max_wheel_speed = min(left_table.max_speed, right_table.max_speed)
+            self.traction.speed_tables = self.speed_tables
+            self.velocity_estimator.speed_tables = self.speed_tables
+            self.velocity.set_feedforward(left_table.pwm_for_speed, right_table.pwm_for_speed)
+            # Нижняя граница ШИМ - измеренная мёртвая зона каждого мотора и направления, а не MIN_PWM
+            self.left_motor.set_deadband(*left_table.deadbands)
+            self.right_motor.set_deadband(*right_table.deadbands)
+            self.velocity.set_deadbands(left_table.deadbands, right_table.deadbands)
+            log.info("Motor calibration loaded: max wheel speed %.0f counts/s", self.max_wheel_speed)
     
     def transform_value_control_speed(self, speed): # Преобразуем входные данные от джойстика -100 : 100 в данные заполнения PWM в соответствии с настройками мотора
         if speed < 0:
@@ -41,31 +118,175 @@ class RobotChassis:
             return int((speed / MAX_PWM) * (MAX_PWM - MIN_PWM) + MIN_PWM)
         
     def move_robot(self, controlX, controlY):
-        
-        
-        speed_left = self.transform_value_control_speed(max(-MAX_PWM, min(MAX_PWM * (controlY + controlX), MAX_PWM)))    # преобразуем скорость робота,
-        speed_right = self.transform_value_control_speed(max(-MAX_PWM, min(MAX_PWM * (controlY - controlX), MAX_PWM)))    # в зависимости от положения джойстика
-        print(f'speed_left - {speed_left},\t speed_right - {speed_right}') # для отладки
-        if (speed_left < 0 and speed_right > 0) or (speed_left > 0 and speed_right < 0): # если делаем разворот то ограничиваем скорость
-            speed_right //= self.limit_speed_tern
-            speed_left //= self.limit_speed_tern
-        self.left_motor.set_pwm_smooth(speed_left)
-        self.right_motor.set_pwm_smooth(speed_right)
+        """
+        Задать цель по положению джойстика. Сами уставки колёс плавно
+        подтягиваются к цели в цикле управления (_profile_step), поэтому
+        разгон не зависит от того, как часто приходят команды.
+        """
+        if self.traction.halted:
+            hot_log.warning("Drive command ignored: chassis halted by traction (clear via /traction)")
+            return
+        left, right = self._wheel_fractions(controlX, controlY)
+        hot_log.debug('target_left - %.2f,\t target_right - %.2f', left, right) # для отладки
+        self.left_profile.target = left
+        self.right_profile.target = right
+        self._command_pending = True
+        self._command_received()
 
         # speedA = max(-MAX_PWM, min(speedA, MAX_PWM))    # функция аналогичная constrain в arduino
         # speedB = max(-MAX_PWM, min(speedB, MAX_PWM))    # функция аналогичная constrain в arduino
 
+    def _wheel_fractions(self, controlX, controlY):
+        """Джойстик -> доли полной скорости колёс (-1.0..1.0)"""
+        left = max(-1.0, min(controlY + controlX, 1.0))
+        right = max(-1.0, min(controlY - controlX, 1.0))
+        if left * right < 0: # если делаем разворот то ограничиваем скорость
+            left /= self.limit_speed_tern
+            right /= self.limit_speed_tern
+        return left, right
+
+    def _command_received(self):
+        """Команда клиента пришла: продлить срок хода и покормить сторож в демоне"""
+        self._last_command = time.monotonic()
+        scripts = self.scripts
+        if scripts is not None:
+            scripts.feed()
+
+    def _profile_step(self, dt, now):
+        """Тик цикла управления: продвинуть профили и выдать уставки колёсам"""
+        left, right = self.left_profile, self.right_profile
+        # Клиент пропал: цикл (замкнутый контур, синхронизация) сам ход не продлевает
+        if (left.target or right.target) and now - self._last_command > WATCHDOG_DEADLINE_MS / 1000:
+            log.warning("No drive command for %d ms - stopping", WATCHDOG_DEADLINE_MS)
+            left.target = right.target = 0.0
+            self._command_pending = True
+        # ШИМ, заданный на прошлом тике, против скорости за тик (реакция "stop" сбросит профили)
+        self.traction.update(dt, self._setpoints, self._commands)
+        left.max_accel = right.max_accel = PROFILE_MAX_ACCEL * self.traction.accel_scale
+        moving = not (left.done and right.done)
+        left.step(dt)
+        right.step(dt)
+        left_speed, right_speed = self.sync.adjust(left.value * self.max_wheel_speed,
+                                                   right.value * self.max_wheel_speed, dt)
+        self._setpoints = (left_speed, right_speed)
+
+        if self.control_mode == "closed":
+            self.velocity.set_speeds(left_speed, right_speed)
+            return
+
+        # Без изменений применяем только пришедшую команду (она же кормит сторожевой скрипт)
+        if not moving and not self._command_pending and not self.sync.engaged:
+            return
+        self._command_pending = False
+        left_pwm, left_coast = self._open_loop_pwm(left, left_speed / self.max_wheel_speed,
+                                                   self.left_motor, "left")
+        right_pwm, right_coast = self._open_loop_pwm(right, right_speed / self.max_wheel_speed,
+                                                     self.right_motor, "right")
+        self._apply(left_pwm, right_pwm, coast=(left_coast, right_coast))
+        self._publish_pwm()
+
+    def _open_loop_pwm(self, profile, value, motor, side):
+        """
+        Уставка профиля (value - доля скорости, с поправкой синхронизации)
+        -> (ШИМ, выбег). При замедлении и реверсе колесо проходит зону, где
+        ШИМ его всё равно не крутит: там мотор отпускается в выбег, а не
+        тормозится и не подтягивается к MIN_PWM.
+        """
+        value = max(-1.0, min(value, 1.0))
+        if value == 0:
+            return 0, profile.target != 0   # середина реверса - выбег, полная остановка - тормоз
+        if self.speed_tables:
+            # Калибровка: доля джойстика - это доля реальной скорости колеса
+            pwm = self.speed_tables[side].pwm_for_speed(value * self.max_wheel_speed,
+                                                        starting=motor.current_pwm == 0)
+            return pwm, pwm == 0
+        if profile.decelerating and MAX_PWM * abs(value) < MIN_PWM:
+            return 0, True
+        return self.transform_value_control_speed(MAX_PWM * value), False
+
     def stop_robot(self):
-        self.left_motor.stop()
-        self.right_motor.stop()
+        self._command_received()
+        self.left_profile.reset()
+        self.right_profile.reset()
+        self._command_pending = False
+        self._setpoints = (0.0, 0.0)
+        self.sync.reset()
+        self.traction.reset()
+        self.velocity_estimator.reset()    # источник скорости регулятора - вместе с ним
+        self.velocity.set_speeds(0, 0)
+        self._apply(0, 0)
+        self._publish_pwm()
+
+    def set_control_mode(self, mode):
+        """Переключить режим управления на ходу: "open" или "closed" (робот останавливается)"""
+        if mode not in CONTROL_MODES:
+            raise ValueError(f"Unknown control mode '{mode}' (expected one of {CONTROL_MODES})")
+        if mode == self.control_mode:
+            return
+        if mode == "closed":
+            self.stop_robot()
+            self.velocity.reset()
+            self.velocity_estimator.reset()
+            self.control_mode = mode
+            self.control_loop.add(self.velocity.step)
+        else:
+            self.control_loop.remove(self.velocity.step)
+            self.control_mode = mode
+            self.stop_robot()
+        log.info("Control mode: %s", mode)
+
+    def _apply_closed_loop(self, left_pwm, right_pwm):
+        """Выход регулятора скорости (вызывается из цикла управления)"""
+        self._apply(left_pwm, right_pwm)
+        self._publish_pwm()
+
+    def _apply(self, left_pwm, right_pwm, coast=(False, False)):
+        """
+        Применить ШИМ обоим моторам за один шаг (coast - выбег вместо
+        торможения при нуле). ШИМ урезается реакцией "cutback" на застревание.
+        """
+        left_coast, right_coast = coast
+        self._commands = (left_pwm, right_pwm)
+        left_limit, right_limit = self.traction.power_limits
+        left_pwm *= left_limit
+        right_pwm *= right_limit
+        with self._apply_lock:
+            if self.scripts is None:
+                # Пины направления обоих моторов - одной парой clear/set_bank_1
+                apply_motors((self.left_motor, left_pwm, left_coast),
+                             (self.right_motor, right_pwm, right_coast))
+                return
+            # Вся команда - один run_script в демоне
+            left_levels, left_duty = self.left_motor._plan(left_pwm, left_coast)
+            right_levels, right_duty = self.right_motor._plan(right_pwm, right_coast)
+            left_levels.update(right_levels)
+            self.scripts.apply(left_levels, left_duty, right_duty)
+
+    def enable_daemon_scripts(self, deadline_ms=WATCHDOG_DEADLINE_MS):
+        """Перенести применение команд и сторожевой таймер в демон pigpio"""
+        if self.scripts is None:
+            self.scripts = DaemonChassisScripts(pi, PWM, self.left_motor, self.right_motor,
+                                                deadline_ms)
+
+    def disable_daemon_scripts(self):
+        if self.scripts is not None:
+            self.scripts.cleanup()
+            self.scripts = None
+            gpio.invalidate()  # демон писал в пины в обход теневого регистра
+
+    def _publish_pwm(self):
+        """Записать фактически применённый ШИМ в общее состояние"""
+        if self.state is not None:
+            self.state.update(left_pwm=self.left_motor.current_pwm,
+                              right_pwm=self.right_motor.current_pwm,
+                              t_measured=time.monotonic())
 
     
     
     def stop(self):
         """Остановка"""
-        print("⏹ СТОП")
-        self.left_motor.stop()
-        self.right_motor.stop()
+        log.info("⏹ СТОП")
+        self.stop_robot()
 
 
 
@@ -76,10 +297,21 @@ class ControlServoCam:
     
     def __init__(self, servo_pin=24, min_angle=0.0, max_angle=180.0, 
                  default_angle=90.0, min_pulse=600, max_pulse=2400,
-                 speed_factor=1.0):
+                 speed_factor=1.0, state=None, trajectory=SERVO_TRAJECTORY):
         """
         Args:
             speed_factor (float): Коэффициент скорости (0.1 = медленно, 2.0 = быстро)
+            state (RobotState): Общее состояние, куда пишется текущий угол (необязательно)
+            trajectory (str): "python" - плавное движение шагами из Python,
+                "wave" - вся траектория волной pigpio (не блокирует вызывающего)
+
+        Кроме движения к углу есть режим скорости (jog): клиент присылает
+        скорость поворота, а угол интегрируется на тике цикла сервы
+        с ограничением ускорения (см. jog()).
+
+        Каждое движение запоминается траекторией (servo_trajectory.py):
+        get_angle() - заданный угол на текущий момент, estimated_angle() -
+        оценка фактического с учётом задержки и скорости привода.
         """
         self.servo_pin = servo_pin
         self.min_angle = float(min_angle)
@@ -90,6 +322,16 @@ class ControlServoCam:
         self.target_angle = float(default_angle)
         self.speed_factor = speed_factor
         self.is_moving = False
+        self.state = state
+        self.trajectory = trajectory
+        self._wave = ServoWaveDriver(pi, (servo_pin,)) if trajectory == "wave" else None
+        # Последнее движение: угол на любой момент считается по нему за O(1)
+        self._trajectory = ServoTrajectory.hold(self.current_angle, time.monotonic())
+        # Режим скорости: уставка скорости поворота сглаживается профилем с ограничением ускорения
+        self.control_loop = ControlLoop(SERVO_RATE_HZ, "servo")
+        self._jog = WheelProfile(SERVO_JOG_ACCEL)
+        self._jog_deadline = 0.0
+        self.jogging = False
         
         # # Подключаемся к pigpio демону
         # self.pi = pigpio.pi()
@@ -113,13 +355,76 @@ class ControlServoCam:
         """Непосредственная установка угла без плавности"""
         try:
             pulse_width = self._angle_to_pulsewidth(angle)
+            if self._wave is not None:
+                self._wave.stop()
+            now = time.monotonic()
+            angle = max(self.min_angle, min(float(angle), self.max_angle))
+            self._trajectory = ServoTrajectory(angle, angle, now, 0.0,
+                                               physical_start=self.estimated_angle(now))
             pi.set_servo_pulsewidth(self.servo_pin, pulse_width)
-            self.current_angle = float(angle)
+            self._publish_angle(angle)
             return True
         except Exception as e:
-            print(f"Error in direct angle set: {e}")
+            servo_log.error("Error in direct angle set: %s", e)
             return False
     
+    def jog(self, rate, timeout=SERVO_JOG_TIMEOUT_S):
+        """
+        Режим скорости: поворачивать со скоростью rate (градусов/с, со знаком).
+        Команду нужно повторять чаще timeout, иначе серва плавно остановится;
+        rate = 0 - плавная остановка. Абсолютная установка угла режим отменяет.
+
+        Returns:
+            bool: принята ли команда (не принимается во время движения шагами из Python)
+        """
+        if self.is_moving:
+            return False
+        rate = max(-SERVO_JOG_MAX_RATE, min(float(rate), SERVO_JOG_MAX_RATE))
+        self._jog_deadline = time.monotonic() + timeout
+        self._jog.target = rate
+        if not self.jogging and rate:
+            # Подхватываем угол, в том числе из середины движения волной
+            angle = self.get_angle()
+            if self._wave is not None:
+                self._wave.stop()
+            self._jog.reset()
+            self._jog.target = rate
+            self.current_angle = angle
+            self.target_angle = angle
+            self.jogging = True
+            self.control_loop.add(self._jog_step)
+        return True
+    
+    @property
+    def jog_rate(self):
+        """Текущая скорость поворота в режиме jog (градусов/с)"""
+        return self._jog.value
+    
+    def stop_jog(self):
+        """Сразу выйти из режима скорости (без плавной остановки)"""
+        self.control_loop.remove(self._jog_step)
+        if self.jogging:
+            self._trajectory = ServoTrajectory.hold(self.current_angle, time.monotonic())
+        self.jogging = False
+        self._jog.reset()
+    
+    def _jog_step(self, dt, now):
+        """Тик цикла сервы: скорость к уставке с ограничением ускорения, угол += скорость * dt"""
+        jog = self._jog
+        if now > self._jog_deadline:
+            jog.target = 0.0    # клиент пропал - останавливаемся
+        rate = jog.step(dt)
+        angle = self.current_angle + rate * dt
+        if angle <= self.min_angle or angle >= self.max_angle:
+            # Упёрлись в предел - стоп без перелёта
+            angle = max(self.min_angle, min(angle, self.max_angle))
+            jog.reset()
+        pi.set_servo_pulsewidth(self.servo_pin, self._angle_to_pulsewidth(angle))
+        self.target_angle = angle
+        self._publish_angle(angle)
+        if jog.target == 0.0 and jog.done:
+            self.stop_jog()
+    
     def set_angle(self, angle, smooth=True, duration=None):
         """
         Установка угла с возможностью плавного движения
@@ -133,12 +438,14 @@ class ControlServoCam:
             bool: Успех операции
         """
         try:
+            if self.jogging:
+                self.stop_jog()
             # Приводим к float и ограничиваем
             target_angle = float(angle)
             target_angle = max(self.min_angle, min(target_angle, self.max_angle))
             
             # Если угол не изменился
-            if abs(target_angle - self.current_angle) < 0.1:
+            if abs(target_angle - self.get_angle()) < 0.1:
                 return True
             
             self.target_angle = target_angle
@@ -151,13 +458,19 @@ class ControlServoCam:
                 return self._set_angle_direct(target_angle)
                 
         except Exception as e:
-            print(f"Error setting angle: {e}")
+            servo_log.error("Error setting angle: %s", e)
             return False
     
+    def _move_duration(self, angle_diff, duration=None):
+        """Длительность плавного движения на angle_diff градусов"""
+        return move_duration(angle_diff, self.speed_factor, duration)
+    
     def _move_smoothly(self, target_angle, duration=None):
         """Плавное движение к целевому углу с высокой точностью"""
+        if self._wave is not None:
+            return self._move_wave(target_angle, duration)
         if self.is_moving:
-            print("Servo is already moving")
+            servo_log.debug("Servo is already moving")
             return False
         
         self.is_moving = True
@@ -165,18 +478,10 @@ class ControlServoCam:
         try:
             start_angle = self.current_angle
             angle_diff = target_angle - start_angle
-            
-            # Автоматический расчет длительности
-            if duration is None:
-                # Более плавное вычисление времени
-                base_time = 0.05  # уменьшили базовую задержку
-                # Медленнее на малые расстояния, быстрее на большие
-                proportional_time = abs(angle_diff) / 180.0 * 0.6  # увеличено до 0.6сек
-                duration = base_time + proportional_time
-                duration = duration / self.speed_factor
-            
-            # Ограничиваем длительность
-            duration = max(0.03, min(duration, 1.5))  # уменьшили максимум
+            duration = self._move_duration(angle_diff, duration)
+            now = time.monotonic()
+            self._trajectory = ServoTrajectory(start_angle, target_angle, now, duration,
+                                               physical_start=self.estimated_angle(now))
             
             # Больше шагов для большей плавности
             steps = max(2, int(duration * 150))  # 150 шагов в секунду!
@@ -196,23 +501,54 @@ class ControlServoCam:
                 # Высокая точность импульса
                 pulse_width = self._angle_to_pulsewidth(current_angle)
                 pi.set_servo_pulsewidth(self.servo_pin, pulse_width)
+                self._publish_angle(current_angle)
                 
                 if i < steps:
                     # Микро-задержки для максимальной плавности
                     time.sleep(step_time)
             
-            self.current_angle = target_angle
+            self._publish_angle(target_angle)
             
-            print(f"Servo ultra smooth: {start_angle:.2f}° → {target_angle:.2f}° "
-                  f"in {duration:.3f}s ({steps} steps)")
+            servo_log.debug("Servo ultra smooth: %.2f° → %.2f° in %.3fs (%d steps)",
+                            start_angle, target_angle, duration, steps)
             return True
             
         except Exception as e:
-            print(f"Error in ultra smooth move: {e}")
+            servo_log.error("Error in ultra smooth move: %s", e)
             return False
         finally:
             self.is_moving = False
     
+    def _move_wave(self, target_angle, duration=None):
+        """
+        Плавное движение волной pigpio: траектория считается сразу на все
+        кадры и уходит в демон, вызов не ждёт конца движения. Новая цель
+        в середине движения не отвергается, а продолжает его с текущего угла.
+        """
+        try:
+            start_angle = self.get_angle()
+            duration = self._move_duration(target_angle - start_angle, duration)
+            frames = smoothstep_widths(self._angle_to_pulsewidth(start_angle),
+                                       self._angle_to_pulsewidth(target_angle),
+                                       round(duration * 1e6 / SERVO_FRAME_US))
+            physical_start = self.estimated_angle()
+            self._wave.play([(width,) for width in frames])
+            self._trajectory = ServoTrajectory(start_angle, target_angle, self._wave.started, duration,
+                                               physical_start=physical_start)
+            self._publish_angle(start_angle)
+            servo_log.debug("Servo wave: %.2f° → %.2f° in %.3fs (%d frames)",
+                            start_angle, target_angle, duration, len(frames))
+            return True
+        except Exception as e:
+            servo_log.error("Error in wave move: %s", e)
+            return False
+    
+    def _publish_angle(self, angle):
+        """Обновить текущий угол (в том числе в середине движения)"""
+        self.current_angle = angle
+        if self.state is not None:
+            self.state.update(servo_angle=angle, t_measured=time.monotonic())
+    
     def set_angle_proportional(self, value, min_value=0.0, max_value=100.0):
         """
         Установка угла пропорционально значению (например, от слайдера)
@@ -233,7 +569,7 @@ class ControlServoCam:
     
     def move_by(self, delta_angle, smooth=True):
         """Относительное перемещение на дельту угла"""
-        target_angle = self.current_angle + delta_angle
+        target_angle = self.get_angle() + delta_angle
         return self.set_angle(target_angle, smooth)
     
     def set_speed_factor(self, factor):
@@ -241,9 +577,24 @@ class ControlServoCam:
         self.speed_factor = max(0.1, min(factor, 5.0))
         print(f"Servo speed factor set to: {self.speed_factor}")
     
-    def get_angle(self):
-        """Получение текущего угла с дробной частью"""
-        return self.current_angle
+    def get_angle(self, now=None):
+        """Заданный угол на текущий момент (в том числе в середине движения), O(1)"""
+        if self.jogging:
+            return self.current_angle
+        return self._trajectory.angle_at(time.monotonic() if now is None else now)
+    
+    def estimated_angle(self, now=None):
+        """Оценка фактического угла сервы (модель задержки и скорости привода)"""
+        if self.jogging:
+            return jog_estimate(self.current_angle, self.jog_rate, self.min_angle, self.max_angle)
+        return self._trajectory.estimated_at(time.monotonic() if now is None else now)
+    
+    def trajectory_status(self, now=None):
+        """Текущее движение: старт, цель, профиль, заданный и оценённый угол"""
+        now = time.monotonic() if now is None else now
+        if self.jogging:
+            return jog_status(self.current_angle, self.jog_rate, self.min_angle, self.max_angle)
+        return self._trajectory.as_dict(now)
     
     def cleanup(self):
         """Безопасная очистка ресурсов"""
@@ -252,6 +603,10 @@ class ControlServoCam:
                 # Ждем завершения движения
                 while self.is_moving:
                     time.sleep(0.01)
+                self.stop_jog()
+                self.control_loop.stop()
+                if self._wave is not None:
+                    self._wave.stop()
                 
                 # Отключаем серву
                 try:
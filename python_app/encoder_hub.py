@@ -0,0 +1,101 @@
+# encoder_hub.py
+"""
+Общий опрос всех энкодеров одним таймером.
+
+В test_motors_encoders.py каждый Encoder заводит свой поток _update_rpm,
+который раз в 100 мс считает скорость и складывает историю в списки и
+deque. Здесь все энкодеры принадлежат одному EncoderHub: он опрашивается
+шагом цикла управления (ControlLoop), берёт один tick pigpio на всех
+и читает счёт всех энкодеров одним согласованным снимком (read_counts),
+так что левый и правый отсчёты относятся к одному моменту, и пишет
+историю в кольцевые буферы NumPy фиксированного размера:
+
+    ticks  (N,)       tick pigpio момента опроса
+    counts (N, E)     счёт каждого энкодера
+    speeds (N, E)     скорость (отсчётов/с) по WheelSpeedEstimator
+
+Фильтры считаются сразу для всех энкодеров векторно: экспоненциальное
+сглаживание (EMA) обновляется на каждом опросе, медиана - по последним
+окну строк кольцевого буфера.
+"""
+
+import numpy as np
+
+from control_motor import ENCODER_HISTORY, ENCODER_EMA_TAU, ENCODER_MEDIAN_WINDOW
+from encoders import WheelSpeedEstimator, EncoderCounters, read_counts
+
+
+class EncoderHub:
+    """
+    Владелец всех энкодеров и их истории.
+
+    Args:
+        pi: подключение pigpio (для get_current_tick)
+        encoders: энкодеры (QuadratureEncoder / StreamedEncoder) в порядке столбцов
+        loop: ControlLoop, на тике которого делается опрос (None - вызывать sample() самому)
+    """
+
+    def __init__(self, pi, encoders, loop=None, history=ENCODER_HISTORY, ema_tau=ENCODER_EMA_TAU):
+        self.pi = pi
+        self.encoders = tuple(encoders)
+        self.estimators = tuple(WheelSpeedEstimator(e) for e in self.encoders)
+        self.counters = EncoderCounters(self.encoders)
+        self.ema_tau = ema_tau
+        size = len(self.encoders)
+        self.ticks = np.zeros(history, dtype=np.uint32)
+        self.counts = np.zeros((history, size), dtype=np.int64)
+        self.speeds = np.zeros((history, size), dtype=np.float64)
+        self.ema = np.zeros(size, dtype=np.float64)
+        self.samples = 0            # всего опросов (индекс следующей строки = samples % history)
+        # Последний опрос одним кортежем - читатели получают согласованную пару без блокировки
+        self.latest = (0, (0,) * size, (0.0,) * size)
+        if loop is not None:
+            loop.add(self.sample)
+
+    def sample(self, dt=None, now=None):
+        """Опросить все энкодеры (подходит как шаг ControlLoop)"""
+        tick = self.pi.get_current_tick()
+        _, counts = read_counts(self.encoders)
+        speeds = tuple(est.update(tick) for est in self.estimators)
+
+        row = self.samples % len(self.ticks)
+        self.ticks[row] = tick
+        self.counts[row] = counts
+        self.speeds[row] = speeds
+
+        if self.samples and dt:
+            alpha = min(1.0, dt / self.ema_tau)
+            self.ema += alpha * (self.speeds[row] - self.ema)
+        else:
+            self.ema[:] = self.speeds[row]
+        self.samples += 1
+        self.latest = (tick, counts, speeds)
+
+    def _recent_rows(self, window):
+        window = max(1, min(window, self.samples, len(self.ticks)))
+        return (self.samples - 1 - np.arange(window)) % len(self.ticks)
+
+    def median(self, window=ENCODER_MEDIAN_WINDOW):
+        """Медиана скорости всех энкодеров по последним window опросам"""
+        if not self.samples:
+            return np.zeros(len(self.encoders))
+        return np.median(self.speeds[self._recent_rows(window)], axis=0)
+
+    def history(self, window=None):
+        """Последние window опросов по порядку времени: (ticks, counts, speeds)"""
+        rows = self._recent_rows(window or len(self.ticks))[::-1]
+        return self.ticks[rows], self.counts[rows], self.speeds[rows]
+
+    def status(self):
+        """Последний опрос и фильтры (для API)"""
+        tick, counts, speeds = self.latest
+        median = self.median()
+        return {"tick": tick, "samples": self.samples,
+                "encoders": [{"name": e.name, "count": counts[i], "speed": speeds[i],
+                              "speed_ema": float(self.ema[i]), "speed_median": float(median[i]),
+                              "errors": e.errors, "edge_stats": e.edge_stats()}
+                             for i, e in enumerate(self.encoders)]}
+
+    def reset_stats(self):
+        for encoder in self.encoders:
+            encoder.reset_stats()
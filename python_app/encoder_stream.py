@@ -0,0 +1,329 @@
+# encoder_stream.py
+"""
+Пакетный приём фронтов энкодеров через поток уведомлений pigpio.
+
+В режиме callback каждый фронт - это вызов Python-функции в потоке
+callback'ов pigpio, и на больших оборотах он забирает GIL у Flask.
+Здесь вместо callback'ов открывается handle уведомлений (notify_open)
+на пины энкодеров: демон пишет в канал /dev/pigpioN 12-байтные отчёты
+(seqno, flags, tick, уровни всего банка) на каждое изменение уровня.
+Поток чтения забирает их большими кусками и декодирует все каналы всех
+энкодеров одним проходом NumPy по той же таблице переходов, что и
+QuadratureEncoder (encoders.py). Python-работа на фронт исчезает:
+на кусок из тысяч отчётов - десяток векторных операций.
+
+Отчёт фиксирует уровни всего банка, поэтому в нём могут быть строки без
+изменения данного энкодера (сменился другой пин) - они пропускаются, а
+смена обоих битов сразу (два фронта между отчётами) считается ошибкой.
+Потерянные отчёты видны по разрывам seqno.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from encoders import TRANSITIONS, ILLEGAL, TICK_MASK, EdgeStats, configure_input_filters
+from robot_log import get_logger
+
+log = get_logger("encoders")
+
+REPORT_DTYPE = np.dtype([("seqno", "<u2"), ("flags", "<u2"), ("tick", "<u4"), ("level", "<u4")])
+
+# Флаги отчёта pigpio: сторожевой таймер, keep-alive, событие - не изменения уровня
+NTFY_FLAGS_SPECIAL = 0x20 | 0x40 | 0x80
+
+CHUNK_REPORTS = 4096        # Сколько отчётов читать за один раз
+BATCH_INTERVAL = 0.005      # Пауза между чтениями - отчёты копятся в канале пачкой
+
+_DELTA = np.array([0 if d == ILLEGAL else d for d in TRANSITIONS], dtype=np.int64)
+_ILLEGAL = np.array([d == ILLEGAL for d in TRANSITIONS], dtype=bool)
+
+
+class StreamedEncoder:
+    """Энкодер, который наполняет поток уведомлений (API как у QuadratureEncoder)"""
+
+    signed = True
+
+    def __init__(self, pin_a, pin_b, name="Encoder", invert=False):
+        self.pin_a = pin_a
+        self.pin_b = pin_b
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.last_tick = None
+        self.seq = 0            # версия count/last_tick (см. encoders.read_counts)
+        self._base = 0
+        self.direction = 0
+        self.period_us = 0
+        self.invert = invert
+        self._edge_ticks = []   # tick'и последних фронтов текущего направления (до 4)
+        self.reader = None      # NotificationEncoderReader, который его наполняет
+        self.stats = EdgeStats()
+        self._pin_ticks = [None, None]
+
+    def get_count(self):
+        return self.count - self._base
+
+    def reset(self):
+        self._base = self.count
+        self.errors = 0
+
+    def edge_stats(self):
+        return self.stats.as_dict(self.errors)
+
+    def reset_stats(self):
+        self.stats.reset()
+        self.errors = 0
+
+    def cleanup(self):
+        if self.reader is not None:
+            self.reader.cleanup()
+
+
+class BatchQuadratureDecoder:
+    """
+    Векторное декодирование отчётов pigpio для нескольких энкодеров.
+
+    Args:
+        encoders: [StreamedEncoder, ...]
+        initial_level: уровни банка 1 на момент старта (pi.read_bank_1())
+    """
+
+    def __init__(self, encoders, initial_level=0):
+        self.encoders = list(encoders)
+        self.lost_reports = 0
+        self.reports = 0
+        self.batches = 0
+        pins = [pin for e in self.encoders for pin in (e.pin_a, e.pin_b)]
+        self._shifts = np.array(pins, dtype=np.uint32)
+        self._signs = np.array([-1 if e.invert else 1 for e in self.encoders], dtype=np.int64)
+        self._bits = self._pin_bits(np.array([initial_level], dtype=np.uint32))[0]
+        self._last_seqno = None
+
+    def _pin_bits(self, levels):
+        """Уровни банка (N,) -> уровни пинов энкодеров (N, 2 * число энкодеров): A0, B0, A1, B1..."""
+        return (levels[:, None] >> self._shifts[None, :]) & 1
+
+    @staticmethod
+    def _states(bits):
+        """Уровни пинов -> 2-битные состояния (A << 1) | B (N, число энкодеров)"""
+        return (bits[:, 0::2] << 1) | bits[:, 1::2]
+
+    def decode(self, reports):
+        """Декодировать пачку отчётов (массив REPORT_DTYPE) для всех энкодеров сразу"""
+        self.batches += 1
+        self.reports += len(reports)
+
+        seqno = reports["seqno"].astype(np.int64)
+        if self._last_seqno is not None:
+            seqno = np.concatenate(([self._last_seqno], seqno))
+        if len(seqno) > 1:
+            self.lost_reports += int(((np.diff(seqno) - 1) % 65536).sum())
+        self._last_seqno = int(seqno[-1])
+
+        reports = reports[(reports["flags"] & NTFY_FLAGS_SPECIAL) == 0]
+        if not len(reports):
+            return
+
+        bits = self._pin_bits(reports["level"])                     # (N, 2E)
+        prev_bits = np.vstack((self._bits[None, :], bits[:-1]))
+        self._bits = bits[-1]
+        pin_changed = prev_bits != bits
+        states = self._states(bits)                                 # (N, E)
+        prev = self._states(prev_bits)
+
+        changed = prev != states
+        index = (prev << 2) | states
+        deltas = np.where(changed, _DELTA[index], 0).sum(axis=0) * self._signs
+        errors = (changed & _ILLEGAL[index]).sum(axis=0)
+
+        ticks = reports["tick"]
+        for i, encoder in enumerate(self.encoders):
+            moved = np.flatnonzero(changed[:, i])
+            if not len(moved):
+                continue
+            encoder.errors += int(errors[i])
+            self._update_stats(encoder, i, ticks, moved, pin_changed)
+            encoder.seq += 1
+            encoder.count += int(deltas[i])
+            encoder.last_tick = int(ticks[moved[-1]])
+            encoder.seq += 1
+            self._update_period(encoder, i, index[moved, i], ticks[moved])
+
+    @staticmethod
+    def _intervals(last_tick, ticks):
+        """Интервалы между фронтами (мкс) с учётом предыдущего фронта и переполнения tick"""
+        ticks = ticks.astype(np.int64)
+        if last_tick is not None:
+            ticks = np.concatenate(([last_tick], ticks))
+        return np.diff(ticks) & TICK_MASK
+
+    def _update_stats(self, encoder, i, ticks, moved, pin_changed):
+        """Статистика фронтов (как в QuadratureEncoder), векторно по пачке"""
+        stats = encoder.stats
+        stats.edges += len(moved)
+        intervals = self._intervals(encoder.last_tick, ticks[moved])
+        if len(intervals):
+            shortest = int(intervals.min())
+            if stats.min_edge_us is None or shortest < stats.min_edge_us:
+                stats.min_edge_us = shortest
+        for channel in (0, 1):
+            rows = np.flatnonzero(pin_changed[:, 2 * i + channel])
+            if not len(rows):
+                continue
+            widths = self._intervals(encoder._pin_ticks[channel], ticks[rows])
+            encoder._pin_ticks[channel] = int(ticks[rows[-1]])
+            if len(widths):
+                shortest = int(widths.min())
+                if stats.min_pulse_us[channel] is None or shortest < stats.min_pulse_us[channel]:
+                    stats.min_pulse_us[channel] = shortest
+                stats.glitches += int((widths < stats.glitch_threshold_us).sum())
+
+    def _update_period(self, encoder, i, index, ticks):
+        """Направление и длительность последних 4 фронтов (как в QuadratureEncoder)"""
+        directions = _DELTA[index] * self._signs[i]
+        legal = directions != 0
+        directions, ticks = directions[legal], ticks[legal]
+        if not len(directions):
+            return
+        direction = int(directions[-1])
+        flips = np.flatnonzero(directions != direction)
+        if len(flips) or direction != encoder.direction:
+            # Смена направления - период считается заново
+            history = []
+            ticks = ticks[flips[-1] + 1:] if len(flips) else ticks
+            encoder.period_us = 0
+        else:
+            history = encoder._edge_ticks
+        recent = history + ticks[-5:].tolist()
+        if len(recent) >= 5:
+            encoder.period_us = (recent[-1] - recent[-5]) & TICK_MASK
+        encoder._edge_ticks = recent[-4:]
+        encoder.direction = direction
+
+
+class NotificationEncoderReader:
+    """
+    Поток чтения уведомлений pigpio для нескольких квадратурных энкодеров.
+
+    Args:
+        pi: подключение pigpio (демон на этой же машине - канал /dev/pigpioN)
+        encoders: [StreamedEncoder, ...]
+    """
+
+    def __init__(self, pi, encoders):
+        import pigpio
+        self.pi = pi
+        mask = 0
+        for encoder in encoders:
+            encoder.reader = self
+            for pin in (encoder.pin_a, encoder.pin_b):
+                pi.set_mode(pin, pigpio.INPUT)
+                pi.set_pull_up_down(pin, pigpio.PUD_UP)
+                mask |= 1 << pin
+            # Дребезг отсекается в демоне - в отчёты уведомлений он не попадает
+            configure_input_filters(pi, (encoder.pin_a, encoder.pin_b))
+        # Начальное состояние всех энкодеров - из одного чтения банка
+        self.decoder = BatchQuadratureDecoder(encoders, pi.read_bank_1())
+        self.encoders = self.decoder.encoders
+        self._remainder = b""
+
+        self.handle = pi.notify_open()
+        if self.handle < 0:
+            raise RuntimeError(f"pigpio notify_open failed: {self.handle}")
+        self._fd = os.open(f"/dev/pigpio{self.handle}", os.O_RDONLY)
+        pi.notify_begin(self.handle, mask)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="encoder-notify", daemon=True)
+        self._thread.start()
+        log.info("Encoder notification stream on /dev/pigpio%d (mask 0x%08x)", self.handle, mask)
+
+    def _run(self):
+        size = REPORT_DTYPE.itemsize
+        while self._running:
+            try:
+                data = os.read(self._fd, CHUNK_REPORTS * size)
+            except OSError as e:
+                if self._running:
+                    log.error("Encoder notification read failed: %s", e)
+                break
+            if not data:
+                break
+            data = self._remainder + data
+            whole = len(data) - len(data) % size
+            self._remainder = data[whole:]
+            if whole:
+                self.decoder.decode(np.frombuffer(data[:whole], dtype=REPORT_DTYPE))
+            time.sleep(BATCH_INTERVAL)
+
+    def cleanup(self):
+        if not self._running:
+            return
+        self._running = False
+        try:
+            self.pi.notify_close(self.handle)   # демон закроет канал - read() вернёт EOF
+        except Exception:
+            pass
+        self._thread.join(timeout=1)
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+
+# ============================================================================
+# БЕНЧМАРК: ДЕКОДИРОВАНИЕ ПАЧКИ ПРОТИВ CALLBACK НА ФРОНТ
+# ============================================================================
+
+def _synthetic_reports(count, pins):
+    """Отчёты вращения вперёд всех энкодеров сразу: 00 -> 10 -> 11 -> 01 -> 00"""
+    states = (0b10, 0b11, 0b01, 0b00)
+    reports = np.zeros(count, dtype=REPORT_DTYPE)
+    reports["seqno"] = np.arange(count) % 65536
+    reports["tick"] = np.arange(count) * 50
+    level = np.zeros(count, dtype=np.uint32)
+    sequence = np.array(states, dtype=np.uint32)[np.arange(count) % 4]
+    for pin_a, pin_b in pins:
+        level |= ((sequence >> 1) & 1) << pin_a
+        level |= (sequence & 1) << pin_b
+    reports["level"] = level
+    return reports
+
+
+def benchmark(reports=100000):
+    import control_motor
+    from control_motor import LEFT_ENC_A, LEFT_ENC_B, RIGHT_ENC_A, RIGHT_ENC_B
+    from encoders import QuadratureEncoder, _NoCallbackPi, _edge_sequence
+
+    pins = [(LEFT_ENC_A, LEFT_ENC_B), (RIGHT_ENC_A, RIGHT_ENC_B)]
+    data = _synthetic_reports(reports, pins)
+
+    decoder = BatchQuadratureDecoder([StreamedEncoder(a, b) for a, b in pins])
+
+    start = time.perf_counter()
+    for i in range(0, reports, CHUNK_REPORTS):
+        decoder.decode(data[i:i + CHUNK_REPORTS])
+    batch_s = (time.perf_counter() - start) / (reports * len(pins))
+
+    encoder = QuadratureEncoder(_NoCallbackPi(control_motor.pi), LEFT_ENC_A, LEFT_ENC_B)
+    encoder.state = 0
+    handlers = {LEFT_ENC_A: encoder._edge_a, LEFT_ENC_B: encoder._edge_b}
+    sequence = _edge_sequence(reports, LEFT_ENC_A, LEFT_ENC_B)
+    start = time.perf_counter()
+    for gpio, level, tick in sequence:
+        handlers[gpio](gpio, level, tick)
+    callback_s = (time.perf_counter() - start) / reports
+
+    print(f"{'mode':9} {'us/edge':>9}")
+    print(f"{'callback':9} {callback_s * 1e6:9.3f}  (без учёта диспетчеризации callback'ов pigpio)")
+    print(f"{'batch':9} {batch_s * 1e6:9.3f}  (пачки по {CHUNK_REPORTS} отчётов)")
+    print(f"Счёт пачек: {[e.count for e in decoder.encoders]} (ожидалось {reports}), "
+          f"ошибок: {[e.errors for e in decoder.encoders]}, потеряно отчётов: {decoder.lost_reports}")
+    return callback_s, batch_s
+
+
+if __name__ == "__main__":
+    benchmark()
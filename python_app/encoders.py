@@ -0,0 +1,564 @@
+# encoders.py
+"""
+Квадратурные энкодеры колёс.
+
+pigpio передаёт в callback номер пина и его новый уровень, поэтому
+читать пины через pi.read() (два запроса к демону на каждый фронт, как
+в Encoder._callback из test_motors_encoders.py) не нужно. Декодер
+хранит предыдущее 2-битное состояние (A << 1) | B, подставляет в него
+новый уровень сработавшего пина и берёт приращение счёта из таблицы
+переходов на 16 элементов.
+
+Прямое направление: 00 -> 10 -> 11 -> 01 -> 00 (передний фронт A при
+B = 0), как в Encoder._callback. Каждый callback - это фронт, состояние
+обязано измениться, поэтому "переход" в то же состояние означает
+пропущенный фронт и, как и смена обоих битов сразу, считается ошибкой.
+
+Для оценки скорости каждый энкодер помнит tick последнего фронта,
+направление и длительность последнего полного периода сигнала (4 фронта:
+так неравные четверти периода из-за несимметрии каналов не вносят шум).
+WheelSpeedEstimator смешивает оценку по периоду (точна на малой скорости,
+где за тик регулятора приходит 0-2 фронта) и по числу фронтов между
+их метками времени (точна на большой скорости).
+
+Дребезг отсекается в самом демоне: на пины энкодера ставится фильтр
+глитчей pigpio (set_glitch_filter) и, при желании, фильтр шума
+(set_noise_filter) - отброшенный фронт не стоит ни callback'а, ни
+отчёта уведомлений. Сколько фронтов отбросил демон, он не сообщает,
+поэтому для настройки фильтров декодер ведёт статистику того, что
+до него дошло: минимальный интервал между фронтами, самый короткий
+импульс на каждом пине, короткие импульсы (глитчи), прошедшие фильтр,
+и недопустимые переходы.
+
+Счёт пишет только поток callback'ов pigpio (один на подключение - все
+фронты всех энкодеров приходят из него по очереди). Остальные потоки
+(Flask, регулятор, калибровка) счёт не пишут и блокировок не берут:
+- каждый энкодер ведёт счётчик версий seq (seqlock, как в RobotState):
+  нечётный - идёт обновление, чётный - count и last_tick согласованы;
+- EncoderCounters читает несколько энкодеров сразу и повторяет попытку,
+  если хоть одна версия была нечётной или изменилась за время чтения, -
+  получается снимок всех счётчиков на один момент (после фронта с tick);
+- сброс не обнуляет count, а запоминает базу, от которой считается
+  следующий снимок, поэтому фронт не теряется, даже если пришёл во время
+  сброса: он попадает либо в возвращённый снимок, либо в следующий.
+
+Бенчмарк стоимости одного фронта (моторы не крутятся) и стресс-тест
+снимков (синтетические фронты из другого потока):
+    python3 encoders.py
+    python3 encoders.py --stress
+"""
+
+import threading
+import time
+
+import pigpio
+
+from control_motor import SPEED_BLEND_LOW_EDGES, SPEED_BLEND_HIGH_EDGES, SPEED_STOP_TIMEOUT_S, \
+    ENCODER_GLITCH_FILTER_US, ENCODER_NOISE_FILTER
+
+ILLEGAL = 2     # Значение в таблице для недопустимого перехода
+TICK_MASK = 0xFFFFFFFF  # tick pigpio - 32-битный счётчик микросекунд с переполнением
+
+# Индекс: (предыдущее состояние << 2) | новое состояние
+TRANSITIONS = (
+    # новое:  00       01       10       11
+    ILLEGAL, -1,      1,       ILLEGAL,     # было 00
+    1,       ILLEGAL, ILLEGAL, -1,          # было 01
+    -1,      ILLEGAL, ILLEGAL, 1,           # было 10
+    ILLEGAL, 1,       -1,      ILLEGAL,     # было 11
+)
+
+
+def configure_input_filters(pi, pins, glitch_us=ENCODER_GLITCH_FILTER_US, noise=ENCODER_NOISE_FILTER):
+    """
+    Фильтры демона pigpio на входах энкодера: уровень сообщается, только
+    если он продержался glitch_us; noise = (steady_us, active_us) или None.
+    Действуют и на callback'и, и на уведомления.
+    """
+    for pin in pins:
+        pi.set_glitch_filter(pin, glitch_us)
+        if noise:
+            pi.set_noise_filter(pin, *noise)
+        else:
+            pi.set_noise_filter(pin, 0, 0)
+
+
+class EdgeStats:
+    """Статистика фронтов одного энкодера (для настройки фильтров)"""
+
+    def __init__(self, glitch_us=ENCODER_GLITCH_FILTER_US):
+        # Короче этого импульс считаем глитчем, прошедшим фильтр демона
+        self.glitch_threshold_us = max(2 * glitch_us, 20)
+        self.reset()
+
+    def reset(self):
+        self.edges = 0
+        self.min_edge_us = None             # минимальный интервал между любыми фронтами
+        self.min_pulse_us = [None, None]    # самый короткий импульс на канале A / B
+        self.glitches = 0                   # импульсы короче glitch_threshold_us
+
+    def as_dict(self, errors):
+        return {"edges": self.edges, "min_edge_us": self.min_edge_us,
+                "min_pulse_a_us": self.min_pulse_us[0], "min_pulse_b_us": self.min_pulse_us[1],
+                "glitches": self.glitches, "glitch_threshold_us": self.glitch_threshold_us,
+                "illegal_transitions": errors}
+
+
+class QuadratureEncoder:
+    """
+    Счётчик квадратурного энкодера со знаком (по обоим фронтам обоих
+    каналов - 4 отсчёта на период сигнала).
+
+    Args:
+        pi: подключение pigpio
+        pin_a, pin_b: каналы энкодера
+        invert (bool): поменять знак (если мотор установлен зеркально)
+    """
+
+    signed = True   # счёт со знаком направления (EncoderCounter - без знака)
+
+    def __init__(self, pi, pin_a, pin_b, name="Encoder", invert=False):
+        self.pi = pi
+        self.pin_a = pin_a
+        self.pin_b = pin_b
+        self.name = name
+        self.count = 0          # пишет только поток callback'ов (get_count() - от последнего reset)
+        self.errors = 0         # недопустимые переходы (пропущенные фронты)
+        self.last_tick = None   # tick последнего фронта (мкс, счётчик pigpio)
+        self.seq = 0            # версия count/last_tick (нечётная - идёт обновление)
+        self._base = 0          # count на момент reset()
+        self.direction = 0      # направление последнего фронта (+1/-1)
+        self.period_us = 0      # длительность последних 4 фронтов (0 - ещё не набралось)
+        self._sign = -1 if invert else 1
+        self._edge_ticks = [None] * 4
+        self._edge_index = 0
+        self.stats = EdgeStats()
+        self._pin_ticks = [None, None]      # tick последнего фронта на A / B
+
+        for pin in (pin_a, pin_b):
+            pi.set_mode(pin, pigpio.INPUT)
+            pi.set_pull_up_down(pin, pigpio.PUD_UP)
+        configure_input_filters(pi, (pin_a, pin_b))
+
+        # Начальное состояние читается один раз, дальше уровни приходят в callback
+        self.state = (pi.read(pin_a) << 1) | pi.read(pin_b)
+        self.cb_a = pi.callback(pin_a, pigpio.EITHER_EDGE, self._edge_a)
+        self.cb_b = pi.callback(pin_b, pigpio.EITHER_EDGE, self._edge_b)
+
+    def _edge_a(self, gpio, level, tick):
+        if level > 1:
+            return  # таймаут сторожевого таймера pigpio, а не фронт
+        prev = self.state
+        new = (level << 1) | (prev & 1)
+        self._pulse(0, tick)
+        self._transition(prev, new, tick)
+
+    def _edge_b(self, gpio, level, tick):
+        if level > 1:
+            return
+        prev = self.state
+        new = (prev & 2) | level
+        self._pulse(1, tick)
+        self._transition(prev, new, tick)
+
+    def _pulse(self, channel, tick):
+        """Длительность импульса на канале (от его предыдущего фронта)"""
+        last = self._pin_ticks[channel]
+        self._pin_ticks[channel] = tick
+        if last is None:
+            return
+        width = (tick - last) & TICK_MASK
+        stats = self.stats
+        shortest = stats.min_pulse_us[channel]
+        if shortest is None or width < shortest:
+            stats.min_pulse_us[channel] = width
+        if width < stats.glitch_threshold_us:
+            stats.glitches += 1
+
+    def _transition(self, prev, new, tick):
+        delta = TRANSITIONS[(prev << 2) | new]
+        self.state = new
+        self.seq += 1
+        stats = self.stats
+        stats.edges += 1
+        if self.last_tick is not None:
+            interval = (tick - self.last_tick) & TICK_MASK
+            if stats.min_edge_us is None or interval < stats.min_edge_us:
+                stats.min_edge_us = interval
+        if delta == ILLEGAL:
+            self.last_tick = tick
+            self.seq += 1
+            self.errors += 1
+            return
+        delta *= self._sign
+        self.count += delta
+        self.last_tick = tick
+        self.seq += 1
+        if delta != self.direction:
+            # Смена направления - период через точку разворота не имеет смысла
+            self.direction = delta
+            self.period_us = 0
+            self._edge_ticks = [None] * 4
+        ticks = self._edge_ticks
+        i = self._edge_index
+        if ticks[i] is not None:
+            self.period_us = (tick - ticks[i]) & TICK_MASK
+        ticks[i] = tick
+        self._edge_index = (i + 1) & 3
+
+    def get_count(self):
+        return self.count - self._base
+
+    def reset(self):
+        self._base = self.count
+        self.errors = 0
+
+    def edge_stats(self):
+        return self.stats.as_dict(self.errors)
+
+    def reset_stats(self):
+        self.stats.reset()
+        self.errors = 0
+
+    def cleanup(self):
+        for cb in (self.cb_a, self.cb_b):
+            cb.cancel()
+
+
+# ============================================================================
+# СНИМКИ СЧЁТЧИКОВ БЕЗ БЛОКИРОВКИ НА ФРОНТЕ
+# ============================================================================
+
+def _newest_tick(ticks):
+    """Самый поздний tick с учётом переполнения (None - фронтов не было)"""
+    newest = None
+    for tick in ticks:
+        if tick is not None and (newest is None or ((tick - newest) & TICK_MASK) < 0x80000000):
+            newest = tick
+    return newest
+
+
+def read_counts(encoders):
+    """
+    Согласованные абсолютные счёты нескольких энкодеров: (tick, counts),
+    где tick - последний фронт, вошедший в снимок. Без блокировки; при
+    гонке с потоком callback'ов чтение повторяется.
+    """
+    while True:
+        versions = [encoder.seq for encoder in encoders]
+        if not any(v & 1 for v in versions):
+            counts = tuple(encoder.count for encoder in encoders)
+            ticks = [encoder.last_tick for encoder in encoders]
+            if all(encoder.seq == v for encoder, v in zip(encoders, versions)):
+                return _newest_tick(ticks), counts
+        time.sleep(0)   # отдать GIL писателю
+
+
+class EncoderCounters:
+    """
+    Атомарные снимки счёта группы энкодеров (обычно левый и правый).
+
+    Счёт в снимках - от последнего snapshot_and_reset()/reset() группы,
+    независимо от reset() отдельных энкодеров.
+    """
+
+    def __init__(self, encoders):
+        self.encoders = tuple(encoders)
+        _, self._base = read_counts(self.encoders)
+        # Сериализует только читателей, сбрасывающих базу; фронты её не берут
+        self._reset_lock = threading.Lock()
+
+    def snapshot(self):
+        """(tick, counts): счёт всех энкодеров в один момент"""
+        # Под той же блокировкой, что и сброс: иначе счёт до сброса вычитался бы из новой базы
+        with self._reset_lock:
+            tick, counts = read_counts(self.encoders)
+            base = self._base
+        return tick, tuple(c - b for c, b in zip(counts, base))
+
+    def snapshot_and_reset(self):
+        """Снимок и сброс одной операцией: каждый фронт попадает ровно в один снимок"""
+        with self._reset_lock:
+            tick, counts = read_counts(self.encoders)
+            base, self._base = self._base, counts
+        return tick, tuple(c - b for c, b in zip(counts, base))
+
+    def reset(self):
+        self.snapshot_and_reset()
+
+
+# ============================================================================
+# ОЦЕНКА СКОРОСТИ ПО МЕТКАМ ВРЕМЕНИ ФРОНТОВ
+# ============================================================================
+
+class WheelSpeedEstimator:
+    """
+    Скорость колеса (отсчётов энкодера в секунду) по tick'ам фронтов.
+
+    - По периоду: 4 фронта / длительность последнего периода. Если нового
+      фронта нет дольше, чем интервал между фронтами, скорость заведомо
+      не больше 1 / (время с последнего фронта) - оценка плавно спадает
+      к нулю, а после SPEED_STOP_TIMEOUT_S без фронтов равна нулю.
+    - По счёту: фронты за интервал / время между последними фронтами
+      прошлого и текущего опроса (а не между моментами опроса).
+
+    Вес оценки по счёту растёт линейно от 0 при SPEED_BLEND_LOW_EDGES
+    фронтах за интервал опроса до 1 при SPEED_BLEND_HIGH_EDGES.
+    """
+
+    def __init__(self, encoder, low_edges=SPEED_BLEND_LOW_EDGES, high_edges=SPEED_BLEND_HIGH_EDGES,
+                 stop_timeout=SPEED_STOP_TIMEOUT_S):
+        self.encoder = encoder
+        self.low_edges = low_edges
+        self.high_edges = high_edges
+        self.stop_timeout_us = int(stop_timeout * 1e6)
+        self.speed = 0.0
+        self.period_speed = 0.0
+        self.count_speed = 0.0
+        self._last_count = None
+        self._last_edge_tick = None
+
+    def update(self, now_tick):
+        """Новая оценка; now_tick - текущий tick pigpio (pi.get_current_tick())"""
+        encoder = self.encoder
+        count = encoder.count
+        edge_tick = encoder.last_tick
+        period = encoder.period_us
+        direction = encoder.direction
+
+        last_count, last_edge_tick = self._last_count, self._last_edge_tick
+        self._last_count, self._last_edge_tick = count, edge_tick
+        if last_count is None or edge_tick is None:
+            return self.speed
+
+        # По периоду, с верхней границей по времени с последнего фронта
+        since_edge = (now_tick - edge_tick) & TICK_MASK
+        if since_edge > self.stop_timeout_us or not direction or not period:
+            period_speed = 0.0
+        else:
+            period_speed = direction * min(4e6 / period, 1e6 / max(since_edge, 1))
+
+        edges = count - last_count
+        weight = 0.0
+        if edges and last_edge_tick is not None and edge_tick != last_edge_tick:
+            span = (edge_tick - last_edge_tick) & TICK_MASK
+            self.count_speed = edges * 1e6 / span
+            weight = (abs(edges) - self.low_edges) / (self.high_edges - self.low_edges)
+            # Полного периода ещё нет (трогание, разворот) - верим только счёту
+            weight = max(0.0, min(1.0, weight)) if period else 1.0
+        else:
+            self.count_speed = 0.0
+
+        self.period_speed = period_speed
+        self.speed = weight * self.count_speed + (1.0 - weight) * period_speed
+        return self.speed
+
+
+# ============================================================================
+# БЕНЧМАРК: ТАБЛИЦА ПЕРЕХОДОВ ПРОТИВ pi.read() В CALLBACK
+# ============================================================================
+
+class _LegacyDecoder:
+    """Логика Encoder._callback из test_motors_encoders.py (два pi.read на фронт)"""
+
+    def __init__(self, pi, pin_a, pin_b):
+        self.pi = pi
+        self.pin_a = pin_a
+        self.pin_b = pin_b
+        self.count = 0
+        self.last_a = pi.read(pin_a)
+        self.last_b = pi.read(pin_b)
+
+    def _callback(self, gpio, level, tick):
+        current_a = self.pi.read(self.pin_a)
+        current_b = self.pi.read(self.pin_b)
+        if gpio == self.pin_a and self.last_a != current_a:
+            if current_a == 1:
+                self.count += 1 if current_b == 0 else -1
+            else:
+                self.count += 1 if current_b == 1 else -1
+            self.last_a = current_a
+        elif gpio == self.pin_b and self.last_b != current_b:
+            if current_b == 1:
+                self.count += 1 if current_a == 1 else -1
+            else:
+                self.count += 1 if current_a == 0 else -1
+            self.last_b = current_b
+
+
+class _NoCallbackPi:
+    """pigpio.pi без регистрации callback: фронты подаются бенчмарком вручную"""
+
+    def __init__(self, pi):
+        self._pi = pi
+
+    def callback(self, *args):
+        return _NullCallback()
+
+    def __getattr__(self, name):
+        return getattr(self._pi, name)
+
+
+class _NullCallback:
+    def cancel(self):
+        pass
+
+
+class _OfflinePi:
+    """Заглушка pigpio.pi для синтетических фронтов: демон не нужен, пины не трогаются"""
+
+    def read(self, gpio):
+        return 0
+
+    def callback(self, *args):
+        return _NullCallback()
+
+    def __getattr__(self, name):
+        return lambda *args: 0
+
+
+def _edge_sequence(count, pin_a, pin_b):
+    """Фронты (gpio, level, tick) вращения вперёд: 00 -> 10 -> 11 -> 01 -> 00"""
+    states = (0b10, 0b11, 0b01, 0b00)
+    edges = []
+    prev = 0
+    for i in range(count):
+        new = states[i % 4]
+        changed = prev ^ new
+        if changed & 2:
+            edges.append((pin_a, new >> 1, i * 100))
+        else:
+            edges.append((pin_b, new & 1, i * 100))
+        prev = new
+    return edges
+
+
+def benchmark(edges=20000):
+    import time
+    from control_motor import pi, LEFT_ENC_A, LEFT_ENC_B
+
+    wrapped = _NoCallbackPi(pi)
+    sequence = _edge_sequence(edges, LEFT_ENC_A, LEFT_ENC_B)
+
+    legacy = _LegacyDecoder(wrapped, LEFT_ENC_A, LEFT_ENC_B)
+    start = time.perf_counter()
+    for gpio, level, tick in sequence:
+        legacy._callback(gpio, level, tick)
+    legacy_s = (time.perf_counter() - start) / edges
+
+    encoder = QuadratureEncoder(wrapped, LEFT_ENC_A, LEFT_ENC_B)
+    encoder.state = 0
+    handlers = {LEFT_ENC_A: encoder._edge_a, LEFT_ENC_B: encoder._edge_b}
+    start = time.perf_counter()
+    for gpio, level, tick in sequence:
+        handlers[gpio](gpio, level, tick)
+    table_s = (time.perf_counter() - start) / edges
+
+    print(f"{'decoder':8} {'us/edge':>9} {'round-trips/edge':>17}")
+    print(f"{'legacy':8} {legacy_s * 1e6:9.2f} {2:17d}")
+    print(f"{'table':8} {table_s * 1e6:9.2f} {0:17d}")
+    print(f"Счёт таблицы: {encoder.count} (ожидалось {edges}), ошибок: {encoder.errors}")
+    print(f"Макс. частота фронтов: legacy ~{1 / legacy_s:.0f} Гц, table ~{1 / table_s:.0f} Гц")
+    return legacy_s, table_s
+
+
+# ============================================================================
+# СТРЕСС-ТЕСТ СНИМКОВ
+# ============================================================================
+
+def stress_test(duration=5.0, edge_step_us=10, pi=None, verbose=True):
+    """
+    Поток-писатель подаёт фронты вперёд по очереди левому и правому
+    энкодеру (как поток callback'ов pigpio), читатель в это время делает
+    snapshot() и snapshot_and_reset(). В любой согласованный момент левый
+    опережает правый на 0 или 1 отсчёт, а tick снимка - tick последнего
+    фронта. В конце сумма всех сброшенных интервалов должна совпасть с
+    числом поданных фронтов.
+
+    Фронты синтетические, поэтому энкодеры строятся на pi (по умолчанию -
+    заглушка без демона) и условных пинах 0..3.
+    """
+    import sys
+    LEFT_ENC_A, LEFT_ENC_B, RIGHT_ENC_A, RIGHT_ENC_B = 0, 1, 2, 3
+
+    wrapped = _NoCallbackPi(pi if pi is not None else _OfflinePi())
+    left = QuadratureEncoder(wrapped, LEFT_ENC_A, LEFT_ENC_B, "left")
+    right = QuadratureEncoder(wrapped, RIGHT_ENC_A, RIGHT_ENC_B, "right")
+    for encoder in (left, right):
+        encoder.state = 0
+    counters = EncoderCounters((left, right))
+    stop = threading.Event()
+    written = [0]
+
+    def writer():
+        handlers = ({LEFT_ENC_A: left._edge_a, LEFT_ENC_B: left._edge_b},
+                    {RIGHT_ENC_A: right._edge_a, RIGHT_ENC_B: right._edge_b})
+        sequences = (_edge_sequence(4, LEFT_ENC_A, LEFT_ENC_B),
+                     _edge_sequence(4, RIGHT_ENC_A, RIGHT_ENC_B))
+        edge = 0
+        while not stop.is_set():
+            for side in (0, 1):
+                gpio, level, _ = sequences[side][(edge >> 1) & 3]
+                handlers[side][gpio](gpio, level, (edge * edge_step_us) & TICK_MASK)
+                edge += 1
+            written[0] = edge
+
+    def check(tick, total):
+        lead = total[0] - total[1]
+        if lead not in (0, 1):
+            return f"разрыв снимка: left={total[0]} right={total[1]}"
+        edges = total[0] + total[1]
+        if edges and tick != ((edges - 1) * edge_step_us) & TICK_MASK:
+            return f"tick {tick} не соответствует {edges} фронтам"
+        return None
+
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)     # переключать потоки как можно чаще
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    accumulated = [0, 0]
+    snapshots = resets = 0
+    failures = []
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline and len(failures) < 10:
+            tick, counts = counters.snapshot()
+            error = check(tick, [a + c for a, c in zip(accumulated, counts)])
+            if error:
+                failures.append(error)
+            snapshots += 1
+            if snapshots % 3 == 0:
+                tick, counts = counters.snapshot_and_reset()
+                accumulated = [a + c for a, c in zip(accumulated, counts)]
+                error = check(tick, accumulated)
+                if error:
+                    failures.append(error)
+                resets += 1
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(old_interval)
+
+    _, counts = counters.snapshot_and_reset()
+    accumulated = [a + c for a, c in zip(accumulated, counts)]
+    if sum(accumulated) != written[0]:
+        failures.append(f"потеряны фронты: насчитано {sum(accumulated)}, подано {written[0]}")
+    if verbose:
+        print(f"Фронтов: {written[0]}, снимков: {snapshots}, сбросов: {resets}, "
+              f"ошибок декодера: {left.errors + right.errors}")
+        for failure in failures:
+            print(f"  FAIL: {failure}")
+        print("OK" if not failures else "FAILED")
+    return not failures
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Quadrature encoder benchmark and snapshot stress test")
+    parser.add_argument("--stress", action="store_true", help="run the snapshot stress test instead")
+    parser.add_argument("--duration", type=float, default=5.0, help="stress test duration (s)")
+    args = parser.parse_args()
+    if args.stress:
+        raise SystemExit(0 if stress_test(args.duration) else 1)
+    benchmark()
@@ -0,0 +1,174 @@
+# gpio_bank.py
+"""
+Слой выходов GPIO с теневым регистром.
+
+Каждый вызов pigpio - это отдельный запрос к демону через сокет.
+ShadowGpio помнит последнее записанное состояние каждого пина и
+скважность каждого ШИМ-канала, поэтому:
+- запись, которая ничего не меняет, не отправляется вовсе;
+- все изменившиеся пины направления (обоих моторов сразу) ставятся
+  одной парой clear_bank_1 / set_bank_1, без момента, когда один борт
+  уже переключил направление, а другой ещё нет.
+
+Бенчмарк (поднимите робота - моторы будут крутиться на малой скорости):
+    python3 gpio_bank.py
+"""
+
+from metrics import pigpio_call_histogram, perf_counter_ns
+
+_SET_BANK_HIST = pigpio_call_histogram("set_bank_1")
+_CLEAR_BANK_HIST = pigpio_call_histogram("clear_bank_1")
+
+
+class ShadowGpio:
+    """Теневой регистр выходных пинов и скважностей ШИМ"""
+
+    def __init__(self, pi, pwm):
+        self.pi = pi
+        self.pwm = pwm          # бэкенд ШИМ (pwm_backend.SoftwarePwm / HardwarePwm)
+        self._duty_hist = pigpio_call_histogram(pwm.call_name)
+        self.levels = {}        # пин -> последний записанный уровень
+        self.duties = {}        # пин -> последняя записанная скважность
+        self.round_trips = 0    # сколько запросов реально ушло в демон
+        self.skipped = 0        # сколько записей пропущено как неизменные
+
+    def write_pins(self, levels):
+        """
+        Записать уровни {пин: 0/1}. Изменившиеся пины уходят максимум
+        двумя запросами: сначала сброс (clear_bank_1), затем установка
+        (set_bank_1) - при смене направления мост на мгновение
+        переходит в "выбег", а не в короткое замыкание обмоток.
+        """
+        shadow = self.levels
+        set_mask = 0
+        clear_mask = 0
+        for pin, level in levels.items():
+            if shadow.get(pin) == level:
+                self.skipped += 1
+                continue
+            if level:
+                set_mask |= 1 << pin
+            else:
+                clear_mask |= 1 << pin
+
+        if clear_mask:
+            t0 = perf_counter_ns()
+            self.pi.clear_bank_1(clear_mask)
+            _CLEAR_BANK_HIST.record_ns(perf_counter_ns() - t0)
+            self.round_trips += 1
+        if set_mask:
+            t0 = perf_counter_ns()
+            self.pi.set_bank_1(set_mask)
+            _SET_BANK_HIST.record_ns(perf_counter_ns() - t0)
+            self.round_trips += 1
+        shadow.update(levels)
+
+    def set_duty(self, pin, duty):
+        """Установить скважность ШИМ (0..MAX_PWM), если она изменилась после квантования"""
+        raw = self.pwm.quantize(duty)
+        if self.duties.get(pin) == raw:
+            self.skipped += 1
+            return
+        t0 = perf_counter_ns()
+        self.pwm.write(pin, raw)
+        self._duty_hist.record_ns(perf_counter_ns() - t0)
+        self.round_trips += 1
+        self.duties[pin] = raw
+
+    def invalidate(self, pin=None):
+        """Забыть теневое состояние (например, после записи в обход этого слоя)"""
+        if pin is None:
+            self.levels.clear()
+            self.duties.clear()
+        else:
+            self.levels.pop(pin, None)
+            self.duties.pop(pin, None)
+
+
+# ============================================================================
+# БЕНЧМАРК: ОТДЕЛЬНЫЕ ЗАПИСИ ПРОТИВ ТЕНЕВОГО РЕГИСТРА
+# ============================================================================
+
+class _CountingPi:
+    """Обёртка над pigpio.pi, считающая запросы к демону"""
+
+    def __init__(self, pi):
+        self._pi = pi
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._pi, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args):
+            self.calls += 1
+            return attr(*args)
+        return counted
+
+
+def _joystick_sequence(count):
+    """Типичная последовательность: плавный поворот джойстика по кругу"""
+    import math
+    for i in range(count):
+        a = 2 * math.pi * i / 200.0
+        yield 0.5 * math.sin(a), 0.5 * math.cos(a)
+
+
+def benchmark(count=1000):
+    import time
+    import control_motor
+    from pwm_backend import make_backend
+    from control_motor import pi, Motor, apply_motors, MAX_PWM, \
+        LEFT_PWM_PIN, LEFT_IN1_PIN, LEFT_IN2_PIN, RIGHT_PWM_PIN, RIGHT_IN1_PIN, RIGHT_IN2_PIN
+
+    counting = _CountingPi(pi)
+    left = Motor(LEFT_PWM_PIN, LEFT_IN1_PIN, LEFT_IN2_PIN, "Левый")
+    right = Motor(RIGHT_PWM_PIN, RIGHT_IN1_PIN, RIGHT_IN2_PIN, "Правый")
+
+    def targets(x, y):
+        return (int(MAX_PWM * max(-1.0, min(1.0, y + x))) // 3,
+                int(MAX_PWM * max(-1.0, min(1.0, y - x))) // 3)
+
+    def legacy_apply(motor, pwm):
+        # Прежняя последовательность: write IN1, write IN2, set_PWM_dutycycle
+        levels, duty = motor._plan(pwm)
+        for pin, level in levels.items():
+            counting.write(pin, level)
+        backend = control_motor.PWM
+        counting_backend = make_backend(backend.name, counting, backend.frequency, backend.pwm_range)
+        counting_backend.write(motor.pwm_pin, counting_backend.quantize(duty))
+
+    results = {}
+
+    counting.calls = 0
+    start = time.perf_counter()
+    for x, y in _joystick_sequence(count):
+        l, r = targets(x, y)
+        legacy_apply(left, l)
+        legacy_apply(right, r)
+    results["legacy"] = (counting.calls / count, (time.perf_counter() - start) / count)
+
+    backend = control_motor.PWM
+    shadow = ShadowGpio(counting, make_backend(backend.name, counting, backend.frequency,
+                                               backend.pwm_range))
+    counting.calls = 0
+    start = time.perf_counter()
+    for x, y in _joystick_sequence(count):
+        l, r = targets(x, y)
+        apply_motors((left, l), (right, r), gpio=shadow)
+    results["shadow"] = (counting.calls / count, (time.perf_counter() - start) / count)
+
+    # Теневой регистр модуля не видел записей бенчмарка
+    control_motor.gpio.invalidate()
+    apply_motors((left, 0), (right, 0))
+
+    print(f"{'mode':8} {'round-trips/move':>17} {'us/move':>10}")
+    for name, (trips, seconds) in results.items():
+        print(f"{name:8} {trips:17.2f} {seconds * 1e6:10.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    input("Поднимите робота и нажмите Enter...")
+    benchmark()
@@ -0,0 +1,340 @@
+# metrics.py
+"""
+Лёгкие метрики для робота:
+- Счётчики (Counter)
+- HDR-гистограммы задержек (LatencyHistogram) с лог-линейными корзинами
+- Вывод всего реестра в текстовом формате Prometheus (для /metrics)
+
+Запись события - это несколько целочисленных операций без блокировок,
+поэтому её можно вызывать из обработчиков Flask и вокруг вызовов pigpio.
+Стоимость записи измеряется функцией measure_overhead() (см. __main__).
+"""
+
+import functools
+import threading
+import time
+
+perf_counter_ns = time.perf_counter_ns
+
+# ============================================================================
+# НАСТРОЙКИ ГИСТОГРАММ
+# ============================================================================
+
+# Точность HDR-гистограммы: 2**SUB_BUCKET_BITS корзин на каждую октаву
+# (5 бит -> относительная ошибка не больше ~3%)
+SUB_BUCKET_BITS = 5
+# Максимальное значение, которое различает гистограмма (2**40 нс ~ 18 минут)
+MAX_VALUE_BITS = 40
+
+# Границы корзин для экспорта в Prometheus (секунды)
+EXPORT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                  0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Квантили, которые считаются по гистограмме при экспорте
+EXPORT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+_SUB_COUNT = 1 << SUB_BUCKET_BITS
+_HALF_COUNT = _SUB_COUNT >> 1
+_BUCKETS_TOTAL = _SUB_COUNT + (MAX_VALUE_BITS - SUB_BUCKET_BITS) * _HALF_COUNT
+
+
+def _bucket_index(value):
+    """Номер лог-линейной корзины для значения в наносекундах"""
+    if value < _SUB_COUNT:
+        return value if value > 0 else 0
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    index = _SUB_COUNT + (shift - 1) * _HALF_COUNT + (value >> shift) - _HALF_COUNT
+    return index if index < _BUCKETS_TOTAL else _BUCKETS_TOTAL - 1
+
+
+def _bucket_upper(index):
+    """Верхняя граница корзины (нс, не включительно)"""
+    if index < _SUB_COUNT:
+        return index + 1
+    k = index - _SUB_COUNT
+    shift = k // _HALF_COUNT + 1
+    mantissa = k % _HALF_COUNT + _HALF_COUNT
+    return (mantissa + 1) << shift
+
+
+# ============================================================================
+# МЕТРИКИ
+# ============================================================================
+
+class Counter:
+    """
+    Монотонный счётчик событий
+
+    Инкремент без блокировки: при одновременной записи из нескольких потоков
+    в редких случаях возможна потеря единичного события, для метрик это приемлемо.
+    """
+
+    def __init__(self, name, help_text="", labels=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels or {}
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class LatencyHistogram:
+    """
+    HDR-гистограмма задержек в наносекундах
+
+    Корзины лог-линейные: внутри каждой октавы (степени двойки)
+    значения делятся на 2**(SUB_BUCKET_BITS-1) равных частей, поэтому
+    относительная точность одинакова от микросекунд до секунд,
+    а запись - это bit_length, сдвиг и инкремент элемента списка.
+    """
+
+    def __init__(self, name, help_text="", labels=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels or {}
+        self.counts = [0] * _BUCKETS_TOTAL
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record_ns(self, value):
+        """Записать одно значение (нс)"""
+        self.counts[_bucket_index(value)] += 1
+        self.count += 1
+        self.total_ns += value
+        if value > self.max_ns:
+            self.max_ns = value
+
+    def time(self):
+        """Контекстный менеджер для замера блока кода"""
+        return _Timer(self)
+
+    def quantile_ns(self, q):
+        """Оценка квантиля q (0..1) в наносекундах (верхняя граница корзины)"""
+        counts = list(self.counts)
+        total = sum(counts)
+        if total == 0:
+            return 0
+        rank = q * total
+        running = 0
+        for index, c in enumerate(counts):
+            running += c
+            if c and running >= rank:
+                return min(_bucket_upper(index), self.max_ns)
+        return self.max_ns
+
+    def cumulative_le(self, bounds_ns):
+        """Накопленное число значений <= каждой из границ (для экспорта)"""
+        counts = list(self.counts)
+        result = []
+        running = 0
+        index = 0
+        for bound in bounds_ns:
+            while index < len(counts) and _bucket_upper(index) <= bound + 1:
+                running += counts[index]
+                index += 1
+            result.append(running)
+        return result, running + sum(counts[index:])
+
+    def reset(self):
+        self.counts = [0] * _BUCKETS_TOTAL
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+
+class _Timer:
+    __slots__ = ("hist", "start")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.hist.record_ns(perf_counter_ns() - self.start)
+        return False
+
+
+# ============================================================================
+# РЕЕСТР И ЭКСПОРТ В PROMETHEUS
+# ============================================================================
+
+class MetricsRegistry:
+    """Реестр всех метрик процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # только для создания метрик, не для записи
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def counter(self, name, help_text="", **labels):
+        key = self._key(name, labels)
+        metric = self._counters.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._counters.setdefault(key, Counter(name, help_text, labels))
+        return metric
+
+    def histogram(self, name, help_text="", **labels):
+        key = self._key(name, labels)
+        metric = self._histograms.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._histograms.setdefault(key, LatencyHistogram(name, help_text, labels))
+        return metric
+
+    def set_gauge(self, name, value, help_text="", **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = (help_text, value)
+
+    def render_prometheus(self):
+        """Текстовое представление всех метрик в формате Prometheus"""
+        lines = []
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = list(self._histograms.items())
+            gauges_items = list(self._gauges.items())
+
+        def families(items):
+            grouped = {}
+            for (name, _), metric in sorted(items, key=lambda kv: kv[0]):
+                grouped.setdefault(name, []).append(metric)
+            return grouped
+
+        for name, metrics in families(counters).items():
+            lines.append(f"# HELP {name} {metrics[0].help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for m in metrics:
+                lines.append(f"{name}{_format_labels(m.labels)} {m.value}")
+
+        bounds_ns = [int(b * 1e9) for b in EXPORT_BUCKETS]
+        for name, metrics in families(histograms).items():
+            lines.append(f"# HELP {name} {metrics[0].help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for m in metrics:
+                cumulative, total = m.cumulative_le(bounds_ns)
+                for bound, c in zip(EXPORT_BUCKETS, cumulative):
+                    lines.append(f"{name}_bucket{_format_labels(m.labels, le=repr(bound))} {c}")
+                lines.append(f"{name}_bucket{_format_labels(m.labels, le='+Inf')} {total}")
+                lines.append(f"{name}_sum{_format_labels(m.labels)} {m.total_ns / 1e9:.9f}")
+                lines.append(f"{name}_count{_format_labels(m.labels)} {total}")
+            quantile_name = name.replace("_seconds", "") + "_quantile_seconds"
+            lines.append(f"# HELP {quantile_name} Quantiles of {name} from HDR histogram")
+            lines.append(f"# TYPE {quantile_name} gauge")
+            for m in metrics:
+                for q in EXPORT_QUANTILES:
+                    lines.append(f"{quantile_name}{_format_labels(m.labels, quantile=str(q))} "
+                                 f"{m.quantile_ns(q) / 1e9:.9f}")
+                lines.append(f"{quantile_name}{_format_labels(m.labels, quantile='1')} "
+                             f"{m.max_ns / 1e9:.9f}")
+
+        gauges = {}
+        for (name, labels), (help_text, value) in sorted(gauges_items):
+            gauges.setdefault(name, (help_text, []))[1].append((dict(labels), value))
+        for name, (help_text, values) in gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in values:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels, **extra):
+    merged = dict(labels)
+    merged.update(extra)
+    if not merged:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(merged.items()))
+    return "{" + inner + "}"
+
+
+# Глобальный реестр процесса
+REGISTRY = MetricsRegistry()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def request_metrics(endpoint):
+    """Гистограмма задержки и счётчики запросов/ошибок для эндпоинта"""
+    return (
+        REGISTRY.histogram("robot_http_request_duration_seconds",
+                           "Latency of HTTP handlers", endpoint=endpoint),
+        REGISTRY.counter("robot_http_requests_total",
+                         "Number of HTTP requests", endpoint=endpoint),
+        REGISTRY.counter("robot_http_errors_total",
+                         "Number of HTTP requests answered with 4xx/5xx", endpoint=endpoint),
+    )
+
+
+def pigpio_call_histogram(call):
+    """Гистограмма задержки одного вызова pigpio (round-trip до демона)"""
+    return REGISTRY.histogram("robot_pigpio_call_duration_seconds",
+                              "Latency of pigpio daemon calls", call=call)
+
+
+def timed_handler(endpoint):
+    """
+    Декоратор для обработчиков Flask: задержка, число запросов и ошибок.
+    Ошибкой считается исключение или ответ-кортеж с кодом >= 400.
+    """
+    hist, requests_total, errors_total = request_metrics(endpoint)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = perf_counter_ns()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = (isinstance(result, tuple) and len(result) > 1
+                          and isinstance(result[1], int) and result[1] >= 400)
+                return result
+            finally:
+                hist.record_ns(perf_counter_ns() - t0)
+                requests_total.inc()
+                if failed:
+                    errors_total.inc()
+        return wrapper
+    return decorator
+
+
+def measure_overhead(iterations=20000):
+    """
+    Измерить стоимость инструментирования одного события (нс):
+    два perf_counter_ns() + запись в гистограмму + инкремент счётчика
+    """
+    hist = LatencyHistogram("overhead_probe")
+    counter = Counter("overhead_probe_total")
+    start = perf_counter_ns()
+    for _ in range(iterations):
+        t0 = perf_counter_ns()
+        counter.inc()
+        hist.record_ns(perf_counter_ns() - t0)
+    elapsed = perf_counter_ns() - start
+
+    # Вычитаем стоимость пустого цикла
+    start = perf_counter_ns()
+    for _ in range(iterations):
+        pass
+    empty = perf_counter_ns() - start
+    return max(0, elapsed - empty) / iterations
+
+
+if __name__ == "__main__":
+    cost = measure_overhead()
+    print(f"Стоимость инструментирования: {cost:.0f} нс/событие ({cost / 1000:.2f} мкс)")
+
+    hist = REGISTRY.histogram("robot_demo_seconds", "demo", endpoint="/demo")
+    for value in (1000, 15000, 250000, 1200000, 48000000):
+        hist.record_ns(value)
+    print(REGISTRY.render_prometheus())
@@ -0,0 +1,75 @@
+# motion_profile.py
+"""
+Профилировщик уставок колёс.
+
+Раньше скорость нарастала с ограничением Motor.change_rate_limit,
+считаемым по времени между вызовами move_robot(), поэтому разгон
+зависел от того, как часто браузер шлёт команды. Теперь цель
+(положение джойстика) только запоминается, а уставка колеса
+вычисляется на каждом тике цикла управления:
+
+- трапеция: скорость меняется не быстрее max_accel;
+- S-кривая (задан max_jerk): ускорение само нарастает и спадает не
+  быстрее max_jerk, и спад рассчитан так, чтобы прийти к цели с нулевым
+  ускорением, без перелёта.
+
+Уставки безразмерные: доля от максимальной скорости колеса (-1.0..1.0),
+так что одни и те же пределы работают и в разомкнутом режиме (ШИМ), и
+в замкнутом (импульсы энкодера в секунду). Смена направления проходит
+через ноль непрерывно; как при этом не тормозить мотор, решает шасси
+(см. WheelProfile.decelerating).
+"""
+
+import math
+
+
+class WheelProfile:
+    """Профиль уставки одного колеса"""
+
+    def __init__(self, max_accel, max_jerk=None):
+        self.max_accel = max_accel      # доля полной скорости в секунду
+        self.max_jerk = max_jerk        # доля полной скорости в секунду^2 (None - трапеция)
+        self.target = 0.0
+        self.value = 0.0
+        self.accel = 0.0
+
+    def reset(self, value=0.0):
+        """Сбросить профиль в value без плавности (например, при аварийной остановке)"""
+        self.target = value
+        self.value = value
+        self.accel = 0.0
+
+    @property
+    def done(self):
+        return self.value == self.target and self.accel == 0.0
+
+    @property
+    def decelerating(self):
+        """Уставка движется к нулю (замедление или первая половина реверса)"""
+        return abs(self.target) < abs(self.value) or self.target * self.value < 0
+
+    def step(self, dt):
+        """Продвинуть профиль на dt секунд; возвращает новое значение уставки"""
+        error = self.target - self.value
+        if error == 0.0 and self.accel == 0.0:
+            return self.value
+
+        if self.max_jerk is None:
+            step = self.max_accel * dt
+            self.value += max(-step, min(step, error))
+            return self.value
+
+        # Ускорение, которое при спаде с рывком max_jerk приводит ровно к цели:
+        # за время спада a/j скорость меняется на a^2/(2j)
+        jerk = self.max_jerk
+        desired = math.copysign(min(self.max_accel, math.sqrt(2.0 * jerk * abs(error))), error)
+        change = jerk * dt
+        self.accel += max(-change, min(change, desired - self.accel))
+
+        new_value = self.value + self.accel * dt
+        if (self.target - new_value) * error <= 0:
+            # Дошли до цели (или перелетели бы её) - встаём точно в цель
+            new_value = self.target
+            self.accel = 0.0
+        self.value = new_value
+        return self.value
@@ -0,0 +1,289 @@
+# motor_calibration.py
+"""
+Калибровка зависимости скорости колеса от ШИМ.
+
+TT-моторы сильно нелинейны: до некоторой скважности колесо стоит
+(мёртвая зона), дальше скорость растёт не пропорционально ШИМ, а левый
+и правый моторы, вперёд и назад, заметно различаются. Вместо ручных
+MIN_PWM/MAX_PWM и линейного transform_value_control_speed() меряем
+это на роботе (по мотивам test_speed_range() из test_motors_encoders_ver2.py):
+
+1. Мёртвая зона трогания: из состояния покоя ШИМ поднимается на 1
+   каждые DEADBAND_STEP_S, пока энкодер не начнёт считать.
+2. Проход по скважностям от 0 до MAX_PWM с шагом SWEEP_STEP: после
+   успокоения считаем импульсы энкодера за MEASURE_S.
+
+Результат (для каждого мотора и направления: скважности, скорости в
+импульсах/с и ШИМ трогания) сохраняется в CALIBRATION_FILE. В работе
+таблица обращается: для требуемой скорости ШИМ находится по заранее
+построенной равномерной сетке скоростей - индекс и одна линейная
+интерполяция, без поиска.
+
+Калибровка (поднимите робота - колёса будут крутиться):
+    python3 motor_calibration.py
+"""
+
+import bisect
+import json
+import os
+import time
+
+from control_motor import MIN_PWM, MAX_PWM, MAX_WHEEL_SPEED_CPS, CALIBRATION_FILE
+from robot_log import get_logger
+
+log = get_logger("calibration")
+
+SWEEP_STEP = 5            # Шаг скважности при проходе
+SETTLE_S = 0.4            # Время успокоения скорости после смены ШИМ
+MEASURE_S = 0.6           # Окно подсчёта импульсов
+DEADBAND_STEP_S = 0.05    # Шаг подъёма ШИМ при поиске мёртвой зоны
+DEADBAND_COUNTS = 2       # Столько импульсов за шаг - колесо тронулось
+INVERSE_POINTS = 64       # Размер равномерной сетки обратной таблицы
+
+DIRECTIONS = ("forward", "reverse")
+
+
+def _calibration_path(path=None):
+    path = path or CALIBRATION_FILE
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return path
+
+
+# ============================================================================
+# ТАБЛИЦЫ
+# ============================================================================
+
+class DirectionTable:
+    """Скорость от скважности для одного направления одного мотора"""
+
+    def __init__(self, duties, speeds, deadband):
+        self.duties = [float(d) for d in duties]
+        # Скорость не может падать с ростом ШИМ - сглаживаем шум измерений
+        monotonic = []
+        top = 0.0
+        for speed in speeds:
+            top = max(top, float(speed))
+            monotonic.append(top)
+        self.speeds = monotonic
+        self.deadband = float(deadband)
+        self.max_speed = monotonic[-1] if monotonic else 0.0
+        self._inverse = self._build_inverse()
+
+    def _build_inverse(self):
+        """ШИМ в точках равномерной сетки скоростей 0..max_speed"""
+        if self.max_speed <= 0:
+            return [0.0] * INVERSE_POINTS
+        # Начало рабочего участка - последняя точка, где колесо ещё стоит
+        start = 0
+        while start + 1 < len(self.speeds) and self.speeds[start + 1] <= 0:
+            start += 1
+        inverse = []
+        j = start
+        for k in range(INVERSE_POINTS):
+            target = self.max_speed * k / (INVERSE_POINTS - 1)
+            while j + 1 < len(self.speeds) - 1 and self.speeds[j + 1] < target:
+                j += 1
+            s0, s1 = self.speeds[j], self.speeds[j + 1]
+            d0, d1 = self.duties[j], self.duties[j + 1]
+            t = (target - s0) / (s1 - s0) if s1 > s0 else 1.0
+            inverse.append(d0 + (d1 - d0) * max(0.0, min(1.0, t)))
+        return inverse
+
+    def duty_for_speed(self, speed, starting=False):
+        """
+        ШИМ для скорости speed >= 0 (импульсы/с). starting=True - колесо
+        стоит, и ШИМ не должен быть меньше порога трогания.
+        """
+        if speed <= 0 or self.max_speed <= 0:
+            return 0.0
+        pos = min(speed / self.max_speed, 1.0) * (INVERSE_POINTS - 1)
+        i = min(int(pos), INVERSE_POINTS - 2)
+        inverse = self._inverse
+        duty = inverse[i] + (inverse[i + 1] - inverse[i]) * (pos - i)
+        if starting:
+            duty = max(duty, self.deadband)
+        return duty
+
+    def speed_for_duty(self, duty):
+        """Скорость без нагрузки (импульсы/с) при скважности duty >= 0"""
+        duties = self.duties
+        if len(duties) < 2 or duty <= duties[0]:
+            return self.speeds[0] if duties else 0.0
+        if duty >= duties[-1]:
+            return self.speeds[-1]
+        j = bisect.bisect_right(duties, duty) - 1
+        t = (duty - duties[j]) / (duties[j + 1] - duties[j])
+        return self.speeds[j] + (self.speeds[j + 1] - self.speeds[j]) * t
+
+    def as_dict(self):
+        return {"duty": self.duties, "speed": self.speeds, "deadband": self.deadband}
+
+
+class MotorSpeedTable:
+    """Таблицы одного мотора для обоих направлений"""
+
+    def __init__(self, forward, reverse):
+        self.forward = forward
+        self.reverse = reverse
+
+    @property
+    def max_speed(self):
+        """Наибольшая скорость, достижимая в обе стороны"""
+        return min(self.forward.max_speed, self.reverse.max_speed)
+
+    @property
+    def deadbands(self):
+        """Пороги трогания (вперёд, назад) - нижняя граница ШИМ вместо MIN_PWM"""
+        return self.forward.deadband, self.reverse.deadband
+
+    def pwm_for_speed(self, speed, starting=False):
+        """ШИМ со знаком для скорости со знаком (импульсы/с)"""
+        if speed > 0:
+            return self.forward.duty_for_speed(speed, starting)
+        if speed < 0:
+            return -self.reverse.duty_for_speed(-speed, starting)
+        return 0.0
+
+    def speed_for_pwm(self, pwm):
+        """Скорость со знаком при ШИМ со знаком (обратная к pwm_for_speed)"""
+        if pwm > 0:
+            return self.forward.speed_for_duty(pwm)
+        if pwm < 0:
+            return -self.reverse.speed_for_duty(-pwm)
+        return 0.0
+
+    @classmethod
+    def from_dict(cls, data):
+        tables = [DirectionTable(data[d]["duty"], data[d]["speed"], data[d]["deadband"])
+                  for d in DIRECTIONS]
+        return cls(*tables)
+
+    def as_dict(self):
+        return {"forward": self.forward.as_dict(), "reverse": self.reverse.as_dict()}
+
+
+def unloaded_speed(pwm, table=None):
+    """
+    Скорость без нагрузки (импульсы/с, со знаком) при ШИМ со знаком: по
+    калибровочной таблице мотора, без неё - обратная к линейной схеме
+    MIN_PWM..MAX_PWM -> 0..MAX_WHEEL_SPEED_CPS
+    """
+    if table is not None:
+        return table.speed_for_pwm(pwm)
+    magnitude = abs(pwm)
+    if magnitude < MIN_PWM:
+        return 0.0
+    fraction = min(1.0, (magnitude - MIN_PWM) / (MAX_PWM - MIN_PWM))
+    return fraction * MAX_WHEEL_SPEED_CPS * (1 if pwm > 0 else -1)
+
+
+def load_calibration(path=None):
+    """Таблицы {"left": MotorSpeedTable, "right": ...} или None, если калибровки нет"""
+    path = _calibration_path(path)
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return {side: MotorSpeedTable.from_dict(data[side]) for side in ("left", "right")}
+    except FileNotFoundError:
+        return None
+    except (KeyError, ValueError, TypeError) as e:
+        log.warning("Ignoring malformed motor calibration %s: %s", path, e)
+        return None
+
+
+def save_calibration(tables, path=None):
+    path = _calibration_path(path)
+    with open(path, "w") as f:
+        json.dump({side: table.as_dict() for side, table in tables.items()}, f, indent=1)
+    return path
+
+
+# ============================================================================
+# КАЛИБРОВКА НА РОБОТЕ
+# ============================================================================
+
+def _drive_raw(motor, direction, duty):
+    """Скважность без подтягивания к MIN_PWM (нужна для поиска мёртвой зоны)"""
+    from control_motor import gpio
+    if duty <= 0:
+        motor._apply_pwm_direct(0)
+        return
+    levels, _ = motor._plan(1 if direction == "forward" else -1)
+    gpio.write_pins(levels)
+    gpio.set_duty(motor.pwm_pin, duty)
+
+
+def _find_deadband(motor, encoder, direction):
+    _drive_raw(motor, direction, 0)
+    time.sleep(0.5)
+    for duty in range(1, MAX_PWM + 1):
+        start = encoder.get_count()
+        _drive_raw(motor, direction, duty)
+        time.sleep(DEADBAND_STEP_S)
+        if abs(encoder.get_count() - start) >= DEADBAND_COUNTS:
+            _drive_raw(motor, direction, 0)
+            return duty
+    _drive_raw(motor, direction, 0)
+    return MAX_PWM
+
+
+def _sweep(motor, encoder, direction):
+    duties = list(range(0, MAX_PWM + 1, SWEEP_STEP))
+    if duties[-1] != MAX_PWM:
+        duties.append(MAX_PWM)
+    speeds = []
+    for duty in duties:
+        _drive_raw(motor, direction, duty)
+        time.sleep(SETTLE_S)
+        start_count = encoder.get_count()
+        start_time = time.monotonic()
+        time.sleep(MEASURE_S)
+        speeds.append(abs(encoder.get_count() - start_count) / (time.monotonic() - start_time))
+    _drive_raw(motor, direction, 0)
+    time.sleep(0.5)
+    return duties, speeds
+
+
+def calibrate_motor(motor, encoder):
+    """Измерить таблицу одного мотора (оба направления)"""
+    tables = []
+    for direction in DIRECTIONS:
+        deadband = _find_deadband(motor, encoder, direction)
+        duties, speeds = _sweep(motor, encoder, direction)
+        table = DirectionTable(duties, speeds, deadband)
+        print(f"  {motor.name} {direction:8}: трогание при ШИМ {deadband}, "
+              f"максимум {table.max_speed:.0f} имп/с")
+        tables.append(table)
+    return MotorSpeedTable(*tables)
+
+
+def calibrate():
+    from encoders import QuadratureEncoder
+    from control_motor import pi, Motor, LEFT_PWM_PIN, LEFT_IN1_PIN, LEFT_IN2_PIN, \
+        RIGHT_PWM_PIN, RIGHT_IN1_PIN, RIGHT_IN2_PIN, LEFT_ENC_A, LEFT_ENC_B, RIGHT_ENC_A, RIGHT_ENC_B
+
+    left = Motor(LEFT_PWM_PIN, LEFT_IN1_PIN, LEFT_IN2_PIN, "Левый")
+    right = Motor(RIGHT_PWM_PIN, RIGHT_IN1_PIN, RIGHT_IN2_PIN, "Правый")
+    left_encoder = QuadratureEncoder(pi, LEFT_ENC_A, LEFT_ENC_B, "Левый энк.")
+    right_encoder = QuadratureEncoder(pi, RIGHT_ENC_A, RIGHT_ENC_B, "Правый энк.")
+    try:
+        tables = {"left": calibrate_motor(left, left_encoder),
+                  "right": calibrate_motor(right, right_encoder)}
+    finally:
+        left.stop()
+        right.stop()
+        left_encoder.cleanup()
+        right_encoder.cleanup()
+
+    for side, table in tables.items():
+        print(f"\n{side}: {'ШИМ':>5} {'вперёд':>8} {'назад':>8}")
+        for duty, fwd, rev in zip(table.forward.duties, table.forward.speeds, table.reverse.speeds):
+            print(f"      {duty:5.0f} {fwd:8.0f} {rev:8.0f}")
+    print(f"\nКалибровка сохранена: {save_calibration(tables)}")
+    return tables
+
+
+if __name__ == "__main__":
+    input("Поднимите робота и нажмите Enter...")
+    calibrate()
@@ -0,0 +1,153 @@
+# odometry.py
+"""
+Одометрия гусеничного шасси по энкодерам.
+
+На каждом тике цикла управления берётся общий опрос EncoderHub (левый и
+правый счёт в один момент), приращения переводятся в путь колёс, и поза
+(x, y, курс) интегрируется точно по дуге окружности:
+
+    ds = (dl + dr) / 2,  dθ = (dr - dl) / колея
+    x += ds / dθ * (sin(θ + dθ) - sin θ)
+    y -= ds / dθ * (cos(θ + dθ) - cos θ)
+
+При dθ -> 0 формула переходит в прямой отрезок по среднему курсу.
+В отличие от простого шага Эйлера, ошибка не растёт на поворотах при
+крупном шаге. Одно обновление - несколько операций с float, микросекунды.
+
+Частота интегрирования - частота опроса EncoderHub, то есть тик цикла
+шасси (CONTROL_RATE_HZ, 50 Гц), а не каждый фронт энкодера: отдельного
+быстрого потока нет. Формула дуги точна при постоянной кривизне на тике,
+поэтому ошибка такого шага - только от смены кривизны внутри 20 мс.
+
+Позу обновляет поток цикла, а сбрасывают и перенастраивают обработчики
+HTTP, поэтому update(), reset() и configure() идут под одной блокировкой.
+
+Координаты в миллиметрах, курс в радианах (0 - вдоль оси x, против
+часовой стрелки положительный). Для гусениц эффективная колея больше
+расстояния между гусеницами из-за проскальзывания - TRACK_WIDTH_MM стоит
+подобрать по развороту на месте.
+
+Бенчмарк стоимости обновления:
+    python3 odometry.py
+"""
+
+import math
+import threading
+
+from control_motor import WHEEL_DIAMETER_MM, TRACK_WIDTH_MM, ENCODER_COUNTS_PER_WHEEL_REV
+
+
+class Odometry:
+    """
+    Интегратор позы по приращениям счёта левого и правого энкодеров.
+
+    Args:
+        hub (EncoderHub): источник синхронных отсчётов (столбцы 0 и 1 - левый и правый)
+        loop (ControlLoop): цикл, на тике которого обновляется поза (после опроса hub)
+        state (RobotState): куда публиковать позу (необязательно)
+    """
+
+    def __init__(self, hub=None, loop=None, state=None, wheel_diameter_mm=WHEEL_DIAMETER_MM,
+                 track_width_mm=TRACK_WIDTH_MM, counts_per_rev=ENCODER_COUNTS_PER_WHEEL_REV):
+        self.hub = hub
+        self.state = state
+        self._lock = threading.Lock()
+        self.configure(wheel_diameter_mm, track_width_mm, counts_per_rev)
+        self.reset()
+        self._last_counts = None
+        if loop is not None:
+            loop.add(self.step)
+
+    def configure(self, wheel_diameter_mm=None, track_width_mm=None, counts_per_rev=None):
+        """Изменить геометрию на ходу (None - оставить как есть)"""
+        with self._lock:
+            if wheel_diameter_mm is not None:
+                self.wheel_diameter_mm = float(wheel_diameter_mm)
+            if track_width_mm is not None:
+                self.track_width_mm = float(track_width_mm)
+            if counts_per_rev is not None:
+                self.counts_per_rev = float(counts_per_rev)
+            self.mm_per_count = math.pi * self.wheel_diameter_mm / self.counts_per_rev
+
+    def reset(self, x=0.0, y=0.0, heading=0.0):
+        """Задать позу; безопасно вызывать из другого потока во время step()"""
+        with self._lock:
+            self.x = float(x)
+            self.y = float(y)
+            self.heading = float(heading)
+            self.distance = 0.0     # пройденный путь центра шасси (мм)
+            self.pose = (self.x, self.y, self.heading)
+
+    def update(self, left_count, right_count):
+        """Интегрировать позу по новым абсолютным значениям счёта"""
+        with self._lock:
+            return self._integrate(left_count, right_count)
+
+    def _integrate(self, left_count, right_count):
+        last = self._last_counts
+        self._last_counts = (left_count, right_count)
+        if last is None:
+            return self.pose
+
+        k = self.mm_per_count
+        dl = (left_count - last[0]) * k
+        dr = (right_count - last[1]) * k
+        if not dl and not dr:
+            return self.pose
+
+        ds = 0.5 * (dl + dr)
+        dtheta = (dr - dl) / self.track_width_mm
+        theta = self.heading
+        if abs(dtheta) < 1e-9:
+            # Прямо: предел формулы дуги
+            self.x += ds * math.cos(theta)
+            self.y += ds * math.sin(theta)
+        else:
+            radius = ds / dtheta
+            new_theta = theta + dtheta
+            self.x += radius * (math.sin(new_theta) - math.sin(theta))
+            self.y -= radius * (math.cos(new_theta) - math.cos(theta))
+        # Курс в диапазоне -pi..pi
+        self.heading = math.atan2(math.sin(theta + dtheta), math.cos(theta + dtheta))
+        self.distance += abs(ds)
+        self.pose = (self.x, self.y, self.heading)
+        return self.pose
+
+    def step(self, dt, now):
+        """Шаг ControlLoop: поза по последнему опросу EncoderHub"""
+        if not self.hub.samples:
+            return
+        _, counts, _ = self.hub.latest
+        x, y, heading = self.update(counts[0], counts[1])
+        if self.state is not None:
+            self.state.update(odom_x=x, odom_y=y, odom_heading=heading)
+
+    def status(self):
+        x, y, heading = self.pose
+        return {"x_mm": x, "y_mm": y, "heading_rad": heading,
+                "heading_deg": math.degrees(heading), "distance_mm": self.distance,
+                "wheel_diameter_mm": self.wheel_diameter_mm,
+                "track_width_mm": self.track_width_mm, "counts_per_rev": self.counts_per_rev}
+
+
+# ============================================================================
+# БЕНЧМАРК
+# ============================================================================
+
+def benchmark(updates=200000):
+    import time
+    odometry = Odometry()
+    left = right = 0
+    start = time.perf_counter()
+    for i in range(updates):
+        left += 3
+        right += 2 + (i & 1)
+        odometry.update(left, right)
+    per_update = (time.perf_counter() - start) / updates
+    print(f"Odometry.update: {per_update * 1e6:.2f} us")
+    print(f"Pose: {odometry.status()}")
+    return per_update
+
+
+if __name__ == "__main__":
+    benchmark()
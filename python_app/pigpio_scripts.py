@@ -0,0 +1,182 @@
+# pigpio_scripts.py
+"""
+Скрипты, хранимые в демоне pigpio (store_script / run_script).
+
+1. Скрипт команды шасси: одним вызовом run_script выставляет пины
+   направления обоих моторов (clear/set bank) и обе скважности.
+   Параметры: p0 - маска сброса, p1 - маска установки,
+              p2 - скважность левого, p3 - скважность правого.
+
+2. Сторожевой скрипт (watchdog): постоянно крутится в демоне и тормозит
+   оба мотора, если за WATCHDOG_DEADLINE_MS не пришло ни одной команды.
+   Python "кормит" его через update_script (p0 - счётчик команд), но не
+   чаще раза в четверть срока, так что большинство команд обходится
+   одним запросом к демону. Кормят только пришедшие команды
+   (RobotChassis.move_robot/stop_robot), а не apply(): в замкнутом контуре
+   ШИМ применяется на каждом тике и кормил бы сторож без клиента. Если
+   Python-процесс завис или упал, демон остановит робота сам.
+
+3. Скрипт импульсов сервоприводов: одним run_script выставляет ширины
+   импульсов всех осей (servo_manager.py). Параметры p0..p9 - ширины
+   в мкс по порядку пинов, поэтому одним скриптом - до 10 сервоприводов.
+"""
+
+import time
+
+import pigpio
+
+from metrics import pigpio_call_histogram, perf_counter_ns
+from robot_log import get_logger
+
+log = get_logger("scripts")
+
+_RUN_HIST = pigpio_call_histogram("run_script")
+_FEED_HIST = pigpio_call_histogram("update_script")
+
+WATCHDOG_POLL_MS = 10       # Период проверки в сторожевом скрипте
+
+
+def _duty_command(pwm, pin, param):
+    """Команда скрипта, выставляющая скважность из параметра"""
+    if pwm.name == "hardware":
+        return f"hp {pin} {pwm.frequency} {param}"
+    return f"pwm {pin} {param}"
+
+
+def chassis_script(pwm, left_pwm_pin, right_pwm_pin):
+    """Текст скрипта команды шасси"""
+    return " ".join((
+        "bc1 p0",
+        "bs1 p1",
+        _duty_command(pwm, left_pwm_pin, "p2"),
+        _duty_command(pwm, right_pwm_pin, "p3"),
+    ))
+
+
+def watchdog_script(pwm, brake_mask, left_pwm_pin, right_pwm_pin):
+    """
+    Текст сторожевого скрипта. p0 - счётчик команд, p1 - срок в мс.
+    v0 - последнее увиденное значение p0, v1 - оставшееся время.
+    """
+    return " ".join((
+        "tag 0",
+        "ld v0 p0",
+        "ld v1 p1",
+        "tag 1",
+        f"mils {WATCHDOG_POLL_MS}",
+        "lda p0", "cmp v0", "jnz 0",                # пришла команда - начать отсчёт заново
+        "lda v1", f"sub {WATCHDOG_POLL_MS}", "sta v1",
+        "cmp 0", "jp 1",                            # время ещё есть
+        f"bs1 {brake_mask}",                        # срок вышел - торможение
+        _duty_command(pwm, left_pwm_pin, "0"),
+        _duty_command(pwm, right_pwm_pin, "0"),
+        "tag 2",                                    # ждём следующую команду
+        f"mils {WATCHDOG_POLL_MS}",
+        "lda p0", "cmp v0", "jz 2",
+        "jmp 0",
+    ))
+
+
+SCRIPT_PARAMS = 10          # Параметров p0..p9 у скрипта pigpio
+
+
+def servo_script(pins):
+    """Текст скрипта импульсов сервоприводов: p{i} - ширина импульса pins[i]"""
+    if len(pins) > SCRIPT_PARAMS:
+        raise ValueError(f"At most {SCRIPT_PARAMS} servos per script, got {len(pins)}")
+    return " ".join(f"servo {pin} p{i}" for i, pin in enumerate(pins))
+
+
+def _store(pi, text, timeout=2.0):
+    script_id = pi.store_script(text.encode())
+    deadline = time.monotonic() + timeout
+    while True:
+        status, _ = pi.script_status(script_id)
+        if status != pigpio.PI_SCRIPT_INITING:
+            break
+        if time.monotonic() > deadline:
+            pi.delete_script(script_id)
+            raise RuntimeError("pigpio script did not finish initialising")
+        time.sleep(0.01)
+    return script_id
+
+
+class DaemonChassisScripts:
+    """Управление шасси скриптами, хранимыми в демоне pigpio"""
+
+    def __init__(self, pi, pwm, left_motor, right_motor, deadline_ms=500):
+        self.pi = pi
+        self.pwm = pwm
+        self.deadline_ms = deadline_ms
+        self.direction_mask = 0
+        for motor in (left_motor, right_motor):
+            self.direction_mask |= (1 << motor.in1_pin) | (1 << motor.in2_pin)
+
+        self.command_id = _store(pi, chassis_script(pwm, left_motor.pwm_pin, right_motor.pwm_pin))
+        self.watchdog_id = _store(pi, watchdog_script(pwm, self.direction_mask,
+                                                      left_motor.pwm_pin, right_motor.pwm_pin))
+        self._heartbeat = 0
+        self._last_feed = 0.0
+        pi.run_script(self.watchdog_id, [0, deadline_ms])
+        log.info("Daemon scripts stored: command=%d watchdog=%d (deadline %d ms)",
+                 self.command_id, self.watchdog_id, deadline_ms)
+
+    def apply(self, levels, left_duty, right_duty):
+        """
+        Применить команду шасси одним вызовом run_script.
+        levels - уровни пинов направления {пин: 0/1} обоих моторов,
+        скважности - в единицах 0..MAX_PWM.
+        """
+        set_mask = 0
+        for pin, level in levels.items():
+            if level:
+                set_mask |= 1 << pin
+        clear_mask = self.direction_mask & ~set_mask
+        params = [clear_mask, set_mask, self.pwm.quantize(left_duty), self.pwm.quantize(right_duty)]
+
+        t0 = perf_counter_ns()
+        self.pi.run_script(self.command_id, params)
+        _RUN_HIST.record_ns(perf_counter_ns() - t0)
+
+    def feed(self, force=False):
+        """
+        Сообщить сторожевому скрипту, что команды идут (не чаще раза в deadline/4).
+        Вызывается на приход команды клиента, а не на каждое применение ШИМ.
+        """
+        now = time.monotonic()
+        if not force and (now - self._last_feed) * 1000 < self.deadline_ms / 4:
+            return
+        self._heartbeat = (self._heartbeat + 1) & 0x7FFFFFFF
+        t0 = perf_counter_ns()
+        self.pi.update_script(self.watchdog_id, [self._heartbeat, self.deadline_ms])
+        _FEED_HIST.record_ns(perf_counter_ns() - t0)
+        self._last_feed = now
+
+    def cleanup(self):
+        for script_id in (self.watchdog_id, self.command_id):
+            try:
+                self.pi.stop_script(script_id)
+                self.pi.delete_script(script_id)
+            except Exception:
+                pass
+
+
+class DaemonServoScript:
+    """Ширины импульсов всех сервоприводов одним вызовом run_script"""
+
+    def __init__(self, pi, pins):
+        self.pi = pi
+        self.pins = tuple(pins)
+        self.script_id = _store(pi, servo_script(self.pins))
+        log.info("Servo script stored: id=%d pins=%s", self.script_id, self.pins)
+
+    def write(self, widths):
+        t0 = perf_counter_ns()
+        self.pi.run_script(self.script_id, [int(w) for w in widths])
+        _RUN_HIST.record_ns(perf_counter_ns() - t0)
+
+    def cleanup(self):
+        try:
+            self.pi.delete_script(self.script_id)
+        except Exception:
+            pass
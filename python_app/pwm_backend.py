@@ -0,0 +1,155 @@
+# pwm_backend.py
+"""
+Бэкенды ШИМ для моторов.
+
+- SoftwarePwm: программный ШИМ pigpio (DMA-сэмплирование), как раньше:
+  частота PWM_FREQUENCY, диапазон MAX_PWM. Работает на любом пине.
+- HardwarePwm: аппаратный ШИМ через hardware_PWM() на GPIO12/13/18/19.
+  Ультразвуковая частота (нет писка), скважность задаётся в миллионных
+  долях, нагрузки на pigpiod нет.
+
+Оба бэкенда принимают скважность в единицах 0..pwm_range (MAX_PWM),
+поэтому API Motor не меняется. Дробная скважность имеет смысл только
+для аппаратного ШИМ.
+
+Сравнение загрузки pigpiod и разрешения (пины направления держатся
+в нуле, моторы не крутятся):
+    python3 pwm_backend.py
+"""
+
+# Пины, на которых у BCM283x есть аппаратный ШИМ (PWM0: 12/18, PWM1: 13/19)
+HARDWARE_PWM_PINS = (12, 13, 18, 19)
+
+# Базовая частота, от которой pigpio считает реальное разрешение аппаратного ШИМ
+HARDWARE_PWM_CLOCK = 250000000
+
+
+class SoftwarePwm:
+    """Программный ШИМ pigpio (set_PWM_dutycycle)"""
+
+    name = "software"
+    call_name = "set_PWM_dutycycle"
+
+    def __init__(self, pi, frequency, pwm_range):
+        self.pi = pi
+        self.frequency = frequency
+        self.pwm_range = pwm_range
+
+    def setup(self, pin):
+        self.pi.set_PWM_frequency(pin, self.frequency)
+        self.pi.set_PWM_range(pin, self.pwm_range)
+
+    def quantize(self, duty):
+        """Скважность в единицах 0..pwm_range -> значение, которое уйдёт в демон"""
+        return int(duty)
+
+    def write(self, pin, raw):
+        self.pi.set_PWM_dutycycle(pin, raw)
+
+    def resolution(self, pin):
+        """Число различимых уровней скважности на пине"""
+        return min(self.pwm_range, self.pi.get_PWM_real_range(pin))
+
+
+class HardwarePwm:
+    """Аппаратный ШИМ (hardware_PWM), только GPIO12/13/18/19"""
+
+    name = "hardware"
+    call_name = "hardware_PWM"
+
+    def __init__(self, pi, frequency, pwm_range):
+        self.pi = pi
+        self.frequency = frequency
+        self.pwm_range = pwm_range
+
+    def setup(self, pin):
+        if pin not in HARDWARE_PWM_PINS:
+            raise ValueError(f"GPIO{pin} has no hardware PWM (use one of {HARDWARE_PWM_PINS})")
+        self.pi.hardware_PWM(pin, self.frequency, 0)
+
+    def quantize(self, duty):
+        duty = max(0.0, min(float(self.pwm_range), duty))
+        return int(duty * 1000000 / self.pwm_range)
+
+    def write(self, pin, raw):
+        self.pi.hardware_PWM(pin, self.frequency, raw)
+
+    def resolution(self, pin):
+        return HARDWARE_PWM_CLOCK // self.frequency
+
+
+BACKENDS = {SoftwarePwm.name: SoftwarePwm, HardwarePwm.name: HardwarePwm}
+
+
+def make_backend(name, pi, frequency, pwm_range):
+    try:
+        return BACKENDS[name](pi, frequency, pwm_range)
+    except KeyError:
+        raise ValueError(f"Unknown PWM backend '{name}' (expected one of {sorted(BACKENDS)})")
+
+
+# ============================================================================
+# СРАВНЕНИЕ БЭКЕНДОВ
+# ============================================================================
+
+def _pigpiod_pid():
+    import os
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/comm") as f:
+                    if f.read().strip() == "pigpiod":
+                        return int(entry)
+            except OSError:
+                continue
+    return None
+
+
+def _cpu_seconds(pid):
+    import os
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime и stime - 14 и 15 поля (после имени процесса - 12 и 13)
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def compare(duration=5.0):
+    """Загрузка pigpiod и разрешение скважности для обоих бэкендов"""
+    import time
+    from control_motor import pi, PWM_FREQUENCY, HW_PWM_FREQUENCY, MAX_PWM, MIN_PWM, \
+        LEFT_PWM_PIN, RIGHT_PWM_PIN, LEFT_IN1_PIN, LEFT_IN2_PIN, RIGHT_IN1_PIN, RIGHT_IN2_PIN
+
+    # Мост в режиме выбега: ШИМ генерируется, но моторы стоят
+    for pin in (LEFT_IN1_PIN, LEFT_IN2_PIN, RIGHT_IN1_PIN, RIGHT_IN2_PIN):
+        pi.write(pin, 0)
+
+    pid = _pigpiod_pid()
+    if pid is None:
+        print("pigpiod не найден - загрузка CPU измеряться не будет")
+
+    frequencies = {"software": PWM_FREQUENCY, "hardware": HW_PWM_FREQUENCY}
+    print(f"{'backend':9} {'freq Hz':>8} {'levels':>8} {'step %':>8} {'pigpiod CPU %':>14}")
+    for name in ("software", "hardware"):
+        backend = make_backend(name, pi, frequencies[name], MAX_PWM)
+        for pin in (LEFT_PWM_PIN, RIGHT_PWM_PIN):
+            backend.setup(pin)
+            backend.write(pin, backend.quantize(MIN_PWM))
+
+        cpu_start = _cpu_seconds(pid) if pid else 0.0
+        wall_start = time.monotonic()
+        time.sleep(duration)
+        cpu = ((_cpu_seconds(pid) - cpu_start) / (time.monotonic() - wall_start) * 100
+               if pid else float("nan"))
+
+        levels = backend.resolution(LEFT_PWM_PIN)
+        print(f"{name:9} {backend.frequency:8d} {levels:8d} {100.0 / levels:8.4f} {cpu:14.2f}")
+
+        for pin in (LEFT_PWM_PIN, RIGHT_PWM_PIN):
+            backend.write(pin, 0)
+        if name == "hardware":
+            for pin in (LEFT_PWM_PIN, RIGHT_PWM_PIN):
+                pi.hardware_PWM(pin, 0, 0)
+
+
+if __name__ == "__main__":
+    compare()
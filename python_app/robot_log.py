@@ -0,0 +1,180 @@
+# robot_log.py
+"""
+Неблокирующее логирование для горячих путей управления роботом.
+
+Вызов logger.info(...) только кладёт кортеж в ограниченный буфер
+(deque.append атомарен под GIL) и сразу возвращается. Форматирование
+и вывод в консоль/на SD-карту делает отдельный фоновый поток, поэтому
+медленная консоль не задерживает команды моторам.
+
+Последние записи хранятся в кольцевом буфере и доступны через /logs.
+"""
+
+import atexit
+import sys
+import threading
+import time
+from collections import deque
+
+# ============================================================================
+# УРОВНИ И НАСТРОЙКИ
+# ============================================================================
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS_BY_NAME = {name: level for level, name in LEVEL_NAMES.items()}
+
+PENDING_LIMIT = 4096      # Максимум записей, ожидающих вывода (лишние отбрасываются)
+RING_SIZE = 1000          # Сколько последних записей хранить для /logs
+FLUSH_INTERVAL = 0.05     # Период работы фонового потока вывода (сек)
+
+
+# ============================================================================
+# ФОНОВЫЙ ВЫВОД
+# ============================================================================
+
+class LogSink:
+    """Очередь записей + фоновый поток, который их форматирует и выводит"""
+
+    def __init__(self, stream=None, level=INFO):
+        self.stream = stream or sys.stdout
+        self.level = level
+        self.dropped = 0
+        self._pending = deque()
+        self._ring = deque(maxlen=RING_SIZE)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="robot-log", daemon=True)
+        self._thread.start()
+
+    def emit(self, level, name, msg, args):
+        """Поставить запись в очередь. Никогда не блокирует вызывающего."""
+        if len(self._pending) >= PENDING_LIMIT:
+            self.dropped += 1
+            return
+        self._pending.append((time.time(), level, name, msg, args))
+
+    def _format(self, record):
+        created, level, name, msg, args = record
+        if args:
+            try:
+                msg = msg % args
+            except (TypeError, ValueError):
+                msg = f"{msg} {args!r}"
+        stamp = time.strftime("%H:%M:%S", time.localtime(created))
+        return f"{stamp}.{int(created * 1000) % 1000:03d} {LEVEL_NAMES.get(level, level)} [{name}] {msg}"
+
+    def flush(self):
+        """Вывести всё, что накопилось в очереди"""
+        lines = []
+        pending = self._pending
+        while pending:
+            record = pending.popleft()
+            line = self._format(record)
+            self._ring.append((record[1], line))
+            lines.append(line)
+        if lines:
+            try:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            except Exception:
+                pass
+
+    def _run(self):
+        while self._running:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def recent(self, limit=200, min_level=DEBUG):
+        """Последние записи из кольцевого буфера (строки)"""
+        lines = [line for level, line in list(self._ring) if level >= min_level]
+        return lines[-limit:] if limit else lines
+
+    def stop(self):
+        self._running = False
+        self.flush()
+
+
+_sink = LogSink()
+atexit.register(_sink.stop)
+
+
+# ============================================================================
+# ЛОГГЕРЫ
+# ============================================================================
+
+class RobotLogger:
+    """Логгер с уровнями; сообщение форматируется в фоновом потоке"""
+
+    def __init__(self, name, sink=None):
+        self.name = name
+        self.sink = sink or _sink
+
+    def log(self, level, msg, *args):
+        if level >= self.sink.level:
+            self.sink.emit(level, self.name, msg, args)
+
+    def debug(self, msg, *args):
+        self.log(DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(ERROR, msg, *args)
+
+
+class RateLimitedLogger(RobotLogger):
+    """
+    Логгер для горячих путей: одно и то же сообщение (по шаблону msg)
+    выводится не чаще раза в min_interval секунд, пропущенные считаются
+    и добавляются к следующей выведенной записи.
+    """
+
+    def __init__(self, name, min_interval=0.5, sink=None):
+        super().__init__(name, sink)
+        self.min_interval = min_interval
+        self._last_emit = {}
+        self._suppressed = {}
+
+    def log(self, level, msg, *args):
+        if level < self.sink.level:
+            return
+        now = time.monotonic()
+        if now - self._last_emit.get(msg, -1e9) < self.min_interval:
+            self._suppressed[msg] = self._suppressed.get(msg, 0) + 1
+            return
+        self._last_emit[msg] = now
+        suppressed = self._suppressed.pop(msg, 0)
+        if suppressed:
+            msg = msg + f" (+{suppressed} suppressed)"
+        self.sink.emit(level, self.name, msg, args)
+
+
+def get_logger(name):
+    return RobotLogger(name)
+
+
+def get_hot_logger(name, min_interval=0.5):
+    return RateLimitedLogger(name, min_interval)
+
+
+def set_level(level):
+    """Уровень логирования: число или имя ('DEBUG', 'INFO', ...)"""
+    if isinstance(level, str):
+        level = LEVELS_BY_NAME[level.upper()]
+    _sink.level = level
+
+
+def recent(limit=200, min_level=DEBUG):
+    return _sink.recent(limit, min_level)
+
+
+def dropped_count():
+    return _sink.dropped
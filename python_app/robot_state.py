@@ -0,0 +1,105 @@
+# robot_state.py
+"""
+Общее хранилище состояния робота вместо глобальных переменных app.py.
+
+Все значения (уставки, измерения, метки времени) лежат в одном массиве
+array('d'), а согласованность обеспечивает счётчик версий (seqlock):
+- писатель увеличивает версию до нечётной, пишет поля, увеличивает до чётной;
+- читатель копирует массив и повторяет попытку, если версия была нечётной
+  или изменилась за время копирования.
+
+Читатели (телеметрия, регуляторы, HTTP-обработчики) никогда не берут
+блокировку. Писатели сериализуются короткой блокировкой между собой.
+"""
+
+import threading
+import time
+from array import array
+
+# ============================================================================
+# ПОЛЯ СОСТОЯНИЯ
+# ============================================================================
+
+FIELDS = (
+    # Уставки
+    "set_x",            # джойстик X (-1.0..1.0)
+    "set_y",            # джойстик Y (-1.0..1.0)
+    "set_servo",        # заданный угол камеры (градусы)
+    # Измеренные / фактически применённые значения
+    "servo_angle",      # текущий угол камеры (градусы)
+    "left_pwm",         # ШИМ левого мотора (со знаком)
+    "right_pwm",        # ШИМ правого мотора (со знаком)
+    # Замкнутый контур скорости колёс (импульсы энкодера в секунду)
+    "left_speed_set",   # уставка скорости левого колеса
+    "right_speed_set",  # уставка скорости правого колеса
+    "left_speed",       # измеренная скорость левого колеса
+    "right_speed",      # измеренная скорость правого колеса
+    "left_speed_error", # ошибка слежения левого колеса
+    "right_speed_error",# ошибка слежения правого колеса
+    # Сцепление колёс (traction.py): 0 - ok, 1 - stall, 2 - slip, 3 - free_spin
+    "left_traction",
+    "right_traction",
+    # Синхронизация бортов при езде прямо
+    "sync_error",       # накопленная разница счёта левый - правый (отсчёты)
+    "sync_correction",  # поправка скорости (отсчётов/с): левому минус, правому плюс
+    # Одометрия
+    "odom_x",           # координата x (мм)
+    "odom_y",           # координата y (мм)
+    "odom_heading",     # курс (рад, -pi..pi)
+    # Метки времени (time.monotonic(), сек)
+    "t_drive",          # последняя команда движения
+    "t_servo",          # последняя команда камеры
+    "t_measured",       # последнее обновление измерений
+)
+
+
+class RobotState:
+    """Версионированное хранилище состояния с чтением без блокировок"""
+
+    def __init__(self, fields=FIELDS, **initial):
+        self.fields = tuple(fields)
+        self.index = {name: i for i, name in enumerate(self.fields)}
+        self._data = array('d', [0.0] * len(self.fields))
+        self._version = 0
+        self._write_lock = threading.Lock()
+        if initial:
+            self.update(**initial)
+
+    @property
+    def version(self):
+        """Число завершённых записей"""
+        return self._version >> 1
+
+    def update(self, **values):
+        """Атомарно записать несколько полей"""
+        index = self.index
+        data = self._data
+        with self._write_lock:
+            self._version += 1          # нечётная версия - идёт запись
+            for name, value in values.items():
+                data[index[name]] = value
+            self._version += 1          # чётная версия - запись завершена
+
+    def get(self, name):
+        """Прочитать одно поле (чтение одного числа атомарно само по себе)"""
+        return self._data[self.index[name]]
+
+    def snapshot(self):
+        """
+        Согласованный снимок всех полей: (версия, array('d')).
+        Без блокировки; при гонке с писателем копия просто повторяется.
+        """
+        while True:
+            before = self._version
+            if not before & 1:
+                copy = self._data[:]
+                if self._version == before:
+                    return before >> 1, copy
+            time.sleep(0)   # отдать GIL писателю
+
+    def as_dict(self):
+        """Снимок в виде словаря (для JSON/телеметрии)"""
+        version, values = self.snapshot()
+        result = dict(zip(self.fields, values))
+        result["version"] = version
+        return result
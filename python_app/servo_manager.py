@@ -0,0 +1,256 @@
+# servo_manager.py
+"""
+Один планировщик для всех сервоприводов (pan/tilt и далее).
+
+ControlServoCam ведёт ровно один пин и на время плавного движения
+занимает вызывающий поток. Здесь любое число осей обслуживает один
+поток - ControlLoop "servos" с частотой SERVO_RATE_HZ (кадр сервы):
+
+- движение задаётся целями сразу для нескольких осей; у всех осей общие
+  момент старта и длительность (по самой дальней оси), поэтому они
+  приходят в цель одновременно;
+- на каждом тике угол каждой оси считается по её траектории
+  (servo_trajectory.ServoTrajectory) или интегрируется в режиме скорости (jog);
+- изменившиеся ширины импульсов всех осей пишутся одним вызовом
+  run_script (pigpio_scripts.DaemonServoScript), а если скрипт недоступен -
+  по одному set_servo_pulsewidth на ось.
+
+Ось (ServoAxis) повторяет API ControlServoCam (set_angle, jog, get_angle,
+estimated_angle, trajectory_status, set_angle_proportional, move_by), так что ось "pan" подставляется вместо
+него в app.py без изменения маршрутов.
+"""
+
+import time
+
+from control_motor import SERVO_RATE_HZ, SERVO_JOG_MAX_RATE, SERVO_JOG_ACCEL, SERVO_JOG_TIMEOUT_S
+from control_loop import ControlLoop
+from motion_profile import WheelProfile
+from pigpio_scripts import DaemonServoScript, SCRIPT_PARAMS
+from servo_trajectory import ServoTrajectory, move_duration, jog_estimate, jog_status
+from robot_log import get_logger
+
+log = get_logger("servos")
+
+
+class ServoAxis:
+    """
+    Одна ось: геометрия, текущий и целевой угол, траектория или режим скорости.
+
+    Args:
+        name: имя оси ("pan", "tilt", ...)
+        pin: GPIO сервопривода
+    """
+
+    def __init__(self, name, pin, min_angle=0.0, max_angle=180.0, default_angle=90.0,
+                 min_pulse=600, max_pulse=2400, speed_factor=1.0):
+        self.name = name
+        self.servo_pin = pin
+        self.min_angle = float(min_angle)
+        self.max_angle = float(max_angle)
+        self.min_pulse = min_pulse
+        self.max_pulse = max_pulse
+        self.speed_factor = speed_factor
+        self.current_angle = self.clamp(default_angle)
+        self.target_angle = self.current_angle
+        self.trajectory = ServoTrajectory.hold(self.current_angle, time.monotonic())
+        self.moving = False     # траекторию ещё ведёт тик планировщика
+        self.pulse_width = self._angle_to_pulsewidth(self.current_angle)
+        self.manager = None
+        self._jog = WheelProfile(SERVO_JOG_ACCEL)
+        self._jog_deadline = 0.0
+        self.jogging = False
+
+    def clamp(self, angle):
+        return max(self.min_angle, min(float(angle), self.max_angle))
+
+    def _angle_to_pulsewidth(self, angle):
+        angle = self.clamp(angle)
+        return int(self.min_pulse + (angle / 180.0) * (self.max_pulse - self.min_pulse))
+
+    # --- API как у ControlServoCam --------------------------------------------
+
+    def set_angle(self, angle, smooth=True, duration=None):
+        return self.manager.move({self.name: angle}, duration=duration, smooth=smooth)
+
+    def set_angle_proportional(self, value, min_value=0.0, max_value=100.0):
+        normalized = max(0.0, min(1.0, (value - min_value) / (max_value - min_value)))
+        return self.set_angle(self.min_angle + normalized * (self.max_angle - self.min_angle))
+
+    def move_by(self, delta_angle, smooth=True):
+        return self.set_angle(self.get_angle() + delta_angle, smooth)
+
+    def set_speed_factor(self, factor):
+        self.speed_factor = max(0.1, min(factor, 5.0))
+
+    def jog(self, rate, timeout=SERVO_JOG_TIMEOUT_S):
+        return self.manager.jog(self.name, rate, timeout)
+
+    @property
+    def jog_rate(self):
+        return self._jog.value
+
+    def get_angle(self, now=None):
+        """Заданный угол на текущий момент (в том числе в середине движения), O(1)"""
+        if self.jogging:
+            return self.current_angle
+        return self.trajectory.angle_at(time.monotonic() if now is None else now)
+
+    def estimated_angle(self, now=None):
+        """Оценка фактического угла сервы (модель задержки и скорости привода)"""
+        if self.jogging:
+            return jog_estimate(self.current_angle, self.jog_rate, self.min_angle, self.max_angle)
+        return self.trajectory.estimated_at(time.monotonic() if now is None else now)
+
+    def trajectory_status(self, now=None):
+        """Текущее движение: старт, цель, профиль, заданный и оценённый угол"""
+        if self.jogging:
+            return jog_status(self.current_angle, self.jog_rate, self.min_angle, self.max_angle)
+        return self.trajectory.as_dict(time.monotonic() if now is None else now)
+
+    @property
+    def is_moving(self):
+        return self.moving or self.jogging
+
+    def cleanup(self):
+        pass    # пины освобождает ServoManager.cleanup()
+
+    def status(self):
+        now = time.monotonic()
+        return {"angle": self.get_angle(now), "estimated_angle": self.estimated_angle(now),
+                "target": self.target_angle, "moving": self.is_moving, "jogging": self.jogging,
+                "jog_rate": self.jog_rate, "pulse_us": self.pulse_width, "pin": self.servo_pin}
+
+
+class ServoManager:
+    """
+    Планировщик осей: один поток, общий тик, пакетная запись импульсов.
+
+    Args:
+        pi: подключение pigpio
+        axes: оси ServoAxis
+        state (RobotState): куда писать угол оси "pan" (servo_angle), необязательно
+    """
+
+    def __init__(self, pi, axes, rate_hz=SERVO_RATE_HZ, state=None):
+        self.pi = pi
+        self.axes = {axis.name: axis for axis in axes}
+        self._order = tuple(self.axes.values())
+        self.state = state
+        for axis in self._order:
+            axis.manager = self
+        self.script = None
+        if len(self._order) <= SCRIPT_PARAMS:
+            try:
+                self.script = DaemonServoScript(pi, [axis.servo_pin for axis in self._order])
+            except Exception as e:
+                log.warning("Servo script unavailable, writing pulses one by one: %s", e)
+        self._write([axis.pulse_width for axis in self._order])
+        self.loop = ControlLoop(rate_hz, "servos")
+        self.loop.add(self.step)
+
+    def servo(self, name):
+        return self.axes[name]
+
+    def move(self, targets, duration=None, smooth=True):
+        """
+        Синхронное движение: targets = {"pan": угол, "tilt": угол, ...}.
+        Все оси стартуют сейчас и приходят в цель одновременно; без duration
+        длительность - по самой дальней оси. Текущее движение и jog прерываются.
+        """
+        now = time.monotonic()
+        plans = []
+        for name, angle in targets.items():
+            axis = self.axes[name]
+            plans.append((axis, axis.get_angle(now), axis.clamp(angle), axis.estimated_angle(now)))
+        if not plans:
+            return True
+        if not smooth:
+            duration = 0.0
+        elif duration is None:
+            duration = max(move_duration(end - start, axis.speed_factor) for axis, start, end, _ in plans)
+        else:
+            duration = move_duration(0.0, duration=duration)
+        for axis, start, end, physical in plans:
+            axis.jogging = False
+            axis._jog.reset()
+            axis.target_angle = end
+            axis.current_angle = start
+            axis.trajectory = ServoTrajectory(start, end, now, duration, physical_start=physical)
+            axis.moving = True
+        return True
+
+    def jog(self, name, rate, timeout=SERVO_JOG_TIMEOUT_S):
+        """Режим скорости оси (как ControlServoCam.jog)"""
+        axis = self.axes[name]
+        rate = max(-SERVO_JOG_MAX_RATE, min(float(rate), SERVO_JOG_MAX_RATE))
+        axis._jog_deadline = time.monotonic() + timeout
+        if not axis.jogging and rate:
+            axis.current_angle = axis.get_angle()
+            axis.moving = False
+            axis._jog.reset()
+            axis.jogging = True
+        axis._jog.target = rate
+        return True
+
+    def step(self, dt, now):
+        """Тик планировщика: углы всех осей и одна запись изменившихся импульсов"""
+        changed = False
+        for axis in self._order:
+            if axis.jogging:
+                angle = self._jog_step(axis, dt, now)
+            elif axis.moving:
+                trajectory = axis.trajectory
+                angle = trajectory.angle_at(now)
+                if trajectory.done(now):
+                    axis.moving = False
+            else:
+                continue
+            axis.current_angle = angle
+            width = axis._angle_to_pulsewidth(angle)
+            if width != axis.pulse_width:
+                axis.pulse_width = width
+                changed = True
+        if changed:
+            self._write([axis.pulse_width for axis in self._order])
+            self._publish()
+
+    def _jog_step(self, axis, dt, now):
+        jog = axis._jog
+        if now > axis._jog_deadline:
+            jog.target = 0.0
+        rate = jog.step(dt)
+        angle = axis.current_angle + rate * dt
+        if angle <= axis.min_angle or angle >= axis.max_angle:
+            angle = axis.clamp(angle)
+            jog.reset()
+        axis.target_angle = angle
+        if jog.target == 0.0 and jog.done:
+            axis.jogging = False
+            axis.trajectory = ServoTrajectory.hold(angle, now)
+        return angle
+
+    def _write(self, widths):
+        if self.script is not None:
+            self.script.write(widths)
+            return
+        for axis, width in zip(self._order, widths):
+            self.pi.set_servo_pulsewidth(axis.servo_pin, width)
+
+    def _publish(self):
+        pan = self.axes.get("pan")
+        if self.state is not None and pan is not None:
+            self.state.update(servo_angle=pan.current_angle, t_measured=time.monotonic())
+
+    def status(self):
+        """Текущее и целевое состояние всех осей (для API)"""
+        return {name: axis.status() for name, axis in self.axes.items()}
+
+    def cleanup(self):
+        self.loop.stop()
+        if self.script is not None:
+            self.script.cleanup()
+        for axis in self._order:
+            try:
+                self.pi.set_servo_pulsewidth(axis.servo_pin, 0)
+            except Exception:
+                pass
@@ -0,0 +1,115 @@
+# servo_trajectory.py
+"""
+Траектория сервопривода и оценка фактического положения.
+
+Траектория запоминает старт, цель, момент начала, длительность и профиль
+движения, поэтому угол на любой момент считается формулой за O(1) - без
+потока, который обновлял бы угол, и без истории команд. Так отвечают
+ControlServoCam.get_angle() и ServoAxis.get_angle() в середине движения.
+
+Заданный угол - не то, куда уже повернулась серва. Модель механики:
+
+- задержка SERVO_LAG_S: импульс читается раз в кадр 20 мс, ещё столько же
+  уходит на мёртвую зону и разгон привода;
+- ограничение скорости SERVO_MAX_SLEW_DEG_S: если профиль требует
+  большей пиковой скорости, серва проходит тот же путь дольше.
+
+Оценка - тот же профиль от оценённого положения в момент команды, но со
+сдвигом на задержку и растянутый до допустимой скорости (для мгновенной
+установки - равномерно с наибольшей скоростью). Это тоже формула O(1);
+ошибка модели - только внутри задержки после прерванного движения.
+"""
+
+from control_motor import SERVO_LAG_S, SERVO_MAX_SLEW_DEG_S
+from servo_waves import smoothstep
+
+# Профиль: функция 0..1 -> 0..1 и отношение пиковой скорости к средней
+PROFILES = {
+    "smoothstep": (smoothstep, 1.5),
+    "linear": (lambda t: t, 1.0),
+}
+
+
+def move_duration(angle_diff, speed_factor=1.0, duration=None):
+    """Длительность плавного движения на angle_diff градусов (None - по расстоянию)"""
+    if duration is None:
+        # Медленнее на малые расстояния, быстрее на большие
+        duration = (0.05 + abs(angle_diff) / 180.0 * 0.6) / speed_factor
+    return max(0.03, min(duration, 1.5))
+
+
+def _position(start, end, started, duration, ease, now):
+    if duration <= 0:
+        return end
+    t = (now - started) / duration
+    if t >= 1.0:
+        return end
+    if t <= 0.0:
+        return start
+    return start + (end - start) * ease(t)
+
+
+class ServoTrajectory:
+    """
+    Движение от start до end за duration секунд от started (time.monotonic()).
+
+    Args:
+        profile: "smoothstep" или "linear"; duration 0 - мгновенная установка
+        physical_start: оценка фактического угла в момент команды
+            (None - серва стоит в start)
+    """
+
+    def __init__(self, start, end, started, duration, profile="smoothstep", physical_start=None):
+        self.start = float(start)
+        self.end = float(end)
+        self.started = started
+        self.duration = max(0.0, duration)
+        self.profile = profile
+        self._ease = PROFILES[profile][0]
+        self.physical_start = self.start if physical_start is None else float(physical_start)
+        # Механика: тот же профиль (мгновенная установка - равномерно), позже на
+        # задержку и не быстрее SERVO_MAX_SLEW_DEG_S
+        self._physical_ease, peak = PROFILES[profile] if self.duration > 0 else PROFILES["linear"]
+        distance = abs(self.end - self.physical_start)
+        self.physical_started = started + SERVO_LAG_S
+        self.physical_duration = max(self.duration, peak * distance / SERVO_MAX_SLEW_DEG_S)
+
+    @classmethod
+    def hold(cls, angle, now):
+        """Серва стоит в angle (уже пришла)"""
+        return cls(angle, angle, now - SERVO_LAG_S, 0.0)
+
+    def angle_at(self, now):
+        """Заданный угол на момент now"""
+        return _position(self.start, self.end, self.started, self.duration, self._ease, now)
+
+    def estimated_at(self, now):
+        """Оценка фактического угла на момент now (с задержкой и ограничением скорости)"""
+        return _position(self.physical_start, self.end, self.physical_started,
+                         self.physical_duration, self._physical_ease, now)
+
+    def done(self, now):
+        """Заданное движение закончено"""
+        return now - self.started >= self.duration
+
+    def settled(self, now):
+        """По оценке серва пришла в цель"""
+        return now - self.physical_started >= self.physical_duration
+
+    def as_dict(self, now):
+        return {"start": self.start, "end": self.end, "profile": self.profile,
+                "duration": self.duration, "elapsed": max(0.0, now - self.started),
+                "commanded": self.angle_at(now), "estimated": self.estimated_at(now),
+                "settled": self.settled(now)}
+
+
+def jog_estimate(angle, rate, min_angle, max_angle):
+    """Оценка фактического угла в режиме скорости: заданный угол SERVO_LAG_S назад"""
+    return max(min_angle, min(angle - rate * SERVO_LAG_S, max_angle))
+
+
+def jog_status(angle, rate, min_angle, max_angle):
+    """То же, что ServoTrajectory.as_dict(), для режима скорости"""
+    return {"start": angle, "end": angle, "profile": "jog", "duration": 0.0, "elapsed": 0.0,
+            "commanded": angle, "estimated": jog_estimate(angle, rate, min_angle, max_angle),
+            "settled": rate == 0.0}
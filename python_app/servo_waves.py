@@ -0,0 +1,176 @@
+# servo_waves.py
+"""
+Траектории сервоприводов волнами (waveforms) pigpio.
+
+ControlServoCam._move_smoothly() выдаёт ~150 вызовов set_servo_pulsewidth
+в секунду из Python с time.sleep между ними: равномерность шагов зависит
+от GIL и задержек сокета, а серва всё равно читает импульс раз в кадр
+20 мс. Здесь вся траектория считается заранее - по одному импульсу на
+кадр, ширина по smoothstep - и отдаётся демону одной волной:
+
+    кадр k:  пин в 1 на width[k] мкс, затем в 0 до конца кадра 20 мс
+
+Волна движения и волна удержания (один кадр с конечной шириной)
+связываются цепочкой wave_chain: [движение, начало цикла, удержание,
+цикл навсегда]. Демон проигрывает её по DMA с точностью до микросекунды,
+а после прихода продолжает держать серву - Python только отправляет
+траекторию и при необходимости отменяет её.
+
+Одна волна может вести несколько пинов сразу: в каждом кадре все
+импульсы начинаются вместе, а заканчиваются каждый в своё время, так что
+оси многоосевого движения приходят в цель в один и тот же кадр.
+
+Ограничения pigpio: передаётся только одна волна (цепочка) на весь
+демон, wave_tx_stop останавливает её целиком, а пока пин ведёт волна,
+set_servo_pulsewidth на нём нужно выключать (ширина 0).
+
+Проверка на сервоприводе (0 -> 180 -> 90 градусов волнами):
+    python3 servo_waves.py
+"""
+
+import time
+
+import pigpio
+
+SERVO_FRAME_US = 20000  # Период кадра сервы (50 Гц)
+
+
+def smoothstep(t):
+    """Плавный разгон и торможение: 0 -> 1 с нулевой скоростью на концах"""
+    return t * t * (3.0 - 2.0 * t)
+
+
+def smoothstep_widths(start_us, end_us, frames):
+    """Ширины импульсов по кадрам: frames кадров движения, последний - точно end_us"""
+    frames = max(1, int(frames))
+    return [int(round(start_us + (end_us - start_us) * smoothstep(k / frames)))
+            for k in range(1, frames + 1)]
+
+
+def frame_pulses(pins, widths, frame_us=SERVO_FRAME_US):
+    """
+    Импульсы одного кадра для нескольких пинов: все поднимаются в начале
+    кадра, каждый опускается через свою ширину. Ширина 0 - пин не трогаем.
+    """
+    ends = {}       # ширина -> маска пинов, опускаемых в этот момент
+    on_mask = 0
+    for pin, width in zip(pins, widths):
+        if width > 0:
+            on_mask |= 1 << pin
+            ends[width] = ends.get(width, 0) | (1 << pin)
+    if not on_mask:
+        return [pigpio.pulse(0, 0, frame_us)]
+    pulses = []
+    gpio_on, gpio_off, elapsed = on_mask, 0, 0
+    for width in sorted(ends):
+        pulses.append(pigpio.pulse(gpio_on, gpio_off, width - elapsed))
+        gpio_on, gpio_off, elapsed = 0, ends[width], width
+    pulses.append(pigpio.pulse(0, gpio_off, frame_us - elapsed))
+    return pulses
+
+
+class ServoWaveDriver:
+    """
+    Проигрывание заранее посчитанных траекторий на одном или нескольких
+    пинах волнами pigpio.
+
+    Args:
+        pi: подключение pigpio
+        pins: пины сервоприводов (порядок - порядок столбцов в play())
+    """
+
+    def __init__(self, pi, pins, frame_us=SERVO_FRAME_US):
+        self.pi = pi
+        self.pins = tuple(pins)
+        self.frame_us = frame_us
+        self.frames = []            # ширины по кадрам текущей траектории: [(w0, w1, ...), ...]
+        self.started = None         # time.monotonic() отправки цепочки
+        self._waves = []
+        for pin in self.pins:
+            pi.set_mode(pin, pigpio.OUTPUT)
+
+    def _create(self, frames):
+        pulses = []
+        for widths in frames:
+            pulses.extend(frame_pulses(self.pins, widths, self.frame_us))
+        self.pi.wave_add_new()
+        self.pi.wave_add_generic(pulses)
+        wave_id = self.pi.wave_create()
+        self._waves.append(wave_id)
+        return wave_id
+
+    def play(self, frames):
+        """
+        Отправить траекторию: frames - ширины импульсов по кадрам (по одной
+        на пин в каждом кадре). Последний кадр удерживается до следующей
+        траектории или stop(). Текущая траектория прерывается.
+        """
+        frames = [tuple(widths) for widths in frames]
+        self.stop()
+        for pin in self.pins:
+            self.pi.set_servo_pulsewidth(pin, 0)    # пин ведёт волна, а не servo-ШИМ
+        move = self._create(frames)
+        hold = self._create(frames[-1:])
+        self.pi.wave_chain([move, 255, 0, hold, 255, 3])
+        self.started = time.monotonic()
+        self.frames = frames
+
+    def frame_index(self, now=None):
+        """Номер кадра, который выдаётся сейчас (по времени с отправки)"""
+        if self.started is None or not self.frames:
+            return None
+        now = time.monotonic() if now is None else now
+        index = int((now - self.started) * 1e6 / self.frame_us)
+        return max(0, min(index, len(self.frames) - 1))
+
+    def widths(self, now=None):
+        """Ширины импульсов, выдаваемые сейчас (None - волна не идёт)"""
+        index = self.frame_index(now)
+        return None if index is None else self.frames[index]
+
+    @property
+    def moving(self):
+        index = self.frame_index()
+        return index is not None and index < len(self.frames) - 1
+
+    def stop(self):
+        """
+        Остановить волну; возвращает ширины, которые выдавались в момент
+        остановки (None - волна не шла). Пины остаются в 0 - дальше серву
+        ведёт set_servo_pulsewidth или следующая траектория.
+        """
+        current = self.widths()
+        if self._waves:
+            self.pi.wave_tx_stop()
+            for wave_id in self._waves:
+                self.pi.wave_delete(wave_id)
+            self._waves = []
+        self.started = None
+        self.frames = []
+        return current
+
+
+# ============================================================================
+# ПРОВЕРКА НА СЕРВОПРИВОДЕ
+# ============================================================================
+
+def demo(pin=24):
+    from control_motor import pi
+    driver = ServoWaveDriver(pi, (pin,))
+    try:
+        position = 1500
+        for end, duration in ((600, 1.0), (2400, 1.5), (1500, 0.8)):
+            frames = smoothstep_widths(position, end, duration * 1e6 / SERVO_FRAME_US)
+            driver.play([(w,) for w in frames])
+            print(f"{position} -> {end} us: {len(frames)} кадров, отправлено одной цепочкой")
+            while driver.moving:
+                time.sleep(0.05)
+            time.sleep(0.3)
+            position = end
+    finally:
+        driver.stop()
+        pi.set_servo_pulsewidth(pin, 0)
+
+
+if __name__ == "__main__":
+    demo()
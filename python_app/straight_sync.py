@@ -0,0 +1,144 @@
+# straight_sync.py
+"""
+Синхронизация бортов при езде прямо (удержание курса по энкодерам).
+
+SimpleRobot.update_sync() из test_motors_encoders_ver3.py сравнивал
+приращения счёта за последние 5 вызовов (история в списках с pop(0)),
+правил ШИМ напрямую через _apply_speed при разнице больше 2 и работал,
+только когда его кто-то вызывал. Здесь регулятор перекрёстной связи
+работает на тике ControlLoop шасси:
+
+- включается, пока уставки обоих колёс равны и не нулевые (езда прямо);
+  с этого момента запоминается база счёта;
+- ошибка - накопленная разница пройденного пути e = (L - L0) - (R - R0)
+  в отсчётах энкодера, т.е. отклонение курса;
+- поправка c = SYNC_KP * e + SYNC_KI * ∫e dt + SYNC_KD * de/dt в
+  отсчётах/с вычитается из уставки левого колеса и прибавляется к правой
+  (по половине), средняя скорость не меняется. Без интеграла разница
+  мотора компенсировалась бы постоянной ошибкой e, с ним e сводится к
+  нулю. Знак верен и при езде назад;
+- de/dt - разница за SYNC_RATE_WINDOW тиков из кольцевого буфера
+  фиксированного размера: одна запись и одно чтение на тик, O(1).
+
+Поправка действует в обоих режимах шасси: в "closed" - на уставки ПИД
+скорости колёс, в "open" - на доли скорости перед переводом в ШИМ.
+Счёт берётся из общего опроса EncoderHub (левый и правый в один момент).
+"""
+
+from control_motor import SYNC_ENABLED, SYNC_KP, SYNC_KI, SYNC_KD, SYNC_RATE_WINDOW, SYNC_MAX_CORRECTION, \
+    TRACKING_ERROR_TAU
+from metrics import REGISTRY
+
+
+class StraightLineSync:
+    """
+    Регулятор разницы счёта левого и правого колеса.
+
+    Args:
+        hub (EncoderHub): общий опрос энкодеров (столбцы 0 и 1 - левый и правый),
+            опрашиваемый раньше на том же тике
+        state (RobotState): куда публиковать ошибку и поправку (необязательно)
+    """
+
+    def __init__(self, hub, state=None, kp=SYNC_KP, ki=SYNC_KI, kd=SYNC_KD, window=SYNC_RATE_WINDOW,
+                 max_correction=SYNC_MAX_CORRECTION, enabled=SYNC_ENABLED):
+        self.hub = hub
+        self.state = state
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.max_correction = max_correction
+        self.enabled = enabled
+        # Кольцевой буфер последних window тиков: ошибка и длительность тика
+        self._errors = [0] * max(1, window)
+        self._dts = [0.0] * max(1, window)
+        self._index = 0
+        self.reset()
+        self.reset_metrics()
+
+    def reset(self):
+        """Выйти из режима езды прямо (база счёта возьмётся заново)"""
+        self.engaged = False
+        self.error = 0              # накопленная разница счёта (отсчёты)
+        self.rate = 0.0             # скорость роста разницы (отсчётов/с)
+        self.correction = 0.0
+        self.integral = 0.0         # вклад интеграла в поправку (отсчётов/с)
+        self._base = None
+        self._filled = 0
+        self._dt_sum = 0.0
+
+    def reset_metrics(self):
+        self.max_abs_error = 0
+        self.mean_sq_error = 0.0
+        self.straight_time = 0.0    # суммарное время езды прямо с включённой синхронизацией
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+        self.reset()
+        self.reset_metrics()
+
+    def adjust(self, left_speed, right_speed, dt):
+        """
+        Шаг регулятора (раз за тик ControlLoop): уставки колёс (отсчётов/с)
+        -> уставки с поправкой.
+        """
+        if not self.enabled or left_speed != right_speed or not left_speed or not self.hub.samples:
+            if self.engaged:
+                self.reset()
+                self._publish()
+            return left_speed, right_speed
+
+        _, counts, _ = self.hub.latest
+        if not self.engaged:
+            self.engaged = True
+            self._base = counts
+        error = (counts[0] - self._base[0]) - (counts[1] - self._base[1])
+
+        # Производная за окно: ошибка window тиков назад лежит в текущей ячейке буфера
+        errors = self._errors
+        i = self._index
+        if self._filled == len(errors):
+            self.rate = (error - errors[i]) / self._dt_sum if self._dt_sum > 0 else 0.0
+            self._dt_sum -= self._dts[i]
+        else:
+            self._filled += 1
+        errors[i] = error
+        self._dts[i] = dt
+        self._dt_sum += dt
+        self._index = (i + 1) % len(errors)
+
+        # Anti-windup: интеграл ограничен тем же пределом, что и вся поправка
+        limit = self.max_correction
+        self.integral = max(-limit, min(limit, self.integral + self.ki * error * dt))
+        correction = self.kp * error + self.integral + self.kd * self.rate
+        correction = max(-limit, min(limit, correction))
+        self.error = error
+        self.correction = correction
+
+        self.straight_time += dt
+        self.max_abs_error = max(self.max_abs_error, abs(error))
+        alpha = min(1.0, dt / TRACKING_ERROR_TAU)
+        self.mean_sq_error += alpha * (error * error - self.mean_sq_error)
+        self._publish()
+        return left_speed - 0.5 * correction, right_speed + 0.5 * correction
+
+    def rms_error(self):
+        return self.mean_sq_error ** 0.5
+
+    def _publish(self):
+        if self.state is not None:
+            self.state.update(sync_error=self.error, sync_correction=self.correction)
+        REGISTRY.set_gauge("robot_sync_count_error", self.error,
+                           "Accumulated left-right encoder count difference while driving straight")
+        REGISTRY.set_gauge("robot_sync_count_error_rms", self.rms_error(),
+                           "Smoothed RMS left-right count difference while driving straight")
+        REGISTRY.set_gauge("robot_sync_correction_cps", self.correction,
+                           "Straight-line sync speed correction (encoder counts/s)")
+
+    def status(self):
+        """Состояние регулятора и метрики слежения (для API)"""
+        return {"enabled": self.enabled, "engaged": self.engaged, "error": self.error,
+                "rate": self.rate, "correction": self.correction, "integral": self.integral,
+                "rms_error": self.rms_error(), "max_abs_error": self.max_abs_error,
+                "straight_time_s": self.straight_time,
+                "kp": self.kp, "ki": self.ki, "kd": self.kd, "max_correction": self.max_correction}
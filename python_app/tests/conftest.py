@@ -0,0 +1,56 @@
+# conftest.py
+"""
+Проверки без робота: модули python_app импортируются с заглушкой pigpio
+вместо библиотеки, поэтому демон и GPIO не нужны. control_motor при
+импорте "подключается" к заглушке и настраивает пины на ней.
+"""
+
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+class FakeCallback:
+    def cancel(self):
+        pass
+
+
+class FakePi:
+    """pigpio.pi без демона: вызовы записываются в calls, возвращают 0"""
+
+    connected = True
+
+    def __init__(self, *args):
+        self.calls = []
+
+    def read(self, gpio):
+        return 0
+
+    def callback(self, *args):
+        self.calls.append(("callback",) + args)
+        return FakeCallback()
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.calls.append((name,) + args)
+            return 0
+        return call
+
+
+class FakePulse:
+    def __init__(self, gpio_on, gpio_off, delay):
+        self.gpio_on = gpio_on
+        self.gpio_off = gpio_off
+        self.delay = delay
+
+
+fake_pigpio = types.ModuleType("pigpio")
+fake_pigpio.pi = FakePi
+fake_pigpio.pulse = FakePulse
+fake_pigpio.INPUT, fake_pigpio.OUTPUT = 0, 1
+fake_pigpio.PUD_OFF, fake_pigpio.PUD_DOWN, fake_pigpio.PUD_UP = 0, 1, 2
+fake_pigpio.RISING_EDGE, fake_pigpio.FALLING_EDGE, fake_pigpio.EITHER_EDGE = 0, 1, 2
+fake_pigpio.PI_SCRIPT_INITING, fake_pigpio.PI_SCRIPT_HALTED = 0, 1
+sys.modules["pigpio"] = fake_pigpio
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from encoders import QuadratureEncoder, EncoderCounters, TRANSITIONS, ILLEGAL, stress_test, \
+    _edge_sequence, _NoCallbackPi, _OfflinePi
+
+
+def make_encoder(pin_a=0, pin_b=1):
+    encoder = QuadratureEncoder(_NoCallbackPi(_OfflinePi()), pin_a, pin_b)
+    encoder.state = 0
+    return encoder
+
+
+def feed(encoder, edges):
+    handlers = {encoder.pin_a: encoder._edge_a, encoder.pin_b: encoder._edge_b}
+    for gpio, level, tick in edges:
+        handlers[gpio](gpio, level, tick)
+
+
+def test_transition_table_steps():
+    # Вперёд 00 -> 10 -> 11 -> 01 -> 00, назад - обратно, через два бита - ошибка
+    forward = ((0b00, 0b10), (0b10, 0b11), (0b11, 0b01), (0b01, 0b00))
+    for prev, new in forward:
+        assert TRANSITIONS[(prev << 2) | new] == 1
+        assert TRANSITIONS[(new << 2) | prev] == -1
+    for prev, new in ((0b00, 0b11), (0b01, 0b10), (0b00, 0b00)):
+        assert TRANSITIONS[(prev << 2) | new] == ILLEGAL
+
+
+def state_edges(states, pin_a=0, pin_b=1, start_tick=0):
+    """Фронты (gpio, level, tick) для последовательности состояний AB от 00"""
+    edges, prev = [], 0
+    for i, new in enumerate(states):
+        if (prev ^ new) & 2:
+            edges.append((pin_a, new >> 1, start_tick + i * 100))
+        else:
+            edges.append((pin_b, new & 1, start_tick + i * 100))
+        prev = new
+    return edges
+
+
+def test_decoder_counts_both_directions():
+    encoder = make_encoder()
+    feed(encoder, _edge_sequence(400, 0, 1))
+    assert encoder.get_count() == 400
+    assert encoder.errors == 0
+    assert encoder.direction == 1
+    feed(encoder, state_edges((0b01, 0b11, 0b10, 0b00) * 50, start_tick=40000))
+    assert encoder.get_count() == 200
+    assert encoder.errors == 0
+    assert encoder.direction == -1
+
+
+def test_snapshot_and_reset_keeps_every_edge():
+    left, right = make_encoder(0, 1), make_encoder(2, 3)
+    counters = EncoderCounters((left, right))
+    feed(left, _edge_sequence(10, 0, 1))
+    tick, counts = counters.snapshot_and_reset()
+    assert counts == (10, 0)
+    assert tick == 900
+    feed(right, _edge_sequence(6, 2, 3))
+    assert counters.snapshot()[1] == (0, 6)
+    assert counters.snapshot_and_reset()[1] == (0, 6)
+    assert counters.snapshot()[1] == (0, 0)
+
+
+def test_stress_snapshots_under_concurrent_edges():
+    assert stress_test(duration=1.0, verbose=False)
+
+
+def test_snapshot_never_torn_by_concurrent_reset():
+    # Фронты, снимки и сбросы - в трёх разных потоках
+    left, right = make_encoder(0, 1), make_encoder(2, 3)
+    counters = EncoderCounters((left, right))
+    sequences = (_edge_sequence(4, 0, 1), _edge_sequence(4, 2, 3))
+    handlers = ({0: left._edge_a, 1: left._edge_b}, {2: right._edge_a, 3: right._edge_b})
+    stop = threading.Event()
+    failures = []
+
+    def writer():
+        edge = 0
+        while not stop.is_set():
+            for side in (0, 1):
+                gpio, level, _ = sequences[side][(edge >> 1) & 3]
+                handlers[side][gpio](gpio, level, edge)
+                edge += 1
+
+    def resetter():
+        while not stop.is_set():
+            counters.snapshot_and_reset()
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=resetter)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 0.5
+    try:
+        while time.monotonic() < deadline and not failures:
+            _, (l, r) = counters.snapshot()
+            # От базы сброса левый опережает правый не больше чем на отсчёт в любую сторону
+            if l < 0 or r < 0 or abs(l - r) > 1:
+                failures.append((l, r))
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert not failures
@@ -0,0 +1,57 @@
+import random
+
+from metrics import (LatencyHistogram, MetricsRegistry, EXPORT_BUCKETS,
+                     _bucket_index, _bucket_upper, _BUCKETS_TOTAL, _HALF_COUNT)
+
+
+def bucket_lower(index):
+    return _bucket_upper(index - 1) if index else 0
+
+
+def test_buckets_are_contiguous():
+    # Нижняя граница каждой корзины - верхняя граница предыдущей, без дыр
+    for index in range(1, _BUCKETS_TOTAL):
+        assert _bucket_index(bucket_lower(index)) == index
+        assert _bucket_index(_bucket_upper(index) - 1) == index
+
+
+def test_value_lands_in_its_bucket_with_bounded_error():
+    rng = random.Random(1)
+    for _ in range(20000):
+        value = int(2 ** rng.uniform(0, 39))
+        index = _bucket_index(value)
+        assert bucket_lower(index) <= value < _bucket_upper(index)
+        # Ширина корзины - не больше 1/_HALF_COUNT от значения
+        assert _bucket_upper(index) - bucket_lower(index) <= max(1, value / _HALF_COUNT)
+
+
+def test_overflow_goes_to_last_bucket():
+    assert _bucket_index(1 << 45) == _BUCKETS_TOTAL - 1
+    assert _bucket_index(0) == 0
+
+
+def test_quantiles():
+    hist = LatencyHistogram("t")
+    for value in range(1, 1001):
+        hist.record_ns(value * 1000)   # 1..1000 мкс
+    for q, expected in ((0.5, 500000), (0.9, 900000), (0.99, 990000)):
+        estimate = hist.quantile_ns(q)
+        assert expected <= estimate <= expected * (1 + 1.0 / _HALF_COUNT)
+    assert hist.quantile_ns(1.0) == hist.max_ns == 1000000
+    assert LatencyHistogram("empty").quantile_ns(0.5) == 0
+
+
+def test_cumulative_export():
+    registry = MetricsRegistry()
+    hist = registry.histogram("latency_seconds", "test", endpoint="/x")
+    for value in (5000, 20000, 300000, 3000000000):     # 5 мкс, 20 мкс, 0.3 мс, 3 с
+        hist.record_ns(value)
+    bounds_ns = [int(b * 1e9) for b in EXPORT_BUCKETS]
+    cumulative, total = hist.cumulative_le(bounds_ns)
+    assert total == 4
+    assert cumulative[EXPORT_BUCKETS.index(0.00001)] == 1
+    assert cumulative[EXPORT_BUCKETS.index(0.0005)] == 3
+    assert cumulative[-1] == 3
+    text = registry.render_prometheus()
+    assert 'latency_seconds_bucket{endpoint="/x",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{endpoint="/x"} 4' in text
@@ -0,0 +1,53 @@
+from motion_profile import WheelProfile
+
+DT = 0.02
+
+
+def run(profile, seconds):
+    values = [profile.step(DT) for _ in range(int(round(seconds / DT)))]
+    return values
+
+
+def test_trapezoid_limits_acceleration():
+    profile = WheelProfile(max_accel=2.0)
+    profile.target = 1.0
+    values = run(profile, 1.0)
+    steps = [b - a for a, b in zip([0.0] + values, values)]
+    assert max(steps) <= 2.0 * DT + 1e-12
+    assert values[-1] == 1.0 and profile.done
+
+
+def test_s_curve_reaches_target_without_overshoot():
+    profile = WheelProfile(max_accel=2.0, max_jerk=10.0)
+    profile.target = 1.0
+    previous_accel = 0.0
+    while not profile.done:
+        value = profile.step(DT)
+        assert value <= 1.0
+        if profile.done:
+            break       # последний шаг встаёт точно в цель
+        assert abs(profile.accel) <= 2.0 + 1e-9
+        assert abs(profile.accel - previous_accel) <= 10.0 * DT + 1e-9
+        previous_accel = profile.accel
+    assert profile.value == 1.0 and profile.done
+
+
+def test_reversal_passes_through_zero_decelerating():
+    profile = WheelProfile(max_accel=2.0)
+    profile.reset(0.5)
+    profile.target = -0.5
+    assert profile.decelerating
+    while profile.value > 0:
+        profile.step(DT)
+    assert not profile.decelerating
+    run(profile, 1.0)
+    assert profile.value == -0.5
+
+
+def test_reset_jumps_without_profile():
+    profile = WheelProfile(max_accel=2.0, max_jerk=10.0)
+    profile.target = 1.0
+    run(profile, 0.1)
+    profile.reset()
+    assert profile.value == profile.target == profile.accel == 0.0
+    assert profile.step(DT) == 0.0
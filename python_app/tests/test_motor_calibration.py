@@ -0,0 +1,44 @@
+from control_motor import Motor, MIN_PWM, MAX_PWM
+from motor_calibration import DirectionTable, MotorSpeedTable, load_calibration
+from wheel_control import WheelVelocityPID
+
+
+def make_table(deadband=12.0):
+    duties = list(range(0, MAX_PWM + 1, 10))
+    speeds = [max(0.0, (d - deadband) * 5.0) for d in duties]
+    return DirectionTable(duties, speeds, deadband)
+
+
+def test_inverse_table_round_trip():
+    table = make_table()
+    for speed in (50.0, 200.0, 500.0):
+        assert abs(table.speed_for_duty(table.duty_for_speed(speed)) - speed) < 5.0
+    assert table.duty_for_speed(0.0) == 0.0
+    assert table.duty_for_speed(1.0, starting=True) == table.deadband
+
+
+def test_motor_floor_uses_calibrated_deadband():
+    motor = Motor(18, 20, 21, "test")
+    assert motor._plan(5)[1] == MIN_PWM
+    motor.set_deadband(12.0, 16.0)
+    assert motor._plan(14)[1] == 14
+    assert motor._plan(5)[1] == 12.0
+    assert motor._plan(-5)[1] == 16.0
+
+
+def test_pid_output_floor_follows_deadband():
+    pid = WheelVelocityPID(kp=0.0, ki=0.0, kd=0.0, kff=0.02)
+    assert pid.update(100.0, 100.0, 0.02) == MIN_PWM
+    pid.min_outputs = (12.0, 16.0)
+    assert pid.update(100.0, 100.0, 0.02) == 12.0
+    assert pid.update(-100.0, -100.0, 0.02) == -16.0
+    assert pid.update(1000.0, 1000.0, 0.02) == 20.0
+
+
+def test_malformed_calibration_is_ignored(tmp_path):
+    path = tmp_path / "calibration.json"
+    path.write_text('{"left": {}}')
+    assert load_calibration(str(path)) is None
+    assert load_calibration(str(tmp_path / "missing.json")) is None
+    table = MotorSpeedTable(make_table(12.0), make_table(16.0))
+    assert table.deadbands == (12.0, 16.0)
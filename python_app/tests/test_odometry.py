@@ -0,0 +1,53 @@
+import math
+
+from odometry import Odometry
+
+
+def make(track=100.0):
+    # 1 мм на отсчёт: диаметр 1/pi, один отсчёт на оборот
+    odometry = Odometry(wheel_diameter_mm=1.0 / math.pi, track_width_mm=track, counts_per_rev=1)
+    odometry.update(0, 0)
+    return odometry
+
+
+def test_straight_line():
+    odometry = make()
+    odometry.update(500, 500)
+    x, y, heading = odometry.pose
+    assert (round(x, 9), round(y, 9), heading) == (500.0, 0.0, 0.0)
+    assert odometry.distance == 500.0
+
+
+def test_spin_in_place():
+    odometry = make(track=100.0)
+    quarter = 100.0 * math.pi / 4     # dθ = (dr - dl) / колея = pi/2
+    odometry.update(-quarter, quarter)
+    x, y, heading = odometry.pose
+    assert abs(x) < 1e-9 and abs(y) < 1e-9
+    assert math.isclose(heading, math.pi / 2)
+
+
+def test_arc_is_exact_for_any_step():
+    # Полный круг радиусом 200 мм по центру - что одним шагом на четверть, что мелкими
+    track, radius = 100.0, 200.0
+    left_total = 2 * math.pi * (radius - track / 2)
+    right_total = 2 * math.pi * (radius + track / 2)
+    for steps in (4, 1000):
+        odometry = make(track)
+        for i in range(1, steps + 1):
+            odometry.update(left_total * i / steps, right_total * i / steps)
+            if steps == 4 and i == 1:
+                x, y, heading = odometry.pose
+                assert math.isclose(x, radius) and math.isclose(y, radius)
+        x, y, heading = odometry.pose
+        assert abs(x) < 1e-6 and abs(y) < 1e-6
+        assert abs(heading) < 1e-9
+
+
+def test_reset_keeps_counts_baseline():
+    odometry = make()
+    odometry.update(300, 300)
+    odometry.reset()
+    assert odometry.pose == (0.0, 0.0, 0.0)
+    odometry.update(400, 400)
+    assert math.isclose(odometry.pose[0], 100.0)
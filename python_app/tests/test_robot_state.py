@@ -0,0 +1,28 @@
+import pytest
+
+from robot_state import RobotState
+
+
+def test_update_and_snapshot():
+    state = RobotState(set_x=0.5)
+    state.update(set_y=-1, odom_x=12.5)
+    version, values = state.snapshot()
+    assert version == 2
+    assert values[state.index["set_x"]] == 0.5
+    assert state.as_dict()["odom_x"] == 12.5
+
+
+@pytest.mark.parametrize("values, error", [
+    ({"set_x": 1.0, "no_such_field": 1.0}, KeyError),
+    ({"set_x": 1.0, "set_y": None}, TypeError),
+    ({"set_x": "fast"}, ValueError),
+])
+def test_bad_update_leaves_state_readable(values, error):
+    state = RobotState()
+    with pytest.raises(error):
+        state.update(**values)
+    # Версия осталась чётной: снимок возвращается сразу, частичной записи нет
+    assert state.snapshot()[0] == 0
+    assert state.get("set_x") == 0.0
+    state.update(set_x=0.25)
+    assert state.as_dict()["set_x"] == 0.25
@@ -0,0 +1,76 @@
+from control_motor import MAX_WHEEL_SPEED_CPS
+from traction import TractionMonitor, OK, STALL
+
+
+class FakeHub:
+    def __init__(self, speeds=(0.0, 0.0)):
+        self.samples = 1
+        self.latest = (0, (0, 0), tuple(speeds))
+
+
+class FakeMotor:
+    def __init__(self):
+        self.applied_pwm = 0.0
+
+
+def run(monitor, seconds, setpoints, commands, dt=0.02, limits_to=None):
+    for _ in range(int(seconds / dt)):
+        monitor.update(dt, setpoints, commands)
+        if limits_to is not None:
+            for motor, command, limit in zip(limits_to, commands, monitor.power_limits):
+                motor.applied_pwm = command * limit
+
+
+def test_cutback_keeps_stalled_wheel_latched():
+    # Колёса не крутятся; "cutback" урезает ШИМ ниже MIN_PWM - состояние не должно мигать
+    motors = (FakeMotor(), FakeMotor())
+    monitor = TractionMonitor(FakeHub(), motors, reactions={"stall": "cutback"})
+    setpoint = 0.1 * MAX_WHEEL_SPEED_CPS
+    run(monitor, 6.0, (setpoint, setpoint), (42, 42), limits_to=motors)
+    assert [w.condition for w in monitor.wheels] == [STALL, STALL]
+    assert len(monitor.events) == 2
+    assert monitor.power_limits == [0.5, 0.5]
+
+
+def test_latched_stall_clears_once_wheel_moves():
+    monitor = TractionMonitor(FakeHub(), (FakeMotor(), FakeMotor()), reactions={"stall": "cutback"})
+    run(monitor, 1.0, (100.0, 100.0), (60, 60))
+    assert monitor.wheels[0].condition == STALL
+    # Остановка не снимает застревание
+    run(monitor, 2.0, (0.0, 0.0), (0, 0))
+    assert monitor.wheels[0].condition == STALL
+    # Колесо поехало под командой
+    monitor.hub.latest = (0, (0, 0), (150.0, 150.0))
+    run(monitor, 1.0, (150.0, 150.0), (60, 60))
+    assert [w.condition for w in monitor.wheels] == [OK, OK]
+    assert monitor.power_limits == [1.0, 1.0]
+
+
+def test_reversal_is_not_a_stall():
+    # Команда уже назад, колесо ещё крутится вперёд
+    monitor = TractionMonitor(FakeHub((300.0, 300.0)), (FakeMotor(), FakeMotor()))
+    run(monitor, 1.0, (-200.0, -200.0), (-80, -80))
+    assert [w.condition for w in monitor.wheels] == [OK, OK]
+    assert all(w.load_ratio >= 0 for w in monitor.wheels)
+
+
+def test_stop_reaction_is_deferred_and_latched():
+    calls = []
+    monitor = TractionMonitor(FakeHub(), (FakeMotor(), FakeMotor()), reactions={"stall": "stop"})
+
+    def on_stop():
+        # Вызывается после классификации обоих колёс, как RobotChassis.stop_robot
+        calls.append([w.condition for w in monitor.wheels])
+        monitor.reset()
+
+    monitor.on_stop = on_stop
+    for _ in range(50):
+        if calls:
+            break
+        monitor.update(0.02, (100.0, 100.0), (60, 60))
+    assert calls == [[STALL, STALL]]
+    assert monitor.halted
+    monitor.reset()
+    assert monitor.halted
+    monitor.clear()
+    assert not monitor.halted
@@ -0,0 +1,57 @@
+import random
+
+from udp_control import _Channel, _seq_newer, HEADER, DRIVE, pack_drive, MAGIC, MSG_DRIVE, STALE_AFTER_US
+
+
+def test_seq_newer_wraps():
+    assert _seq_newer(1, 0)
+    assert not _seq_newer(0, 1)
+    assert not _seq_newer(5, 5)
+    assert _seq_newer(2, 0xFFFFFFFF)
+
+
+def test_out_of_order_and_duplicate_rejected():
+    channel = _Channel()
+    assert channel.accept(10, 0, 5000) is None
+    assert channel.accept(9, 1000, 6000) == "out_of_order"
+    assert channel.accept(10, 1000, 6000) == "out_of_order"
+    assert channel.accept(11, 2000, 7000) is None
+
+
+def test_late_packet_is_stale():
+    channel = _Channel()
+    assert channel.accept(1, 0, 3000) is None
+    assert channel.accept(2, 20000, 23000 + STALE_AFTER_US + 1) == "stale"
+    assert channel.accept(3, 40000, 43500) is None
+
+
+def test_session_restarts_after_idle():
+    channel = _Channel()
+    assert channel.accept(1000, 0, 1000) is None
+    # Клиент перезапущен: seq сначала, часы с другим смещением
+    assert channel.accept(1, 5_000_000_000, 3_000_000) is None
+
+
+def test_clock_drift_is_tracked():
+    # Часы клиента отстают на 80 ppm: за два часа езды смещение вырастает на ~576 мс
+    rng = random.Random(7)
+    channel = _Channel()
+    drift = 80e-6
+    stale = 0
+    for seq in range(50 * 7200):
+        client_us = seq * 20000
+        rx_us = int(client_us * (1 + drift)) + 2000 + int(rng.expovariate(1 / 3000.0))
+        if channel.accept(seq, client_us, rx_us) is not None:
+            stale += 1
+    assert stale == 0
+    # Реально задержанный пакет по-прежнему отбрасывается
+    seq += 1
+    client_us = seq * 20000
+    assert channel.accept(seq, client_us, int(client_us * (1 + drift)) + 2000 + 200000) == "stale"
+
+
+def test_pack_drive_header():
+    data = pack_drive(7, 0.5, -1.0, timestamp_us=123)
+    magic, msg_type, seq, ts = HEADER.unpack_from(data)
+    assert (magic, msg_type, seq, ts) == (MAGIC, MSG_DRIVE, 7, 123)
+    assert DRIVE.unpack_from(data, HEADER.size) == (0.5, -1.0)
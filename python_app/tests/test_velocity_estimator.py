@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from control_motor import MOTOR_TAU_S
+from velocity_estimator import WheelVelocityKalman, VelocityEstimator
+
+
+class FakeHub:
+    def __init__(self):
+        self.samples = 1
+        self.latest = (0, (0, 0), (0.0, 0.0))
+
+
+class FakeMotor:
+    def __init__(self, applied_pwm=0.0, current_pwm=0.0):
+        self.applied_pwm = applied_pwm
+        self.current_pwm = current_pwm
+
+
+def test_kalman_tracks_first_order_motor_and_load():
+    rng = np.random.default_rng(3)
+    kalman = WheelVelocityKalman(2)
+    u = np.array([400.0, 250.0])
+    load = np.array([60.0, 120.0])
+    true_v = np.zeros(2)
+    dt = 0.02
+    alpha = np.exp(-dt / MOTOR_TAU_S)
+    for _ in range(300):
+        true_v = alpha * true_v + (1 - alpha) * (u - load)
+        kalman.update(dt, u, true_v + rng.normal(0, 20.0, 2))
+    assert np.all(np.abs(kalman.velocity - true_v) < 15.0)
+    assert np.all(np.abs(kalman.x[:, 1] - load) < 40.0)
+    # Установившийся режим - ускорение около нуля
+    assert np.all(np.abs(kalman.acceleration) < 200.0)
+
+
+def test_estimator_uses_applied_duty():
+    # После торможения current_pwm ещё помнит команду, а подано 0 - оценка должна остаться около нуля
+    motors = (FakeMotor(applied_pwm=0.0, current_pwm=-30.0), FakeMotor(applied_pwm=0.0, current_pwm=-30.0))
+    estimator = VelocityEstimator(FakeHub(), motors)
+    for _ in range(200):
+        estimator.step(0.02)
+    assert max(abs(v) for v in estimator.latest[0]) < 1.0
+
+
+def test_reset_is_applied_on_next_step():
+    hub = FakeHub()
+    hub.latest = (0, (0, 0), (300.0, 300.0))
+    motors = (FakeMotor(applied_pwm=100.0), FakeMotor(applied_pwm=100.0))
+    estimator = VelocityEstimator(hub, motors)
+    for _ in range(50):
+        estimator.step(0.02)
+    assert estimator.latest[0][0] > 200.0
+    estimator.reset()
+    assert estimator.latest[0] == (0.0, 0.0)
+    assert estimator.filter.x[0, 0] > 200.0     # сам фильтр сбрасывает шаг цикла
+    motors[0].applied_pwm = motors[1].applied_pwm = 0.0
+    hub.latest = (0, (0, 0), (0.0, 0.0))
+    estimator.step(0.02)
+    assert estimator.latest[0][0] == pytest.approx(0.0, abs=1.0)
@@ -0,0 +1,225 @@
+# traction.py
+"""
+Контроль сцепления колёс: застревание, пробуксовка, вращение в воздухе.
+
+Когда гусеница упирается в край ковра, Motor продолжает давить вплоть до
+MAX_PWM, и никто этого не замечает. Здесь на каждом тике цикла шасси для
+каждого колеса сравниваются:
+
+- ожидаемая скорость при заданном ШИМ - команде колесу до урезания
+  реакцией "cutback" (по калибровке motor_calibration.py - это скорость
+  без нагрузки; без калибровки - линейная схема MIN_PWM..MAX_PWM ->
+  0..MAX_WHEEL_SPEED_CPS);
+- уставка скорости по профилю разгона (с поправкой синхронизации);
+- скорость по энкодеру из общего опроса EncoderHub.
+
+Признаки (каждый должен продержаться своё время, счётчик времени на
+колесо и признак - O(1) на тик, без истории):
+
+    stall      колесу задан ход, а скорость по модулю ниже TRACTION_STALL_RATIO
+               от ожидаемой при этом ШИМ - колесо упёрлось (пока колесо
+               крутится против команды, на реверсе, признак не проверяется);
+    slip       скорость выше уставки профиля на TRACTION_SLIP_MARGIN -
+               гусеница сорвалась и раскрутилась;
+    free_spin  то же превышение держится TRACTION_FREE_SPIN_TIME_S, а
+               скорость почти как без нагрузки - колесо в воздухе.
+
+Возврат в "ok" - после TRACTION_RECOVER_S без признаков; пока на состояние
+действует реакция, в зачёт идёт только время, когда колесо едет под
+командой (остановка или урезанный ШИМ не снимают застревание). Смена состояния -
+событие: запись в лог (/logs), счётчик robot_traction_events_total,
+поля left_traction/right_traction в RobotState, список последних событий
+(/traction). Реакции на состояния настраиваются TRACTION_REACTIONS:
+"cutback" урезает ШИМ колеса (power_limits), "ramp" смягчает разгон
+профилей (accel_scale), "stop" останавливает шасси после шага и держит
+его (halted) до явного clear(), "none" - только событие.
+"""
+
+import time
+from collections import deque
+
+from control_motor import TRACTION_STALL_RATIO, \
+    TRACTION_STALL_TIME_S, TRACTION_SLIP_MARGIN, TRACTION_SLIP_TIME_S, TRACTION_FREE_SPIN_RATIO, \
+    TRACTION_FREE_SPIN_TIME_S, TRACTION_RECOVER_S, TRACTION_REACTIONS, TRACTION_CUTBACK, \
+    TRACTION_RAMP_FACTOR, TRACTION_EVENT_HISTORY
+from metrics import REGISTRY
+from motor_calibration import unloaded_speed
+from robot_log import get_logger
+
+log = get_logger("traction")
+
+OK, STALL, SLIP, FREE_SPIN = 0, 1, 2, 3
+CONDITIONS = ("ok", "stall", "slip", "free_spin")
+REACTIONS = ("none", "cutback", "ramp", "stop")
+
+
+class WheelTraction:
+    """Состояние сцепления одного колеса"""
+
+    def __init__(self, name):
+        self.name = name
+        self.condition = OK
+        self.command = 0.0      # заданный ШИМ (до "cutback")
+        self.expected = 0.0     # ожидаемая скорость при заданном ШИМ (отсчётов/с)
+        self.measured = 0.0
+        self.setpoint = 0.0
+        self.load_ratio = 1.0   # |измеренная| / |ожидаемая| (1 - как без нагрузки)
+        self.stall_time = 0.0   # сколько держится признак застревания
+        self.over_time = 0.0    # сколько держится превышение уставки
+        self.clear_time = 0.0   # сколько нет никаких признаков
+
+
+class TractionMonitor:
+    """
+    Детектор для пары колёс; update() вызывается шасси раз за тик.
+
+    Args:
+        hub (EncoderHub): общий опрос энкодеров (столбцы 0 и 1 - левый и правый)
+        motors: (левый, правый) Motor - фактически поданный ШИМ (applied_pwm, для событий)
+        speed_tables: калибровка {"left": MotorSpeedTable, "right": ...} или None
+        state (RobotState): куда публиковать состояние колёс (необязательно)
+        on_stop: вызывается при реакции "stop" - после шага update(), не изнутри него
+    """
+
+    def __init__(self, hub, motors, speed_tables=None, state=None, on_stop=None,
+                 reactions=TRACTION_REACTIONS):
+        self.hub = hub
+        self.motors = tuple(motors)
+        self.speed_tables = speed_tables
+        self.state = state
+        self.on_stop = on_stop
+        self.reactions = {}
+        self.set_reactions(reactions)
+        self.wheels = (WheelTraction("left"), WheelTraction("right"))
+        self.events = deque(maxlen=TRACTION_EVENT_HISTORY)
+        self.power_limits = [1.0, 1.0]  # множители ШИМ колёс ("cutback")
+        self.accel_scale = 1.0          # множитель ускорения профилей ("ramp")
+        self.halted = False             # была реакция "stop": ход запрещён до clear()
+        self._stop_requested = False
+
+    def set_reactions(self, reactions):
+        """Реакции {"stall": "cutback", ...}; незаданные состояния не меняются"""
+        for condition, reaction in reactions.items():
+            if condition not in CONDITIONS[1:]:
+                raise ValueError(f"Unknown traction condition '{condition}' (expected one of {CONDITIONS[1:]})")
+            if reaction not in REACTIONS:
+                raise ValueError(f"Unknown traction reaction '{reaction}' (expected one of {REACTIONS})")
+        self.reactions.update(reactions)
+
+    def _expected_speed(self, i, pwm):
+        """Скорость без нагрузки при ШИМ со знаком"""
+        table = self.speed_tables[("left", "right")[i]] if self.speed_tables else None
+        return unloaded_speed(pwm, table)
+
+    def _reaction(self, wheel):
+        return self.reactions.get(CONDITIONS[wheel.condition], "none") if wheel.condition else "none"
+
+    def update(self, dt, setpoints, commands):
+        """
+        Классифицировать оба колеса по уставкам (отсчётов/с), заданному ШИМ
+        (до урезания "cutback") и последнему опросу энкодеров
+        """
+        if not self.hub.samples:
+            return
+        speeds = self.hub.latest[2]
+        for i, wheel in enumerate(self.wheels):
+            command = commands[i]
+            expected = self._expected_speed(i, command)
+            measured = speeds[i]
+            setpoint = setpoints[i]
+            wheel.command, wheel.expected, wheel.measured, wheel.setpoint = command, expected, measured, setpoint
+            wheel.load_ratio = abs(measured) / abs(expected) if expected else 1.0
+
+            # Колесо под командой и не крутится против неё (на реверсе скорость ещё старого знака)
+            driven = command and expected and measured * expected >= 0
+            stalled = driven and wheel.load_ratio < TRACTION_STALL_RATIO
+            wheel.stall_time = wheel.stall_time + dt if stalled else 0.0
+            # Превышение уставки в сторону движения
+            over = setpoint and measured * setpoint > 0 and abs(measured) - abs(setpoint) > TRACTION_SLIP_MARGIN
+            wheel.over_time = wheel.over_time + dt if over else 0.0
+
+            if wheel.stall_time >= TRACTION_STALL_TIME_S:
+                condition = STALL
+            elif wheel.over_time >= TRACTION_FREE_SPIN_TIME_S and wheel.load_ratio >= TRACTION_FREE_SPIN_RATIO:
+                condition = FREE_SPIN
+            elif wheel.over_time >= TRACTION_SLIP_TIME_S:
+                condition = SLIP
+            else:
+                condition = None    # признаков нет
+
+            if condition is None:
+                # Пока действует реакция, состояние держится, пока колесо не поедет под командой
+                if driven or self._reaction(wheel) == "none":
+                    wheel.clear_time += dt
+                if wheel.condition != OK and wheel.clear_time >= TRACTION_RECOVER_S:
+                    self._transition(i, wheel, OK)
+            else:
+                wheel.clear_time = 0.0
+                if condition != wheel.condition:
+                    self._transition(i, wheel, condition)
+
+        # Остановка - после классификации обоих колёс: on_stop сбрасывает монитор
+        if self._stop_requested:
+            self._stop_requested = False
+            if self.on_stop is not None:
+                self.on_stop()
+
+    def _transition(self, i, wheel, condition):
+        previous = wheel.condition
+        wheel.condition = condition
+        reaction = self._reaction(wheel)
+        self.events.append({"time": time.time(), "wheel": wheel.name,
+                            "condition": CONDITIONS[condition], "previous": CONDITIONS[previous],
+                            "reaction": reaction, "command": wheel.command,
+                            "pwm": self.motors[i].applied_pwm,
+                            "expected": wheel.expected, "measured": wheel.measured,
+                            "setpoint": wheel.setpoint})
+        REGISTRY.counter("robot_traction_events_total", "Wheel traction state changes",
+                         wheel=wheel.name, condition=CONDITIONS[condition]).inc()
+        if self.state is not None:
+            self.state.update(**{f"{wheel.name}_traction": condition})
+        log_at = log.info if condition == OK else log.warning
+        log_at("%s wheel: %s -> %s (command %.0f, pwm %.0f, expected %.0f, measured %.0f, setpoint %.0f counts/s), "
+               "reaction: %s", wheel.name, CONDITIONS[previous], CONDITIONS[condition], wheel.command,
+               self.motors[i].applied_pwm, wheel.expected, wheel.measured, wheel.setpoint, reaction)
+        self._react()
+        if reaction == "stop":
+            if not self.halted:
+                log.warning("Chassis halted by traction reaction; drive is blocked until /traction?clear=true")
+            self.halted = True
+            self._stop_requested = True
+
+    def _react(self):
+        """Пересчитать ограничения по текущим состояниям обоих колёс"""
+        ramp = False
+        for i, wheel in enumerate(self.wheels):
+            reaction = self._reaction(wheel)
+            self.power_limits[i] = TRACTION_CUTBACK if reaction == "cutback" else 1.0
+            ramp = ramp or reaction == "ramp"
+        self.accel_scale = TRACTION_RAMP_FACTOR if ramp else 1.0
+
+    def reset(self):
+        """Сбросить состояния и реакции (например, после остановки); запрет хода остаётся"""
+        for wheel in self.wheels:
+            wheel.condition = OK
+            wheel.stall_time = wheel.over_time = wheel.clear_time = 0.0
+        self._react()
+        if self.state is not None:
+            self.state.update(left_traction=OK, right_traction=OK)
+
+    def clear(self):
+        """Явно снять запрет хода после реакции "stop" (и сбросить состояния)"""
+        if self.halted:
+            log.info("Traction halt cleared")
+        self.halted = False
+        self.reset()
+
+    def status(self):
+        """Состояние колёс, действующие реакции и последние события (для API)"""
+        return {"wheels": {w.name: {"condition": CONDITIONS[w.condition], "command": w.command,
+                                    "expected": w.expected, "measured": w.measured,
+                                    "setpoint": w.setpoint, "load_ratio": w.load_ratio}
+                           for w in self.wheels},
+                "power_limits": list(self.power_limits), "accel_scale": self.accel_scale,
+                "halted": self.halted,
+                "reactions": dict(self.reactions), "events": list(self.events)}
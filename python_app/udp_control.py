@@ -0,0 +1,363 @@
+# udp_control.py
+"""
+Компактный UDP-протокол управления роботом (дополнение к HTTP /control).
+
+UDP не страдает от блокировки очереди TCP: если пакет потерялся при
+ретрансляции Wi-Fi, следующий просто приходит следом, а устаревшие
+и пришедшие не по порядку пакеты отбрасываются.
+
+Формат датаграммы (little-endian):
+    заголовок: magic(B) type(B) seq(I) timestamp_us(q)      - 14 байт
+    DRIVE:     x(f) y(f)            - положение джойстика, -1.0..1.0
+    SERVO:     angle(f) flags(B)    - угол камеры, флаг плавности
+    COMMAND:   x(f) y(f) angle(f) flags(B) - движение и камера за один шаг
+    ACK:       (без данных)         - эхо seq/timestamp, если запрошено
+
+Старший бит type (FLAG_ACK_REQUEST) просит сервер ответить ACK после
+применения команды - так клиент измеряет полную задержку.
+
+Запуск бенчмарка (сравнение с HTTP /control, робот должен быть запущен
+с --udp-port):
+    python3 udp_control.py --host 192.168.42.1 --http-port 5000 --udp-port 5005
+"""
+
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+from robot_log import get_logger, get_hot_logger
+
+log = get_logger("udp")
+hot_log = get_hot_logger("udp")
+
+# ============================================================================
+# ПРОТОКОЛ
+# ============================================================================
+
+MAGIC = 0x52            # 'R'
+MSG_DRIVE = 1
+MSG_SERVO = 2
+MSG_COMMAND = 3
+MSG_ACK = 0x7F
+FLAG_ACK_REQUEST = 0x80
+
+SERVO_FLAG_SMOOTH = 0x01
+COMMAND_FLAG_ANGLE = 0x02   # в COMMAND передан угол камеры
+COMMAND_FLAG_BRAKE = 0x04   # аварийная остановка шасси
+
+HEADER = struct.Struct("<BBIq")
+DRIVE = struct.Struct("<ff")
+SERVO = struct.Struct("<fB")
+COMMAND = struct.Struct("<fffB")
+
+STALE_AFTER_US = 150000   # Пакет старше минимальной задержки на 150мс - устарел
+SESSION_IDLE_S = 1.0      # После паузы счётчик seq начинается заново (перезапуск клиента)
+OFFSET_WINDOW_S = 10.0    # Минимальное смещение часов - по пакетам за это окно (следует за дрейфом часов)
+DRIVE_TIMEOUT_S = 0.5     # Нет пакетов DRIVE при движении - останавливаемся
+
+
+def now_us():
+    return time.monotonic_ns() // 1000
+
+
+def pack_drive(seq, x, y, timestamp_us=None, ack=False):
+    msg_type = MSG_DRIVE | (FLAG_ACK_REQUEST if ack else 0)
+    ts = now_us() if timestamp_us is None else timestamp_us
+    return HEADER.pack(MAGIC, msg_type, seq & 0xFFFFFFFF, ts) + DRIVE.pack(x, y)
+
+
+def pack_servo(seq, angle, smooth=True, timestamp_us=None, ack=False):
+    msg_type = MSG_SERVO | (FLAG_ACK_REQUEST if ack else 0)
+    ts = now_us() if timestamp_us is None else timestamp_us
+    flags = SERVO_FLAG_SMOOTH if smooth else 0
+    return HEADER.pack(MAGIC, msg_type, seq & 0xFFFFFFFF, ts) + SERVO.pack(angle, flags)
+
+
+def pack_command(seq, x, y, angle=None, smooth=True, brake=False, timestamp_us=None, ack=False):
+    msg_type = MSG_COMMAND | (FLAG_ACK_REQUEST if ack else 0)
+    ts = now_us() if timestamp_us is None else timestamp_us
+    flags = SERVO_FLAG_SMOOTH if smooth else 0
+    if angle is not None:
+        flags |= COMMAND_FLAG_ANGLE
+    if brake:
+        flags |= COMMAND_FLAG_BRAKE
+    return (HEADER.pack(MAGIC, msg_type, seq & 0xFFFFFFFF, ts)
+            + COMMAND.pack(x, y, angle if angle is not None else 0.0, flags))
+
+
+def _seq_newer(seq, last):
+    """Сравнение номеров по модулю 2**32 (корректно при переполнении)"""
+    diff = (seq - last) & 0xFFFFFFFF
+    return 0 < diff < 0x80000000
+
+
+class _Channel:
+    """Состояние одного типа сообщений: последний seq и оценка смещения часов"""
+
+    def __init__(self):
+        self.last_seq = None
+        self.last_rx = 0.0
+        self.min_offset_us = None
+        # Кандидаты в минимум окна: (rx_us, offset) с возрастающим offset
+        self._offsets = deque()
+
+    def accept(self, seq, timestamp_us, rx_us):
+        now = rx_us / 1e6
+        if self.last_seq is not None and now - self.last_rx > SESSION_IDLE_S:
+            self.last_seq = None
+            self._offsets.clear()
+
+        if self.last_seq is not None and not _seq_newer(seq, self.last_seq):
+            return "out_of_order"
+
+        # Часы клиента и робота не синхронизированы: минимальное смещение
+        # (rx - ts) соответствует самой быстрой доставке, всё, что пришло
+        # заметно позже неё, считается устаревшим. Часы расходятся на
+        # десятки ppm, поэтому минимум берётся только за OFFSET_WINDOW_S
+        # (скользящий минимум, O(1) в среднем на пакет)
+        offset = rx_us - timestamp_us
+        offsets = self._offsets
+        while offsets and offsets[-1][1] >= offset:
+            offsets.pop()
+        offsets.append((rx_us, offset))
+        while rx_us - offsets[0][0] > OFFSET_WINDOW_S * 1e6:
+            offsets.popleft()
+        self.min_offset_us = offsets[0][1]
+        self.last_seq = seq
+        self.last_rx = now
+        if offset - self.min_offset_us > STALE_AFTER_US:
+            return "stale"
+        return None
+
+
+# ============================================================================
+# СЕРВЕР
+# ============================================================================
+
+class UdpControlServer:
+    """
+    UDP-приёмник команд рядом с Flask-приложением.
+
+    Обработчики on_drive(x, y), on_servo(angle, smooth) и on_command
+    вызываются прямо в потоке приёмника и не должны блокировать: плавное
+    движение сервы выполняет поток приложения (в app.py - общий для HTTP
+    и UDP, только самая свежая цель).
+    """
+
+    def __init__(self, port, on_drive, on_servo=None, host="0.0.0.0", on_stop=None,
+                 on_command=None):
+        self.port = port
+        self.host = host
+        self.on_drive = on_drive
+        self.on_servo = on_servo
+        self.on_stop = on_stop
+        self.on_command = on_command
+        self.stats = {"received": 0, "applied": 0, "malformed": 0,
+                      "out_of_order": 0, "stale": 0, "timeouts": 0}
+        self._drive = _Channel()
+        self._servo = _Channel()
+        self._driving = False
+        self._last_drive = 0.0
+        self._running = False
+        self._sock = None
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.settimeout(0.1)
+        self._running = True
+        threading.Thread(target=self._rx_loop, name="udp-control", daemon=True).start()
+        log.info("UDP control listening on %s:%d", self.host, self.port)
+
+    def stop(self):
+        self._running = False
+
+    def _rx_loop(self):
+        sock = self._sock
+        while self._running:
+            try:
+                data, addr = sock.recvfrom(64)
+            except socket.timeout:
+                self._check_timeout()
+                continue
+            except OSError:
+                break
+            self._handle(data, addr)
+            self._check_timeout()
+        sock.close()
+
+    def _handle(self, data, addr):
+        rx_us = now_us()
+        self.stats["received"] += 1
+        if len(data) < HEADER.size:
+            self.stats["malformed"] += 1
+            return
+        magic, msg_type, seq, timestamp_us = HEADER.unpack_from(data)
+        kind = msg_type & ~FLAG_ACK_REQUEST
+        if magic != MAGIC or kind not in (MSG_DRIVE, MSG_SERVO, MSG_COMMAND):
+            self.stats["malformed"] += 1
+            return
+
+        try:
+            if kind == MSG_DRIVE:
+                x, y = DRIVE.unpack_from(data, HEADER.size)
+            elif kind == MSG_COMMAND:
+                x, y, angle, flags = COMMAND.unpack_from(data, HEADER.size)
+            else:
+                angle, flags = SERVO.unpack_from(data, HEADER.size)
+        except struct.error:
+            self.stats["malformed"] += 1
+            return
+
+        # COMMAND несёт команду движения, поэтому делит очередность с DRIVE
+        channel = self._servo if kind == MSG_SERVO else self._drive
+        verdict = channel.accept(seq, timestamp_us, rx_us)
+        if verdict:
+            self.stats[verdict] += 1
+            hot_log.debug("UDP packet dropped: %s (seq %d)", verdict, seq)
+            return
+
+        if kind == MSG_COMMAND and self.on_command is None:
+            self.stats["malformed"] += 1
+            return
+
+        if kind in (MSG_DRIVE, MSG_COMMAND):
+            x = max(-1.0, min(1.0, x))
+            y = max(-1.0, min(1.0, y))
+            if kind == MSG_DRIVE:
+                self.on_drive(x, y)
+            else:
+                brake = bool(flags & COMMAND_FLAG_BRAKE)
+                self.on_command(x, y, angle if flags & COMMAND_FLAG_ANGLE else None,
+                                bool(flags & SERVO_FLAG_SMOOTH), brake)
+                if brake:
+                    x = y = 0.0
+            self._driving = not (x == 0 and y == 0)
+            self._last_drive = time.monotonic()
+        elif self.on_servo:
+            self.on_servo(angle, bool(flags & SERVO_FLAG_SMOOTH))
+        self.stats["applied"] += 1
+
+        if msg_type & FLAG_ACK_REQUEST:
+            try:
+                self._sock.sendto(HEADER.pack(MAGIC, MSG_ACK, seq, timestamp_us), addr)
+            except OSError:
+                pass
+
+    def _check_timeout(self):
+        """Защита: если пакеты движения перестали приходить - останавливаем робота"""
+        if self._driving and time.monotonic() - self._last_drive > DRIVE_TIMEOUT_S:
+            self._driving = False
+            self.stats["timeouts"] += 1
+            log.warning("UDP drive timeout, stopping")
+            if self.on_stop:
+                self.on_stop()
+            else:
+                self.on_drive(0.0, 0.0)
+
+
+# ============================================================================
+# КЛИЕНТ И БЕНЧМАРК
+# ============================================================================
+
+class UdpControlClient:
+    """Простой клиент протокола (для бенчмарка, скриптов и тестов с ноутбука)"""
+
+    def __init__(self, host, port):
+        self.addr = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.drive_seq = 0
+        self.servo_seq = 0
+
+    def drive(self, x, y, ack=False):
+        self.drive_seq += 1
+        self.sock.sendto(pack_drive(self.drive_seq, x, y, ack=ack), self.addr)
+        return self.drive_seq
+
+    def command(self, x, y, angle=None, smooth=True, brake=False, ack=False):
+        self.drive_seq += 1
+        self.sock.sendto(pack_command(self.drive_seq, x, y, angle, smooth, brake, ack=ack), self.addr)
+        return self.drive_seq
+
+    def servo(self, angle, smooth=True, ack=False):
+        self.servo_seq += 1
+        self.sock.sendto(pack_servo(self.servo_seq, angle, smooth, ack=ack), self.addr)
+        return self.servo_seq
+
+    def drive_rtt(self, x, y, timeout=0.5):
+        """Отправить DRIVE с запросом ACK и вернуть время до ответа (сек) или None"""
+        self.sock.settimeout(timeout)
+        seq = self.drive(x, y, ack=True)
+        start = time.perf_counter()
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(64)
+            except socket.timeout:
+                return None
+            if len(data) >= HEADER.size:
+                magic, msg_type, ack_seq, _ = HEADER.unpack_from(data)
+                if magic == MAGIC and msg_type == MSG_ACK and ack_seq == seq:
+                    return time.perf_counter() - start
+
+    def close(self):
+        self.sock.close()
+
+
+def _http_control_rtt(host, port, x, y):
+    import http.client
+    conn = http.client.HTTPConnection(host, port, timeout=2)
+    start = time.perf_counter()
+    try:
+        conn.request("GET", f"/control?x={x * 100:.0f}&y={y * 100:.0f}")
+        conn.getresponse().read()
+        return time.perf_counter() - start
+    except OSError:
+        return None
+    finally:
+        conn.close()
+
+
+def benchmark(host, http_port, udp_port, count=500, interval=0.02):
+    """Сравнение задержки команды движения: HTTP /control против UDP"""
+    from metrics import LatencyHistogram
+
+    results = {}
+    client = UdpControlClient(host, udp_port)
+    probes = {
+        "http": lambda: _http_control_rtt(host, http_port, 0.0, 0.0),
+        "udp": lambda: client.drive_rtt(0.0, 0.0),
+    }
+    for name, probe in probes.items():
+        hist = LatencyHistogram(name)
+        lost = 0
+        for _ in range(count):
+            rtt = probe()
+            if rtt is None:
+                lost += 1
+            else:
+                hist.record_ns(int(rtt * 1e9))
+            time.sleep(interval)
+        results[name] = (hist, lost)
+    client.close()
+
+    print(f"{'path':6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'lost':>6}")
+    for name, (hist, lost) in results.items():
+        q = [hist.quantile_ns(p) / 1e6 for p in (0.5, 0.9, 0.99)]
+        print(f"{name:6} {q[0]:8.2f} {q[1]:8.2f} {q[2]:8.2f} {hist.max_ns / 1e6:8.2f} {lost:6d}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="UDP vs HTTP control latency benchmark")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--http-port", type=int, default=5000)
+    parser.add_argument("--udp-port", type=int, default=5005)
+    parser.add_argument("-n", "--count", type=int, default=500)
+    args = parser.parse_args()
+    # Бенчмарк шлёт только команды "стоп" (x=0, y=0) - робот не поедет
+    benchmark(args.host, args.http_port, args.udp_port, args.count)
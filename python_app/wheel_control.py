@@ -0,0 +1,205 @@
+# wheel_control.py
+"""
+Замкнутый контур скорости колёс по энкодерам.
+
+Каждое колесо - свой ПИД-регулятор с прямой связью (feed-forward):
+    ШИМ = FF(уставка) + KP * ошибка + интеграл - KD * d(скорость)/dt
+Уставки и измерения - в импульсах энкодера в секунду (counts/s).
+
+- Производная берётся по измерению, а не по ошибке: скачок уставки
+  не даёт выброса ШИМ.
+- Anti-windup: интеграл не накапливается, пока выход упёрт в ограничение
+  и ошибка толкает его дальше, и сам интеграл ограничен MAX_PWM.
+- Выход ограничен MIN_PWM..MAX_PWM (с калибровкой - мёртвой зоной мотора
+  в своём направлении..MAX_PWM) и имеет знак уставки: замедление -
+  это уменьшение ШИМ, а не реверс. Нулевая уставка - торможение.
+
+Квадратурный энкодер (encoders.py) даёт скорость со знаком. Для
+EncoderCounter, который считает фронты одного канала без направления,
+знак берётся из направления, в котором мотор вращали на прошедшем интервале.
+
+Если есть калибровка моторов (motor_calibration.py), прямая связь
+берётся из обратной калибровочной таблицы вместо линейного KFF.
+
+Регулятор вызывается из ControlLoop (control_loop.py) с частотой
+CONTROL_RATE_HZ, независимо от того, как часто приходят команды.
+"""
+
+import threading
+
+from control_motor import MIN_PWM, MAX_PWM, VELOCITY_KP, VELOCITY_KI, VELOCITY_KD, \
+    VELOCITY_KFF, TRACKING_ERROR_TAU
+from metrics import REGISTRY
+from robot_log import get_hot_logger
+
+log = get_hot_logger("wheels")
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+class WheelVelocityPID:
+    """ПИД + прямая связь для скорости одного колеса"""
+
+    def __init__(self, kp=VELOCITY_KP, ki=VELOCITY_KI, kd=VELOCITY_KD, kff=VELOCITY_KFF,
+                 min_output=MIN_PWM, max_output=MAX_PWM, name="wheel", feedforward=None):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.kff = kff
+        self.feedforward = feedforward  # ШИМ для уставки (калибровочная таблица) вместо kff * уставка
+        self.min_outputs = (min_output, min_output)    # вперёд, назад
+        self.max_output = max_output
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.prev_measured = None
+        self.setpoint = 0.0
+        self.measured = 0.0
+        self.error = 0.0
+        self.output = 0.0
+        self.mean_sq_error = 0.0    # сглаженный квадрат ошибки (для RMS)
+        self.saturated = False
+
+    def update(self, setpoint, measured, dt):
+        """Один шаг регулятора; возвращает ШИМ со знаком (0 - торможение)"""
+        self.setpoint = setpoint
+        self.measured = measured
+        error = setpoint - measured
+        self.error = error
+
+        alpha = min(1.0, dt / TRACKING_ERROR_TAU)
+        self.mean_sq_error += alpha * (error * error - self.mean_sq_error)
+
+        if setpoint == 0:
+            # Стоим: тормозим и не копим интеграл
+            self.integral = 0.0
+            self.prev_measured = measured
+            self.output = 0.0
+            self.saturated = False
+            return 0.0
+
+        derivative = 0.0
+        if self.prev_measured is not None and dt > 0:
+            derivative = (measured - self.prev_measured) / dt
+        self.prev_measured = measured
+
+        direction = _sign(setpoint)
+        if self.feedforward is not None:
+            ff = self.feedforward(setpoint)
+        else:
+            ff = self.kff * setpoint
+        unclamped = (ff + self.kp * error + self.integral
+                     + self.ki * error * dt - self.kd * derivative)
+
+        # Модуль выхода в рабочем диапазоне мотора, знак - как у уставки
+        magnitude = unclamped * direction
+        min_output = self.min_outputs[0 if direction > 0 else 1]
+        output = max(min_output, min(self.max_output, magnitude))
+        self.saturated = output != magnitude
+
+        # Anti-windup: интегрируем, только если это не загоняет выход глубже в ограничение
+        pushes_up = error * direction > 0
+        if not self.saturated or (magnitude > self.max_output) != pushes_up:
+            self.integral += self.ki * error * dt
+            self.integral = max(-self.max_output, min(self.max_output, self.integral))
+
+        self.output = output * direction
+        return self.output
+
+    def rms_error(self):
+        return self.mean_sq_error ** 0.5
+
+
+class WheelVelocityController:
+    """
+    Замкнутый контур для пары колёс. step(dt, now) подписывается на ControlLoop.
+
+    Args:
+        left_encoder, right_encoder: счётчики импульсов (get_count(); signed - счёт со знаком)
+        apply: функция apply(left_pwm, right_pwm), применяющая ШИМ моторам
+        hub (EncoderHub): общий опрос энкодеров со скоростью по tick'ам фронтов
+            (столбцы 0 и 1 - левый и правый); без него скорость - приращение
+            счёта за тик регулятора
+        state (RobotState): куда публиковать уставки, скорости и ошибки (необязательно)
+        estimator (VelocityEstimator): оценка скорости фильтром Калмана; если
+            задана, регулятор работает по ней, а не по скорости из hub
+    """
+
+    def __init__(self, left_encoder, right_encoder, apply, state=None, hub=None, estimator=None):
+        self.encoders = (left_encoder, right_encoder)
+        self.hub = hub      # EncoderHub, опрашиваемый раньше регулятора на том же тике
+        self.estimator = estimator
+        self.apply = apply
+        self.state = state
+        self.pids = (WheelVelocityPID(name="left"), WheelVelocityPID(name="right"))
+        self._setpoints = (0.0, 0.0)
+        self._lock = threading.Lock()
+        self._last_counts = None
+
+    def set_speeds(self, left_cps, right_cps):
+        """Уставки скорости колёс в импульсах энкодера в секунду"""
+        with self._lock:
+            self._setpoints = (float(left_cps), float(right_cps))
+
+    def set_feedforward(self, left, right):
+        """Прямая связь по калибровке: функции уставка (имп/с) -> ШИМ для каждого колеса"""
+        for pid, feedforward in zip(self.pids, (left, right)):
+            pid.feedforward = feedforward
+
+    def set_deadbands(self, left, right):
+        """Нижняя граница выхода по калибровке: (вперёд, назад) для каждого колеса"""
+        for pid, deadband in zip(self.pids, (left, right)):
+            pid.min_outputs = tuple(deadband)
+
+    def reset(self):
+        for pid in self.pids:
+            pid.reset()
+        self._last_counts = None
+
+    def step(self, dt, now):
+        counts = tuple(encoder.get_count() for encoder in self.encoders)
+        last = self._last_counts
+        self._last_counts = counts
+        if last is None or dt <= 0:
+            return
+
+        setpoints = self._setpoints
+        if self.estimator is not None:
+            speeds = self.estimator.latest[0]
+        else:
+            speeds = self.hub.latest[2] if self.hub is not None else None
+        outputs = []
+        for i, (pid, encoder, setpoint) in enumerate(zip(self.pids, self.encoders, setpoints)):
+            if speeds is not None:
+                measured = speeds[i]
+            else:
+                measured = (counts[i] - last[i]) / dt
+                if not getattr(encoder, "signed", False):
+                    # Направление - то, в котором мотор вращали на прошедшем интервале
+                    measured *= _sign(pid.output) or _sign(setpoint)
+            outputs.append(pid.update(setpoint, measured, dt))
+
+        self.apply(outputs[0], outputs[1])
+        self._publish()
+
+    def _publish(self):
+        left, right = self.pids
+        if self.state is not None:
+            self.state.update(left_speed_set=left.setpoint, right_speed_set=right.setpoint,
+                              left_speed=left.measured, right_speed=right.measured,
+                              left_speed_error=left.error, right_speed_error=right.error)
+        for pid in self.pids:
+            REGISTRY.set_gauge("robot_wheel_tracking_error_rms", pid.rms_error(),
+                               "Smoothed RMS wheel speed tracking error (encoder counts/s)",
+                               wheel=pid.name)
+
+    def status(self):
+        """Состояние регуляторов (для API)"""
+        return {pid.name: {"setpoint": pid.setpoint, "measured": pid.measured,
+                           "error": pid.error, "rms_error": pid.rms_error(),
+                           "output": pid.output, "saturated": pid.saturated}
+                for pid in self.pids}